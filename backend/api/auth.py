@@ -2,7 +2,7 @@ from fastapi import APIRouter, HTTPException
 from supabase import AuthApiError
 from schemas.user import SignUpCredentials, UserCredentials
 # THIS IS THE FIX: We now import the correctly named 'supabase_anon' client
-from core.dependencies import supabase_anon
+from core.dependencies import get_supabase_anon
 
 router = APIRouter()
 
@@ -10,7 +10,7 @@ router = APIRouter()
 def signup(credentials: SignUpCredentials):
     try:
         # AND USE IT HERE
-        res = supabase_anon.auth.sign_up({
+        res = get_supabase_anon().auth.sign_up({
             "email": credentials.email,
             "password": credentials.password,
             "options": {"data": {"full_name": credentials.full_name}}
@@ -30,7 +30,7 @@ def signup(credentials: SignUpCredentials):
 def login(credentials: UserCredentials):
     try:
         # AND USE IT HERE
-        res = supabase_anon.auth.sign_in_with_password({
+        res = get_supabase_anon().auth.sign_in_with_password({
             "email": credentials.email,
             "password": credentials.password
         })
@@ -1,36 +1,55 @@
+import asyncio
 import json
-import re
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
 from fastapi.responses import StreamingResponse
 from langchain_core.messages import HumanMessage, AIMessage
-from schemas.chat import ChatRequest, HistoryMessage
-from schemas.session import Session
+from schemas.chat import ChatRequest, HistoryMessage, SessionMessage, ThinkingProcess
+from schemas.session import BulkDeleteRequest, DeleteSessionsResult, Session
+from core.config import (
+    CHAT_STREAM_MODE, CHAT_TRACE_EVENTS, CONTEXT_HISTORY_LIMIT, SESSIONS_PAGE_SIZE, SESSIONS_MAX_PAGE_SIZE,
+    MESSAGES_PAGE_SIZE, MESSAGES_MAX_PAGE_SIZE, TURN_CACHE_ENABLED,
+)
 from core.dependencies import get_current_user_and_client
-from services.agent import astream_with_learning_context
-from typing import List
+from core.metrics import current_trace
+from services.agent import astream_with_learning_context, context_manager, turn_cache
+from services.llm_scheduler import LLMOverloaded
+from services.repository import ChatRepository, parse_timestamp
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor, etag_matches, make_etag
+from services.write_behind import chat_writer
+from services.streaming import MessageEventDiffer, ThinkingStreamParser, content_text
+from typing import List, Literal, Optional
 from uuid import UUID
-from datetime import datetime
+from datetime import datetime, timezone
 
 router = APIRouter()
 
+# Clients may keep a listing but must revalidate it (cheaply, via If-None-Match) before reuse
+LISTING_CACHE_CONTROL = "private, no-cache"
+# Stored messages are never edited (only deleted), so their thinking steps can be kept
+MESSAGE_CACHE_CONTROL = "private, max-age=86400"
+
+def set_listing_headers(response: Response, etag: str, next_cursor_row: Optional[dict]):
+    """ETag, cache policy and (when there are more rows) the cursor for the next page."""
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = LISTING_CACHE_CONTROL
+    if next_cursor_row is not None:
+        response.headers["X-Next-Cursor"] = encode_cursor(next_cursor_row)
+
 @router.post("/sessions", response_model=Session)
 async def create_chat_session(request: Request):
     """Creates a new, empty chat session for the current user."""
     try:
         supabase_user_client, user_id = await get_current_user_and_client(request)
+        repo = ChatRepository(supabase_user_client)
         new_title = f"New Chat - {datetime.now().strftime('%b %d, %H:%M')}"
         
-        response = supabase_user_client.table('chat_sessions').insert({
-            "user_id": user_id,
-            "title": new_title
-        }).execute()
-        
-        if response.data and len(response.data) > 0:
-            return response.data[0]
+        session = await repo.create_session(user_id, new_title)
+        if session:
+            return session
         
-        fetch_response = supabase_user_client.table('chat_sessions').select("*").eq('user_id', user_id).order('created_at', desc=True).limit(1).execute()
-        if fetch_response.data and len(fetch_response.data) > 0:
-            return fetch_response.data[0]
+        session = await repo.latest_session(user_id)
+        if session:
+            return session
         
         raise HTTPException(status_code=500, detail="Database failed to return new session.")
     except HTTPException:
@@ -40,141 +59,367 @@ async def create_chat_session(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/sessions", response_model=List[Session])
-async def get_chat_sessions(request: Request):
-    """Gets all chat sessions for the current user."""
+async def get_chat_sessions(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Page size (defaults to SESSIONS_PAGE_SIZE)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+):
+    """
+    Gets the current user's chat sessions, newest first, one page at a time.
+    
+    The cursor for the next (older) page comes back in X-Next-Cursor. An
+    unchanged list answers If-None-Match with 304.
+    """
     try:
         supabase_user_client, user_id = await get_current_user_and_client(request)
-        response = supabase_user_client.table('chat_sessions').select('*').eq('user_id', user_id).order('created_at', desc=True).execute()
-        return response.data if response.data else []
+        repo = ChatRepository(supabase_user_client)
+        limit = min(limit or SESSIONS_PAGE_SIZE, SESSIONS_MAX_PAGE_SIZE)
+        before = decode_cursor(cursor) if cursor else None
+        
+        etag = make_etag("sessions", await repo.session_list_version(user_id), limit, cursor)
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
+        
+        # One extra row tells us whether there is another page
+        sessions = await repo.list_sessions(user_id, limit=limit + 1, before=before)
+        set_listing_headers(response, etag, sessions[limit - 1] if len(sessions) > limit else None)
+        return sessions[:limit]
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"ERROR FETCHING SESSIONS: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+async def delete_sessions_for_user(supabase_user_client, user_id: str, session_ids: List[UUID]) -> DeleteSessionsResult:
+    """Deletes the user's sessions among session_ids (and their messages) in one batched pass."""
+    requested = list(dict.fromkeys(str(session_id) for session_id in session_ids))
+    result = await ChatRepository(supabase_user_client).delete_sessions(user_id, requested)
+    deleted_ids = result["deleted_session_ids"]
+    
+    # Forget in-process state tied to the deleted sessions
+    chat_writer.discard_sessions(deleted_ids)
+    for session_id in deleted_ids:
+        context_manager.forget(session_id)
+    
+    deleted = set(deleted_ids)
+    return DeleteSessionsResult(
+        deleted_sessions=len(deleted_ids),
+        deleted_messages=result["deleted_messages"],
+        deleted_session_ids=deleted_ids,
+        not_found=[session_id for session_id in requested if session_id not in deleted],
+    )
+
 @router.delete("/sessions/{session_id}")
 async def delete_chat_session(session_id: UUID, request: Request):
     """Deletes a chat session and all its messages."""
     try:
         supabase_user_client, user_id = await get_current_user_and_client(request)
-        session_id_str = str(session_id)
-        
-        session_response = supabase_user_client.table('chat_sessions').select('id').eq('id', session_id_str).eq('user_id', user_id).execute()
+        result = await delete_sessions_for_user(supabase_user_client, user_id, [session_id])
         
-        if not session_response.data:
+        if not result.deleted_sessions:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        supabase_user_client.table('chat_messages').delete().eq('session_id', session_id_str).execute()
-        supabase_user_client.table('chat_sessions').delete().eq('id', session_id_str).execute()
-        
-        return {"message": "Session deleted successfully", "session_id": session_id_str}
+        return {
+            "message": "Session deleted successfully",
+            "session_id": str(session_id),
+            "deleted_messages": result.deleted_messages,
+        }
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"ERROR DELETING SESSION: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/sessions/{session_id}/messages", response_model=List[HistoryMessage])
-async def get_session_messages(session_id: UUID, request: Request):
-    """Gets all messages for a specific chat session."""
+@router.post("/sessions/delete", response_model=DeleteSessionsResult)
+async def delete_chat_sessions(body: BulkDeleteRequest, request: Request):
+    """Deletes several chat sessions (and their messages) at once, e.g. to clear the history."""
     try:
         supabase_user_client, user_id = await get_current_user_and_client(request)
+        return await delete_sessions_for_user(supabase_user_client, user_id, body.session_ids)
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"ERROR DELETING SESSIONS: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+def parse_thinking(value) -> List[str]:
+    """thinking_process as stored: a JSON array, or its text in older rows."""
+    if not value:
+        return []
+    return value if isinstance(value, list) else json.loads(value)
+
+@router.get("/sessions/{session_id}/messages", response_model=List[SessionMessage], response_model_exclude_none=True)
+async def get_session_messages(
+    session_id: UUID,
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, description="Page size (defaults to MESSAGES_PAGE_SIZE)"),
+    cursor: Optional[str] = Query(None, description="X-Next-Cursor value from the previous page"),
+    fields: Literal["text", "full"] = Query("text", description="'text': id, role and text; 'full': also each message's thinking steps"),
+):
+    """
+    Gets messages for a specific chat session, oldest first within a page.
+    
+    The first page holds the newest messages; X-Next-Cursor points to the
+    page of older messages before it. An unchanged thread answers
+    If-None-Match with 304. Thinking steps aren't read unless fields=full;
+    the thinking endpoint loads one message's steps when they are opened.
+    """
+    try:
+        supabase_user_client, user_id = await get_current_user_and_client(request)
+        repo = ChatRepository(supabase_user_client)
         session_id_str = str(session_id)
+        limit = min(limit or MESSAGES_PAGE_SIZE, MESSAGES_MAX_PAGE_SIZE)
+        before = decode_cursor(cursor) if cursor else None
         
-        session_response = supabase_user_client.table('chat_sessions').select('id').eq('id', session_id_str).eq('user_id', user_id).execute()
-        if not session_response.data:
+        exists, version = await asyncio.gather(
+            repo.session_exists(session_id_str, user_id),
+            repo.message_list_version(session_id_str),
+        )
+        if not exists:
             raise HTTPException(status_code=404, detail="Session not found")
         
-        messages_response = supabase_user_client.table('chat_messages').select('role, content, thinking_process').eq('session_id', session_id_str).order('created_at', desc=False).execute()
+        etag = make_etag("messages", session_id_str, version, limit, cursor, fields)
+        if etag_matches(request.headers.get("If-None-Match"), etag):
+            return Response(status_code=304, headers={"ETag": etag, "Cache-Control": LISTING_CACHE_CONTROL})
+        
+        # One extra (older) row tells us whether there is another page
+        rows = await repo.list_messages(session_id_str, limit=limit + 1, before=before, with_thinking=fields == "full")
+        has_more = len(rows) > limit
+        if has_more:
+            rows = rows[1:]
+        set_listing_headers(response, etag, rows[0] if has_more else None)
         
         messages = []
-        for msg in messages_response.data if messages_response.data else []:
+        for msg in rows:
             message_dict = {
+                "id": str(msg['id']),
                 "role": msg['role'],
                 "text": msg['content']
             }
             # Include thinking process if it exists
             if msg.get('thinking_process'):
-                message_dict["thinkingProcess"] = msg['thinking_process'] if isinstance(msg['thinking_process'], list) else json.loads(msg['thinking_process'])
+                message_dict["thinkingProcess"] = parse_thinking(msg['thinking_process'])
             messages.append(message_dict)
         
         return messages
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"ERROR FETCHING MESSAGES: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-async def generate_events(session_id: UUID, messages: List[HistoryMessage], supabase_user_client, user_id: str):
+@router.get("/sessions/{session_id}/messages/{message_id}/thinking", response_model=ThinkingProcess)
+async def get_message_thinking(session_id: UUID, message_id: UUID, request: Request, response: Response):
+    """Gets one message's thinking steps, for when its thinking panel is opened."""
+    try:
+        supabase_user_client, user_id = await get_current_user_and_client(request)
+        repo = ChatRepository(supabase_user_client)
+        session_id_str = str(session_id)
+        message_id_str = str(message_id)
+        
+        exists, row = await asyncio.gather(
+            repo.session_exists(session_id_str, user_id),
+            repo.get_thinking_process(session_id_str, message_id_str),
+        )
+        if not exists or row is None:
+            raise HTTPException(status_code=404, detail="Message not found")
+        
+        response.headers["Cache-Control"] = MESSAGE_CACHE_CONTROL
+        return {"id": message_id_str, "thinkingProcess": parse_thinking(row.get('thinking_process'))}
+    except HTTPException:
+        raise
+    except Exception as e:
+        print(f"ERROR FETCHING THINKING PROCESS: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+async def stream_values_events(history, session_id_str: str, user_id: str, turn: dict):
+    """Fallback stream: waits for each whole message from the graph (stream_mode="values")."""
+    thinking_steps = turn["thinking_steps"]
+    differ = MessageEventDiffer(history_length=len(history))
+    
+    async for event in astream_with_learning_context(history, session_id_str, user_id):
+        # Only parse messages this snapshot added since the previous one
+        for kind, content in differ.diff(event["messages"]):
+            if kind == "thinking":
+                thinking_steps.append(content)
+                yield f"data: {json.dumps({'type': 'thinking', 'content': content})}\n\n"
+            elif kind == "tool":
+                turn["tools"].append(content)
+                executing_message = f"⚙️ Using {content}..."
+                thinking_steps.append(executing_message)
+                yield f"data: {json.dumps({'type': 'thinking', 'content': executing_message})}\n\n"
+            else:
+                turn["final_answer"] = content
+                yield f"data: {json.dumps({'type': 'final_answer', 'content': content})}\n\n"
+        last_message = event["messages"][-1]
+        if isinstance(last_message, AIMessage) and last_message.response_metadata.get("partial"):
+            turn["partial"] = True
+
+async def stream_token_events(history, session_id_str: str, user_id: str, turn: dict):
+    """
+    Streams supervisor tokens as they arrive (stream_mode="messages").
+
+    Thinking lines go out as `thinking` events and answer text as
+    `final_answer_delta` events. A closing `final_answer` event carries the
+    complete answer, so clients that only understand whole answers still work
+    (and when a tool ran, it's the tool's presented result that wins).
+    """
+    thinking_steps = turn["thinking_steps"]
+    parser = ThinkingStreamParser()
+    announced_tool_calls = set()
+    presented_answer = ""
+
+    def to_sse(events):
+        for kind, text in events:
+            if kind == "thinking":
+                thinking_steps.append(text)
+                yield f"data: {json.dumps({'type': 'thinking', 'content': text})}\n\n"
+            else:
+                yield f"data: {json.dumps({'type': 'final_answer_delta', 'content': text})}\n\n"
+
+    async for chunk, metadata in astream_with_learning_context(history, session_id_str, user_id, stream_mode="messages"):
+        if not isinstance(chunk, AIMessage):
+            continue
+        node = metadata.get("langgraph_node")
+        
+        # The router's canned replies and tool calls are streamed like the supervisor's
+        if node in ("supervisor", "router"):
+            # Announce each tool call once, as soon as its name has streamed in
+            tool_calls = getattr(chunk, "tool_call_chunks", None) or chunk.tool_calls
+            for index, tool_call in enumerate(tool_calls):
+                tool_name = tool_call.get("name")
+                call_key = tool_call.get("id") or tool_call.get("index", index)
+                if tool_name and call_key not in announced_tool_calls:
+                    announced_tool_calls.add(call_key)
+                    turn["tools"].append(tool_name)
+                    executing_message = f"⚙️ Using {tool_name}..."
+                    thinking_steps.append(executing_message)
+                    yield f"data: {json.dumps({'type': 'thinking', 'content': executing_message})}\n\n"
+            
+            for sse_event in to_sse(parser.feed(content_text(chunk.content))):
+                yield sse_event
+        
+        elif node == "presenter":
+            if chunk.response_metadata.get("partial"):
+                turn["partial"] = True
+            presented = content_text(chunk.content).strip()
+            if presented:
+                presented_answer = presented
+                yield f"data: {json.dumps({'type': 'final_answer_delta', 'content': presented})}\n\n"
+    
+    for sse_event in to_sse(parser.flush()):
+        yield sse_event
+    
+    final_answer = presented_answer or parser.answer.strip()
+    if final_answer:
+        turn["final_answer"] = final_answer
+        yield f"data: {json.dumps({'type': 'final_answer', 'content': final_answer})}\n\n"
+
+def replay_cached_turn(cached: dict, turn: dict):
+    """The SSE events of a cached turn: its thinking steps, then the answer."""
+    for step in cached["thinking"]:
+        turn["thinking_steps"].append(step)
+        yield f"data: {json.dumps({'type': 'thinking', 'content': step})}\n\n"
+    turn["final_answer"] = cached["answer"]
+    if CHAT_STREAM_MODE == "tokens":
+        yield f"data: {json.dumps({'type': 'final_answer_delta', 'content': cached['answer']})}\n\n"
+    yield f"data: {json.dumps({'type': 'final_answer', 'content': cached['answer']})}\n\n"
+
+def cacheable_turn(turn: dict) -> bool:
+    """Complete answers only, and not ones built on web results (those go stale)."""
+    return bool(turn["final_answer"]) and not turn["partial"] and "web_search" not in turn["tools"]
+
+async def load_conversation(repo: ChatRepository, session_id_str: str, chat_request: ChatRequest) -> List[HistoryMessage]:
+    """The conversation for this turn: stored history plus the new message, or the legacy client-sent list."""
+    if chat_request.message is None:
+        return chat_request.messages
+    
+    # Snapshot queued writes before reading, so a flush in between can't hide a message
+    queued = chat_writer.pending_messages(session_id_str)
+    stored = await repo.list_recent_messages(session_id_str, CONTEXT_HISTORY_LIMIT)
+    if stored and queued:
+        # Compared as epoch seconds: stored values may come back naive or in other ISO forms
+        newest_stored = parse_timestamp(stored[-1]['created_at'])
+        if newest_stored is not None:
+            queued = [row for row in queued if parse_timestamp(row['created_at']) > newest_stored]
+    messages = [HistoryMessage(role=msg['role'], text=msg['content'], created_at=msg['created_at']) for msg in stored + queued]
+    messages.append(HistoryMessage(role='user', text=chat_request.message, created_at=datetime.now(timezone.utc).isoformat()))
+    return messages
+
+async def generate_events(session_id: UUID, chat_request: ChatRequest, supabase_user_client, user_id: str):
     """Generates server-sent events with thinking process and saves responses."""
     session_id_str = str(session_id)
+    repo = ChatRepository(supabase_user_client)
     thinking_steps = []
+    trace = current_trace() if CHAT_TRACE_EVENTS else None
+    if trace is not None:
+        yield f"data: {json.dumps({'type': 'trace', 'trace_id': trace.trace_id})}\n\n"
+    
+    # Load history before saving the new message so it isn't counted twice
+    messages = await load_conversation(repo, session_id_str, chat_request)
     
-    # Save user message
+    # Queue the user message (saved in the background, so the stream starts right away)
     if messages and messages[-1].role == 'user':
         user_message_content = messages[-1].text
-        supabase_user_client.table('chat_messages').insert({
-            "session_id": session_id_str,
-            "user_id": user_id,
-            "role": "user",
-            "content": user_message_content
-        }).execute()
-        
-        # Update session title with first message if it's still "New Chat"
-        try:
-            session_data = supabase_user_client.table('chat_sessions').select('title').eq('id', session_id_str).single().execute()
-            if session_data.data and 'New Chat' in session_data.data.get('title', ''):
-                # Generate title from first message (first 50 chars)
-                new_title = user_message_content[:50] + ('...' if len(user_message_content) > 50 else '')
-                supabase_user_client.table('chat_sessions').update({
-                    'title': new_title
-                }).eq('id', session_id_str).execute()
-        except Exception as e:
-            print(f"Error updating session title: {e}")
+        chat_writer.enqueue_message(supabase_user_client, session_id_str, user_id, "user", user_message_content)
+        
+        # Title the session after its first message (only applied while it's still "New Chat...")
+        if len(messages) == 1:
+            # Generate title from first message (first 50 chars)
+            new_title = user_message_content[:50] + ('...' if len(user_message_content) > 50 else '')
+            chat_writer.enqueue_title(supabase_user_client, session_id_str, new_title)
+    
+    # A first-turn question has no context, so its answer is the same for everyone
+    # (no key for filler-only messages like "hello": those always go to the supervisor)
+    first_turn = len(messages) == 1 and messages[0].role == 'user'
+    turn_key = turn_cache.key_for(messages[0].text) if TURN_CACHE_ENABLED and first_turn else None
+    turn = {"final_answer": "", "thinking_steps": thinking_steps, "tools": [], "partial": False}
+    cached_turn = await turn_cache.aget(turn_key) if turn_key else None
+    if cached_turn is not None:
+        for sse_event in replay_cached_turn(cached_turn, turn):
+            yield sse_event
+    else:
+        async for sse_event in stream_agent_turn(messages, session_id_str, user_id, turn):
+            yield sse_event
+        if turn_key and cacheable_turn(turn):
+            await turn_cache.aset(turn_key, messages[0].text, thinking_steps, turn["final_answer"])
+    final_answer = turn["final_answer"]
     
+    # Queue AI response
+    if final_answer:
+        chat_writer.enqueue_message(supabase_user_client, session_id_str, user_id, "ai", final_answer, thinking=thinking_steps)
+    
+    # Where this turn's time went (supervisor, tools, cache, DB), for debugging slow turns
+    if trace is not None:
+        yield f"data: {json.dumps({'type': 'trace', 'trace_id': trace.trace_id, 'timings': trace.summary()})}\n\n"
+
+async def stream_agent_turn(messages: List[HistoryMessage], session_id_str: str, user_id: str, turn: dict):
+    """Runs the agent on the conversation and streams its events into `turn`."""
     # Convert to LangChain messages
     history = [
         HumanMessage(content=msg.text) if msg.role == 'user' else AIMessage(content=msg.text)
         for msg in messages
     ]
+    # Keep long sessions under the token budget (recent turns + rolling summary)
+    positions = [parse_timestamp(msg.created_at) if msg.created_at else None for msg in messages]
+    history = await context_manager.build(session_id_str, history, positions)
     
-    final_answer = ""
-    
-    async for event in astream_with_learning_context(history, session_id_str, user_id):
-        last_message = event["messages"][-1]
-        
-        if isinstance(last_message, AIMessage):
-            # Extract and send thinking process
-            if isinstance(last_message.content, str) and "<thinking>" in last_message.content:
-                thinking_match = re.search(r"<thinking>(.*?)</thinking>", last_message.content, re.DOTALL)
-                if thinking_match:
-                    thinking_text = thinking_match.group(1).strip()
-                    for step in thinking_text.split('\n'):
-                        if step.strip():
-                            clean_step = step.strip()
-                            thinking_steps.append(clean_step)
-                            yield f"data: {json.dumps({'type': 'thinking', 'content': clean_step})}\n\n"
-            
-            # Handle tool calls
-            if last_message.tool_calls:
-                tool_call = last_message.tool_calls[0]
-                tool_name = tool_call['name']
-                tool_args = tool_call['args']
-                
-                executing_message = f"⚙️ Using {tool_name}..."
-                thinking_steps.append(executing_message)
-                yield f"data: {json.dumps({'type': 'thinking', 'content': executing_message})}\n\n"
-            
-            # Extract final answer (without thinking tags)
-            if isinstance(last_message.content, str):
-                final_content = re.sub(r"<thinking>.*?</thinking>", "", last_message.content, flags=re.DOTALL).strip()
-                
-                if final_content and not last_message.tool_calls:
-                    final_answer = final_content
-                    yield f"data: {json.dumps({'type': 'final_answer', 'content': final_answer})}\n\n"
-    
-    # Save AI response
-    if final_answer:
-        supabase_user_client.table('chat_messages').insert({
-            "session_id": session_id_str,
-            "user_id": user_id,
-            "role": "ai",
-            "content": final_answer
-        }).execute()
+    stream_events = stream_token_events if CHAT_STREAM_MODE == "tokens" else stream_values_events
+    try:
+        async for sse_event in stream_events(history, session_id_str, user_id, turn):
+            yield sse_event
+    except LLMOverloaded as e:
+        # Shed by admission control: tell the client to retry rather than leaving the turn hanging
+        print(f"Chat turn shed: {e}")
+        overloaded = {'type': 'error', 'code': 'overloaded', 'content': "The tutor is busy right now, please try again in a few seconds.", 'retry_after': max(1, round(e.retry_after))}
+        yield f"data: {json.dumps(overloaded)}\n\n"
+        turn["final_answer"] = ""
 
 @router.post("/chat/{session_id}")
 async def invoke_agent_streaming(session_id: UUID, request: Request, chat_request: ChatRequest):
@@ -182,7 +427,7 @@ async def invoke_agent_streaming(session_id: UUID, request: Request, chat_reques
     try:
         supabase_user_client, user_id = await get_current_user_and_client(request)
         return StreamingResponse(
-            generate_events(session_id, chat_request.messages, supabase_user_client, user_id),
+            generate_events(session_id, chat_request, supabase_user_client, user_id),
             media_type="text/event-stream"
         )
     except Exception as e:
@@ -0,0 +1,165 @@
+"""
+Concept lookup: in-process trigram index vs. the ILIKE '%concept%' scan.
+
+Builds a synthetic concepts table (100k rows by default) and runs the same
+queries (substrings, exact titles, typos, reordered words) through both paths.
+The remote path is stood in for by SQLite, which like Postgres has to scan the
+whole table for a leading-wildcard LIKE; --rtt adds a simulated network round
+trip on top. Run from the backend folder:
+
+    python -m benchmarks.bench_concept_search [--concepts 100000] [--queries 200] [--rtt 0.02] [--max-posting 1000]
+
+"index (exact)" is the default index (max_posting=0); "index" caps postings
+at --max-posting, which returns the same results and may be faster or slower.
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import statistics
+import time
+
+# Placeholder settings so the app modules import; nothing here talks to them
+for name in ("GOOGLE_API_KEY", "GROQ_API_KEY", "BRAVE_API_KEY", "SUPABASE_KEY"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+
+from services.concept_index import ConceptIndex
+
+MODIFIERS = [
+    "", "Balanced", "Self-Balancing", "Persistent", "Concurrent", "Lock-Free", "Immutable", "Sparse",
+    "Dense", "Weighted", "Directed", "Undirected", "Cyclic", "Acyclic", "Randomized", "Amortized",
+    "Augmented", "Compressed", "Succinct", "External-Memory", "Cache-Oblivious", "Distributed",
+    "Bounded", "Circular", "Double-Ended", "Implicit", "Lazy", "Functional", "Parallel", "Online",
+]
+STRUCTURES = [
+    "Array", "Dynamic Array", "Linked List", "Doubly Linked List", "Stack", "Queue", "Deque",
+    "Priority Queue", "Binary Heap", "Fibonacci Heap", "Binomial Heap", "Hash Table", "Bloom Filter",
+    "Binary Tree", "Binary Search Tree", "AVL Tree", "Red-Black Tree", "B-Tree", "B+ Tree", "Splay Tree",
+    "Treap", "Trie", "Radix Tree", "Suffix Tree", "Suffix Array", "Segment Tree", "Fenwick Tree",
+    "Interval Tree", "K-D Tree", "Quadtree", "Skip List", "Disjoint Set", "Graph", "Adjacency List",
+    "Adjacency Matrix", "Cartesian Tree", "Rope", "Van Emde Boas Tree", "Sparse Table", "Cuckoo Hash Table",
+]
+OPERATIONS = [
+    "", "Insertion", "Deletion", "Search", "Traversal", "Rotation", "Merge", "Split", "Reversal",
+    "Range Query", "Point Update", "Bulk Loading", "Rebalancing", "Serialization", "Iteration",
+    "Lookup", "Resizing", "Compaction", "Construction", "Validation", "Visualization",
+    "Complexity Analysis", "Memory Layout", "Implementation", "Invariants",
+]
+
+
+SYLLABLES = ["ka", "lo", "mi", "ner", "tos", "vi", "ru", "zen", "pa", "qua", "dor", "fel", "gri", "hal", "jun", "sor"]
+
+
+def make_concepts(count: int, rng: random.Random):
+    titles = [" ".join(part for part in combo if part) for combo in itertools.product(MODIFIERS, STRUCTURES, OPERATIONS)]
+    # Past the base combinations, titles get a qualifier from a long-tailed vocabulary
+    # of made-up names (like "... in Kalomi"), as real concept tables have
+    qualifiers = ["".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize() for _ in range(5000)]
+    rows = []
+    for i in range(count):
+        title = titles[i % len(titles)]
+        if i >= len(titles):
+            title = f"{title} in {qualifiers[int(rng.paretovariate(1.2)) % len(qualifiers)]}"
+        rows.append({
+            "id": i,
+            "title": title,
+            "explanation": f"Explanation of {title}.",
+            "updated_at": f"2025-01-01T00:00:{i % 60:02d}+00:00",
+        })
+    return rows
+
+
+def make_typo(text: str, rng: random.Random) -> str:
+    i = rng.randrange(1, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+def make_queries(rows, count: int, rng: random.Random):
+    queries = []
+    kinds = ["substring", "exact", "typo", "reordered"]
+    for i in range(count):
+        kind = kinds[i % len(kinds)]
+        title = rng.choice(rows)["title"]
+        words = title.split()
+        if kind == "substring":
+            query = rng.choice(STRUCTURES).lower()
+        elif kind == "exact":
+            query = title
+        elif kind == "typo":
+            query = make_typo(rng.choice(STRUCTURES), rng)
+        else:
+            query = " ".join(reversed(words[:3]))
+        queries.append((kind, query))
+    return queries
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concepts", type=int, default=100_000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--rtt", type=float, default=0.0, help="simulated network round trip per remote query (seconds)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--max-posting", type=int, default=1000, help="ConceptIndex max_posting (0 = exact)")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    rows = make_concepts(args.concepts, rng)
+    queries = make_queries(rows, args.queries, rng)
+
+    db = sqlite3.connect(":memory:")
+    db.execute("CREATE TABLE concepts (id INTEGER PRIMARY KEY, title TEXT, explanation TEXT, updated_at TEXT)")
+    db.execute("CREATE INDEX concepts_title ON concepts (title)")
+    db.executemany("INSERT INTO concepts VALUES (:id, :title, :explanation, :updated_at)", rows)
+
+    started = time.perf_counter()
+    index = ConceptIndex(max_posting=args.max_posting)
+    index.replace_all(rows)
+    build_seconds = time.perf_counter() - started
+    exact_index = ConceptIndex(max_posting=0)
+    exact_index.replace_all(rows)
+
+    for _, query in queries:
+        index.search(query, limit=3)
+
+    results = {}
+    for name in ("ilike", "index (exact)", "index", "index (repeat)"):
+        latencies, found = [], {}
+        for kind, query in queries:
+            started = time.perf_counter()
+            if name == "ilike":
+                # Like the original tool call: every matching row comes back, the first one is used
+                matches = db.execute("SELECT explanation FROM concepts WHERE title LIKE ?", (f"%{query}%",)).fetchall()
+                hit = matches[0] if matches else None
+                if args.rtt:
+                    time.sleep(args.rtt)
+            elif name == "index (exact)":
+                hit = exact_index._search(query, 3) or None
+            elif name == "index":
+                # Uncached path: every query is scored against the index
+                hit = index._search(query, 3) or None
+            else:
+                # Same queries again, served from the result memo
+                hit = index.search(query, limit=3) or None
+            latencies.append(time.perf_counter() - started)
+            found.setdefault(kind, []).append(hit is not None)
+        results[name] = (latencies, found)
+
+    print(f"{args.concepts} concepts, {len(queries)} queries; index built in {build_seconds:.2f}s")
+    print(f"{'path':<16}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}   found by query kind")
+    for name, (latencies, found) in results.items():
+        found_summary = ", ".join(f"{kind} {sum(hits)}/{len(hits)}" for kind, hits in found.items())
+        print(
+            f"{name:<16}{percentile(latencies, 0.5) * 1000:>10.3f}{percentile(latencies, 0.99) * 1000:>10.3f}"
+            f"{statistics.mean(latencies) * 1000:>10.3f}   {found_summary}"
+        )
+
+
+if __name__ == "__main__":
+    main()
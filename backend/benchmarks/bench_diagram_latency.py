@@ -0,0 +1,91 @@
+"""
+Wall-clock latency of generate_diagram with a stubbed Groq LLM of fixed latency.
+
+Compares making the Mermaid call and then the explanation call (what the
+sync tool used to do) with the tool, which makes both calls concurrently.
+Every query is a cache miss.
+Run from the backend folder:
+
+    python -m benchmarks.bench_diagram_latency [--latency 0.8] [--requests 5]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# Placeholder settings so the app modules import; nothing here talks to them
+for name in ("GOOGLE_API_KEY", "GROQ_API_KEY", "BRAVE_API_KEY", "SUPABASE_KEY"):
+    os.environ.setdefault(name, "benchmark")
+os.environ.setdefault("SUPABASE_URL", "http://localhost:54321")
+
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableLambda
+from services import tools
+
+
+class MemoryRepo:
+    """Stands in for the knowledge_cache table."""
+
+    def __init__(self):
+        self.rows = {}
+
+    def get_cached_answer(self, cache_key, max_age=None):
+        return self.rows.get(cache_key)
+
+    def save_cached_answer(self, cache_key, question, answer, source):
+        self.rows[cache_key] = answer
+
+    async def aget_cached_answer(self, cache_key, max_age=None):
+        return self.get_cached_answer(cache_key, max_age)
+
+    async def asave_cached_answer(self, cache_key, question, answer, source):
+        self.save_cached_answer(cache_key, question, answer, source)
+
+
+def stub_llm(latency: float, output: str) -> RunnableLambda:
+    def invoke(_):
+        time.sleep(latency)
+        return AIMessage(content=output)
+
+    async def ainvoke(_):
+        await asyncio.sleep(latency)
+        return AIMessage(content=output)
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.8, help="seconds per stubbed LLM call")
+    parser.add_argument("--requests", type=int, default=5)
+    args = parser.parse_args()
+
+    tools.knowledge_cache.repo = MemoryRepo()
+    chains = tools.DiagramChains(
+        diagram=stub_llm(args.latency, "graph TD\n  A --> B"),
+        request_explanation=stub_llm(args.latency, "A two-node graph."),
+    )
+    tools.get_diagram_chains = lambda: chains
+
+    start = time.perf_counter()
+    for i in range(args.requests):
+        mermaid_code = chains.diagram.invoke({"query": f"sequential diagram {i}"}).content
+        chains.request_explanation.invoke({"query": f"sequential diagram {i}", "mermaid_code": mermaid_code})
+    sequential_s = (time.perf_counter() - start) / args.requests
+
+    async def run_async():
+        start = time.perf_counter()
+        for i in range(args.requests):
+            await tools.generate_diagram.ainvoke({"query": f"async diagram {i}"})
+        return (time.perf_counter() - start) / args.requests
+
+    async_s = asyncio.run(run_async())
+
+    print(f"stubbed LLM latency {args.latency:.2f}s, {args.requests} cache-miss requests each")
+    print(f"  sequential calls:   {sequential_s:.3f}s per diagram")
+    print(f"  generate_diagram:   {async_s:.3f}s per diagram")
+    print(f"  saved: {sequential_s - async_s:.3f}s per diagram ({1 - async_s / sequential_s:.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Micro-benchmark: CPU time spent turning values-mode snapshots into SSE events.
+
+Compares the original per-snapshot parsing (re-run the <thinking> regex and
+re.sub over the last message of every snapshot) with MessageEventDiffer on
+long synthetic transcripts. Run from the backend folder:
+
+    python -m benchmarks.bench_event_diffing
+"""
+import re
+import time
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from services.streaming import MessageEventDiffer
+
+
+def legacy_events(last_message):
+    """The original generate_events parsing, applied to one snapshot."""
+    events = []
+    if isinstance(last_message, AIMessage):
+        if isinstance(last_message.content, str) and "<thinking>" in last_message.content:
+            thinking_match = re.search(r"<thinking>(.*?)</thinking>", last_message.content, re.DOTALL)
+            if thinking_match:
+                for step in thinking_match.group(1).strip().split('\n'):
+                    if step.strip():
+                        events.append(("thinking", step.strip()))
+        if last_message.tool_calls:
+            events.append(("tool", last_message.tool_calls[0]['name']))
+        if isinstance(last_message.content, str):
+            final_content = re.sub(r"<thinking>.*?</thinking>", "", last_message.content, flags=re.DOTALL).strip()
+            if final_content and not last_message.tool_calls:
+                events.append(("answer", final_content))
+    return events
+
+
+def synthetic_turn(history_turns: int, steps: int, answer_chars: int):
+    """Builds the snapshot sequence a values-mode stream yields for one turn."""
+    thinking = "<thinking>\n" + "\n".join(f"- reasoning step {i}" for i in range(20)) + "\n</thinking>\n"
+    history = []
+    for i in range(history_turns):
+        history.append(HumanMessage(content=f"question {i} " * 20))
+        history.append(AIMessage(content="previous answer " * (answer_chars // 16)))
+    history.append(HumanMessage(content="explain and draw dijkstra"))
+
+    messages = list(history)
+    snapshots = [list(messages)]
+    for step in range(steps):
+        messages.append(AIMessage(
+            content=thinking, id=f"ai-{step}",
+            tool_calls=[{"name": "generate_diagram", "args": {"query": "dijkstra"}, "id": f"call-{step}"}],
+        ))
+        snapshots.append(list(messages))
+        # Nodes that don't add messages (routing, bookkeeping) repeat the last state
+        snapshots.append(list(messages))
+        messages.append(ToolMessage(content="tool output " * 200, tool_call_id=f"call-{step}"))
+        snapshots.append(list(messages))
+    messages.append(AIMessage(content=thinking + "final answer " * (answer_chars // 13), id="ai-final"))
+    snapshots.append(list(messages))
+    snapshots.append(list(messages))
+    return history, snapshots
+
+
+def run(history_turns: int, steps: int, answer_chars: int, repeats: int = 50):
+    history, snapshots = synthetic_turn(history_turns, steps, answer_chars)
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        legacy_count = sum(len(legacy_events(snapshot[-1])) for snapshot in snapshots)
+    legacy_ms = (time.perf_counter() - start) * 1000 / repeats
+
+    start = time.perf_counter()
+    for _ in range(repeats):
+        differ = MessageEventDiffer(history_length=len(history))
+        diff_count = sum(len(differ.diff(snapshot)) for snapshot in snapshots)
+    diff_ms = (time.perf_counter() - start) * 1000 / repeats
+
+    print(
+        f"history={history_turns:>4} turns  steps={steps:>2}  answer={answer_chars:>6} chars | "
+        f"legacy {legacy_ms:7.3f} ms/turn ({legacy_count} events) | "
+        f"diffed {diff_ms:7.3f} ms/turn ({diff_count} events) | "
+        f"{legacy_ms / diff_ms if diff_ms else float('inf'):5.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    for history_turns, steps, answer_chars in [(10, 1, 2_000), (100, 3, 10_000), (500, 6, 50_000)]:
+        run(history_turns, steps, answer_chars)
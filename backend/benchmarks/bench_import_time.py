@@ -0,0 +1,63 @@
+"""
+Cold import time of the app (`import main`), and the modules that dominate it.
+
+Runs `python -X importtime -c "import main"` in fresh interpreters with no API
+keys or Supabase settings in the environment (the app must still import), and
+reports the median total plus the slowest modules by self time (a .env file,
+if present, still applies). Run from the backend folder:
+
+    python -m benchmarks.bench_import_time [--runs 5] [--top 15]
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from collections import defaultdict
+
+SETTINGS = ("GOOGLE_API_KEY", "GROQ_API_KEY", "BRAVE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY", "SUPABASE_SERVICE_KEY")
+
+
+def import_once(env: dict):
+    """Returns (total seconds, {module: self seconds}) for one cold import of main."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    self_times, total_us = {}, 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        name = name.strip()
+        self_times[name] = int(self_us) / 1e6
+        if name == "main":
+            total_us = int(cumulative_us)
+    return total_us / 1e6, self_times
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    env = {key: value for key, value in os.environ.items() if key not in SETTINGS}
+
+    totals, self_times = [], defaultdict(list)
+    for _ in range(args.runs):
+        total, modules = import_once(env)
+        totals.append(total)
+        for name, seconds in modules.items():
+            self_times[name].append(seconds)
+
+    print(f"import main: median {statistics.median(totals) * 1000:.0f} ms over {args.runs} runs "
+          f"(min {min(totals) * 1000:.0f}, max {max(totals) * 1000:.0f})")
+    print(f"{'module':<60}{'self ms':>10}")
+    slowest = sorted(self_times.items(), key=lambda item: statistics.median(item[1]), reverse=True)
+    for name, seconds in slowest[:args.top]:
+        print(f"{name:<60}{statistics.median(seconds) * 1000:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
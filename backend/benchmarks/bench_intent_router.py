@@ -0,0 +1,104 @@
+"""
+Routing accuracy of the local intent router, and the supervisor time it saves.
+
+Trains the router on services/data/intent_training.tsv (or --training) and
+runs it over a held-out labeled query set (benchmarks/data/intent_eval.tsv;
+rows marked "history" are classified as later turns of a conversation).
+Reports the classifier's accuracy on its own, the router's coverage (share of
+queries that skip the supervisor), the precision of those local routes, every
+misroute and missed route, and the router's own latency.
+
+Latency saved is every correctly routed query times the supervisor's time to
+decide (--supervisor-latency, seconds; the p50 of
+agent_node_duration_seconds{node="supervisor"} from /metrics is a good value),
+minus the router's time on every query. Run from the backend folder:
+
+    python -m benchmarks.bench_intent_router [--eval benchmarks/data/intent_eval.tsv]
+        [--training services/data/intent_training.tsv] [--min-confidence 0.9] [--supervisor-latency 1.2]
+"""
+import argparse
+import statistics
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+from core.config import INTENT_ROUTER_MIN_CONFIDENCE, INTENT_ROUTER_TRAINING_PATH
+from services.intent_router import SUPERVISOR, IntentRouter, load_examples
+
+DEFAULT_EVAL = Path(__file__).parent / "data" / "intent_eval.tsv"
+
+
+def load_eval(path: Path) -> List[Tuple[str, str, bool]]:
+    """(label, query, has_history) rows; the optional third column "history" marks a mid-conversation turn."""
+    rows = []
+    for label, rest in load_examples(path):
+        query, _, context = rest.partition("\t")
+        rows.append((label, query.strip(), context.strip() == "history"))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--eval", default=str(DEFAULT_EVAL), help="labeled queries to evaluate on")
+    parser.add_argument("--training", default=INTENT_ROUTER_TRAINING_PATH, help="labeled queries to train on")
+    parser.add_argument("--min-confidence", type=float, default=INTENT_ROUTER_MIN_CONFIDENCE)
+    parser.add_argument("--supervisor-latency", type=float, default=1.2, help="seconds a supervisor call takes to pick a tool")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    router = IntentRouter.from_file(args.training, min_confidence=args.min_confidence)
+    training_ms = (time.perf_counter() - started) * 1000
+    examples = load_eval(args.eval)
+
+    model_correct = 0
+    routed = routed_correct = 0
+    confusion = Counter()
+    misroutes, missed, timings = [], [], []
+    for label, query, has_history in examples:
+        model_label, _ = router.classifier.predict(query)
+        model_correct += model_label == label
+
+        started = time.perf_counter()
+        decision = router.classify(query, has_history=has_history)
+        timings.append(time.perf_counter() - started)
+        confusion[label, decision.intent] += 1
+
+        if decision.routed:
+            routed += 1
+            if decision.intent == label:
+                routed_correct += 1
+            else:
+                misroutes.append((label, decision, query))
+        elif label != SUPERVISOR:
+            missed.append((label, decision, query))
+
+    total = len(examples)
+    routable = sum(1 for label, _, _ in examples if label != SUPERVISOR)
+    print(f"{total} labeled queries ({routable} routable), trained in {training_ms:.1f} ms")
+    print(f"classifier alone: {model_correct}/{total} correct ({model_correct / total:.1%})")
+    print(f"router: {routed}/{total} routed locally ({routed / total:.1%} coverage), "
+          f"precision {routed_correct}/{routed} ({routed_correct / routed if routed else 0:.1%}), "
+          f"recall {routed_correct}/{routable} ({routed_correct / routable if routable else 0:.1%})")
+
+    labels = sorted({label for label, _, _ in examples} | {SUPERVISOR})
+    print()
+    print(f"{'labeled -> routed':<18}" + "".join(f"{label:>12}" for label in labels))
+    for label in labels:
+        print(f"{label:<18}" + "".join(f"{confusion[label, routed_to]:>12}" for routed_to in labels))
+
+    for title, rows in (("misroutes", misroutes), ("sent to the supervisor", missed)):
+        if rows:
+            print(f"\n{title}:")
+            for label, decision, query in rows:
+                print(f"  [{label} -> {decision.intent}, {decision.method}, p={decision.confidence:.2f}] {query}")
+
+    router_seconds = sum(timings)
+    saved = routed_correct * args.supervisor_latency - router_seconds
+    print(f"\nrouter latency: p50 {statistics.median(timings) * 1e6:.0f} us, max {max(timings) * 1e6:.0f} us")
+    print(f"latency saved: {saved:.1f}s over {total} turns ({saved / total * 1000:.0f} ms per turn on average, "
+          f"{args.supervisor_latency * 1000:.0f} ms per routed turn) at {args.supervisor_latency}s per supervisor call")
+
+
+if __name__ == "__main__":
+    main()
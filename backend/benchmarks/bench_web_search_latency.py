@@ -0,0 +1,75 @@
+"""
+Tail latency of the web search HTTP client against the local Brave stub.
+
+The stub answers most requests quickly but a fraction very slowly (and some
+with 503s). Compares no retries, retries only, and retries + hedging. Run from
+the backend folder:
+
+    python -m benchmarks.bench_web_search_latency [--requests 400] [--slow-rate 0.05]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from benchmarks.brave_stub import start_stub
+from services.http_client import ResilientHTTPClient, RetryBudget
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+async def drive(client: ResilientHTTPClient, url: str, requests: int, concurrency: int):
+    latencies, failures = [], 0
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        nonlocal failures
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                await client.get_json(url, params={"q": f"query {i}", "count": 3})
+            except Exception:
+                failures += 1
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    await client.aclose()
+    return latencies, failures
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.03)
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=1.5)
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--hedge-after", type=float, default=0.15)
+    args = parser.parse_args()
+
+    server, url = start_stub(latency=args.latency, slow_rate=args.slow_rate,
+                             slow_latency=args.slow_latency, error_rate=args.error_rate)
+    variants = {
+        "no retries": lambda: ResilientHTTPClient(max_retries=0),
+        "retries": lambda: ResilientHTTPClient(max_retries=2, backoff_base=0.02, retry_budget=RetryBudget(ratio=0.2)),
+        "retries + hedging": lambda: ResilientHTTPClient(max_retries=2, backoff_base=0.02, retry_budget=RetryBudget(ratio=0.2), hedge_after=args.hedge_after),
+    }
+    print(f"{args.requests} requests, {args.slow_rate:.0%} slow ({args.slow_latency}s), {args.error_rate:.0%} 503s")
+    try:
+        for name, make_client in variants.items():
+            client = make_client()
+            latencies, failures = asyncio.run(drive(client, url, args.requests, args.concurrency))
+            print(
+                f"{name:>18}: p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+                f"p99 {percentile(latencies, 99) * 1000:7.1f} ms  "
+                f"failures {failures:>3}  {client.stats()}"
+            )
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
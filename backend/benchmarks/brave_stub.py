@@ -0,0 +1,110 @@
+"""
+Local Brave Search-compatible stub server with configurable latency and errors.
+
+Serves GET /res/v1/web/search?q=... with the same response shape as Brave
+(`{"web": {"results": [{"title", "description", "url"}]}}`). Point the app at
+it with BRAVE_SEARCH_URL=http://127.0.0.1:<port>/res/v1/web/search.
+
+    python -m benchmarks.brave_stub --port 8765 --latency 0.05 --slow-rate 0.05 --slow-latency 2
+
+Or in-process: `server, url = start_stub(latency=0.05)` ... `server.shutdown()`.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+SEARCH_PATH = "/res/v1/web/search"
+
+
+class StubConfig:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, slow_rate: float = 0.0,
+                 slow_latency: float = 2.0, error_rate: float = 0.0, results: int = 3):
+        self.latency = latency
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.results = results
+
+    def sample_latency(self) -> float:
+        if random.random() < self.slow_rate:
+            return self.slow_latency
+        return max(0.0, self.latency + random.uniform(-self.jitter, self.jitter))
+
+
+def make_handler(config: StubConfig):
+    class BraveStubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if url.path != SEARCH_PATH:
+                self._send(404, {"error": "not found"})
+                return
+            time.sleep(config.sample_latency())
+            if random.random() < config.error_rate:
+                self._send(503, {"error": "stub overloaded"})
+                return
+            query = parse_qs(url.query).get("q", [""])[0]
+            count = min(int(parse_qs(url.query).get("count", [config.results])[0]), config.results)
+            results = [
+                {
+                    "title": f"Result {i + 1} for {query}",
+                    "description": f"Stubbed description {i + 1} about {query}.",
+                    "url": f"https://example.com/{i + 1}",
+                }
+                for i in range(count)
+            ]
+            self._send(200, {"query": {"original": query}, "web": {"results": results}})
+
+        def _send(self, status: int, payload: dict):
+            body = json.dumps(payload).encode()
+            try:
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client gave up (e.g. the losing side of a hedged request)
+                pass
+
+        def log_message(self, format, *args):
+            pass
+
+    return BraveStubHandler
+
+
+def start_stub(host: str = "127.0.0.1", port: int = 0, **config) -> "tuple[ThreadingHTTPServer, str]":
+    """Starts the stub on a background thread; returns the server and its search URL."""
+    server = ThreadingHTTPServer((host, port), make_handler(StubConfig(**config)))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}{SEARCH_PATH}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Brave Search-compatible stub server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer(
+        (args.host, args.port),
+        make_handler(StubConfig(args.latency, args.jitter, args.slow_rate, args.slow_latency, args.error_rate)),
+    )
+    print(f"Brave stub listening on http://{args.host}:{args.port}{SEARCH_PATH}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Offline evaluation of cache hit rates on a sample query log.
+
+Replays the log in order and compares two ways of keying the
+diagram/web cache:
+
+- legacy:    md5 of the lowercased, stripped query (the original key)
+- canonical: key built from canonicalize_query()
+
+Run from the backend folder:
+
+    python -m benchmarks.eval_cache_matching [log.tsv] [--show-matches]
+"""
+import argparse
+import hashlib
+from pathlib import Path
+from services.query_normalizer import canonicalize_query
+
+DEFAULT_LOG = Path(__file__).parent / "data" / "sample_query_log.tsv"
+
+# Upstream calls a miss costs: Mermaid + explanation for diagrams, one Brave call for search
+UPSTREAM_CALLS = {"diagram": 2, "web_search": 1}
+
+
+def load_log(path: Path):
+    entries = []
+    for line in path.read_text().splitlines():
+        if line.strip() and not line.startswith("#"):
+            source, query = line.split("\t", 1)
+            entries.append((source, query))
+    return entries
+
+
+def replay(entries, strategy: str, show_matches: bool = False):
+    cached = {}
+    hits = upstream_calls = 0
+    for source, query in entries:
+        if strategy == "legacy":
+            key = hashlib.md5(f"{source}:{query}".lower().strip().encode()).hexdigest()
+        else:
+            key = hashlib.md5(f"{source}:{canonicalize_query(query)}".encode()).hexdigest()
+
+        if key in cached:
+            hits += 1
+            if show_matches and cached[key] != query:
+                print(f"  {query!r} -> {cached[key]!r}")
+            continue
+
+        upstream_calls += UPSTREAM_CALLS.get(source, 1)
+        cached[key] = query
+    return hits, upstream_calls
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("log", nargs="?", type=Path, default=DEFAULT_LOG)
+    parser.add_argument("--show-matches", action="store_true")
+    args = parser.parse_args()
+
+    entries = load_log(args.log)
+    print(f"{len(entries)} queries from {args.log.name}")
+    for strategy in ("legacy", "canonical"):
+        hits, upstream_calls = replay(entries, strategy, args.show_matches and strategy == "canonical")
+        print(f"{strategy:>10}: hit rate {hits / len(entries):6.1%}  ({hits} hits, {upstream_calls} upstream calls)")
+
+
+if __name__ == "__main__":
+    main()
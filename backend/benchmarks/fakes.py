@@ -0,0 +1,432 @@
+"""
+In-process stand-ins for the app's external services, for offline load tests.
+
+- FakeSupabase: in-memory tables behind the subset of the supabase-py /
+  PostgREST query builder the repositories use.
+- FakeSupervisorLLM: a streaming chat model that routes prompts to tools
+  by keyword, the way the real supervisor prompt asks Gemini to.
+- fake_diagram_chains / fake_summarizer: Groq stand-ins.
+- Brave is served by benchmarks.brave_stub.
+
+Every fake takes a StubConfig (latency, jitter, slow_rate, slow_latency,
+error_rate). Profiles are written as "latency=0.4,jitter=0.1,error_rate=0.01".
+"""
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage, HumanMessage
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import RunnableLambda
+from postgrest.exceptions import APIError
+from pydantic import ConfigDict
+
+from benchmarks.brave_stub import StubConfig
+
+
+class InjectedError(RuntimeError):
+    """Raised by a fake to simulate an upstream failure."""
+
+
+def parse_profile(text: str, **defaults) -> StubConfig:
+    """StubConfig from "latency=0.4,jitter=0.1,slow_rate=0.02,slow_latency=3,error_rate=0.01"."""
+    values = dict(defaults)
+    for item in filter(None, (part.strip() for part in (text or "").split(","))):
+        name, _, value = item.partition("=")
+        name = name.strip().replace("-", "_")
+        if name not in ("latency", "jitter", "slow_rate", "slow_latency", "error_rate"):
+            raise ValueError(f"Unknown profile setting {name!r} in {text!r}")
+        values[name] = float(value)
+    return StubConfig(**values)
+
+
+def profile_dict(profile: StubConfig) -> dict:
+    return {name: getattr(profile, name) for name in ("latency", "jitter", "slow_rate", "slow_latency", "error_rate")}
+
+
+def should_fail(profile: StubConfig) -> bool:
+    return random.random() < profile.error_rate
+
+
+def now_iso() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+# --- Supabase ---
+
+class FakeResponse:
+    def __init__(self, data, count: Optional[int] = None):
+        self.data = data
+        self.count = count
+
+
+def _split_top_level(text: str) -> List[str]:
+    """Splits a PostgREST logic expression on commas outside parentheses and quotes."""
+    parts, depth, quoted, current = [], 0, False, []
+    for char in text:
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append("".join(current))
+            current = []
+            continue
+        current.append(char)
+    parts.append("".join(current))
+    return parts
+
+
+COMPARISONS = {
+    "eq": lambda a, b: a == b,
+    "neq": lambda a, b: a != b,
+    "lt": lambda a, b: a < b,
+    "lte": lambda a, b: a <= b,
+    "gt": lambda a, b: a > b,
+    "gte": lambda a, b: a >= b,
+}
+
+
+def _logic_predicate(expression: str, combine=any):
+    """Predicate for an `or=(...)` / `and(...)` filter body such as keyset_before() builds."""
+    terms = []
+    for part in _split_top_level(expression):
+        match = re.fullmatch(r"(and|or)\((.*)\)", part)
+        if match:
+            terms.append(_logic_predicate(match.group(2), all if match.group(1) == "and" else any))
+            continue
+        column, op, value = part.split(".", 2)
+        value = value[1:-1] if value.startswith('"') else value
+        compare = COMPARISONS[op]
+        terms.append(lambda row, column=column, compare=compare, value=value: row.get(column) is not None and compare(str(row[column]), value))
+    return lambda row: combine(term(row) for term in terms)
+
+
+def _like_pattern(pattern: str, flags: int = 0):
+    regex = "".join(".*" if char == "%" else "." if char == "_" else re.escape(char) for char in pattern)
+    return re.compile(f"^{regex}$", flags | re.DOTALL)
+
+
+class FakeQuery:
+    """One table operation; filters, ordering and paging are applied on execute()."""
+
+    def __init__(self, db: "FakeSupabase", table: str):
+        self.db = db
+        self.table = table
+        self.operation = "select"
+        self.columns = "*"
+        self.payload: Any = None
+        self.conflict_column = ""
+        self.ignore_duplicates = False
+        self.count_requested = False
+        self.returning_minimal = False
+        self.filters = []
+        self.orders = []
+        self.offset = 0
+        self.row_limit: Optional[int] = None
+        self.single_row = False
+
+    # Operations
+    def select(self, columns: str = "*", count=None):
+        self.operation, self.columns, self.count_requested = "select", columns, count is not None
+        return self
+
+    def insert(self, payload):
+        self.operation, self.payload = "insert", payload
+        return self
+
+    def upsert(self, payload, on_conflict: str = "", returning=None, ignore_duplicates: bool = False):
+        self.operation, self.payload, self.conflict_column = "upsert", payload, on_conflict
+        self.ignore_duplicates = ignore_duplicates
+        return self
+
+    def update(self, payload: dict):
+        self.operation, self.payload = "update", payload
+        return self
+
+    def delete(self, count=None, returning=None):
+        self.operation, self.count_requested = "delete", count is not None
+        self.returning_minimal = getattr(returning, "value", returning) == "minimal"
+        return self
+
+    # Filters
+    def eq(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) == str(value))
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and str(row[column]) > str(value))
+        return self
+
+    def lt(self, column, value):
+        self.filters.append(lambda row: row.get(column) is not None and str(row[column]) < str(value))
+        return self
+
+    def in_(self, column, values):
+        wanted = {str(value) for value in values}
+        self.filters.append(lambda row: str(row.get(column)) in wanted)
+        return self
+
+    def like(self, column, pattern):
+        regex = _like_pattern(pattern)
+        self.filters.append(lambda row: regex.match(str(row.get(column) or "")) is not None)
+        return self
+
+    def ilike(self, column, pattern):
+        regex = _like_pattern(pattern, re.IGNORECASE)
+        self.filters.append(lambda row: regex.match(str(row.get(column) or "")) is not None)
+        return self
+
+    def or_(self, expression: str):
+        self.filters.append(_logic_predicate(expression))
+        return self
+
+    # Shaping
+    def order(self, column, desc: bool = False):
+        self.orders.append((column, desc))
+        return self
+
+    def limit(self, size: int):
+        self.row_limit = size
+        return self
+
+    def range(self, start: int, end: int):
+        self.offset, self.row_limit = start, end - start + 1
+        return self
+
+    def single(self):
+        self.single_row = True
+        return self
+
+    def _project(self, row: dict) -> dict:
+        if self.columns.strip() == "*":
+            return dict(row)
+        return {column.strip(): row.get(column.strip()) for column in self.columns.split(",")}
+
+    def execute(self) -> FakeResponse:
+        # Blocking, like supabase-py; the app runs these on its DB thread pool
+        time.sleep(self.db.profile.sample_latency())
+        if should_fail(self.db.profile):
+            raise APIError({"message": "Injected database error", "code": "503"})
+        with self.db.lock:
+            self.db.calls += 1
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.operation == "insert":
+                payload = self.payload if isinstance(self.payload, list) else [self.payload]
+                inserted = [{"id": str(uuid.uuid4()), "created_at": now_iso(), **row} for row in payload]
+                rows.extend(inserted)
+                return FakeResponse([dict(row) for row in inserted])
+
+            if self.operation == "upsert":
+                payload = self.payload if isinstance(self.payload, list) else [self.payload]
+                written = []
+                for new_row in payload:
+                    existing = [row for row in rows if row.get(self.conflict_column) == new_row.get(self.conflict_column)]
+                    if existing and self.ignore_duplicates:
+                        continue
+                    if not existing:
+                        existing = [{"id": str(uuid.uuid4()), "created_at": now_iso()}]
+                        rows.append(existing[0])
+                    for row in existing:
+                        row.update(new_row)
+                    written.extend(dict(row) for row in existing)
+                return FakeResponse(written)
+
+            matched = [row for row in rows if all(check(row) for check in self.filters)]
+            if self.operation == "update":
+                for row in matched:
+                    row.update(self.payload)
+                return FakeResponse([dict(row) for row in matched])
+            if self.operation == "delete":
+                doomed = {id(row) for row in matched}
+                self.db.tables[self.table] = [row for row in rows if id(row) not in doomed]
+                count = len(matched) if self.count_requested else None
+                return FakeResponse([] if self.returning_minimal else [dict(row) for row in matched], count)
+
+            for column, desc in reversed(self.orders):
+                matched.sort(key=lambda row: str(row.get(column) or ""), reverse=desc)
+            count = len(matched) if self.count_requested else None
+            end = None if self.row_limit is None else self.offset + self.row_limit
+            page = [self._project(row) for row in matched[self.offset:end]]
+            if self.single_row:
+                return FakeResponse(page[0] if page else None, count)
+            return FakeResponse(page, count)
+
+
+class FakeSupabase:
+    """In-memory stand-in for a supabase-py Client (tables only), shared by all users."""
+
+    def __init__(self, profile: StubConfig):
+        self.profile = profile
+        self.tables: Dict[str, List[dict]] = {}
+        self.lock = threading.Lock()
+        self.calls = 0
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def seed(self, name: str, rows: List[dict]):
+        with self.lock:
+            self.tables.setdefault(name, []).extend(rows)
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"calls": self.calls, "rows": {name: len(rows) for name, rows in self.tables.items()}}
+
+
+# --- LLMs ---
+
+TOOL_ROUTES = [
+    (re.compile(r"\b(draw|diagram|visuali[sz]e|flowchart)\b"), "generate_diagram", "query"),
+    (re.compile(r"\b(latest|recent|current|2025)\b"), "web_search", "topic"),
+    (re.compile(r"knowledge base"), "query_supabase", "concept"),
+]
+KNOWLEDGE_TOPIC = re.compile(r"look up (.+?) in the knowledge base", re.IGNORECASE)
+
+
+def route_prompt(text: str) -> List[tuple]:
+    """(tool name, args) for every routing rule of the supervisor prompt a message matches (none: answer directly)."""
+    lowered = text.lower()
+    routes = []
+    for pattern, tool_name, arg in TOOL_ROUTES:
+        if pattern.search(lowered):
+            match = KNOWLEDGE_TOPIC.search(text) if tool_name == "query_supabase" else None
+            routes.append((tool_name, {arg: match.group(1) if match else text}))
+    return routes
+
+
+class FakeSupervisorLLM(BaseChatModel):
+    """
+    Streaming chat model standing in for the supervisor's Gemini model.
+
+    Waits the profile's latency before the first token, then streams a
+    <thinking> block and an answer (or a tool call) a few words at a time,
+    `token_delay` apart. Injected errors are raised before the first token.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    profile: Any
+    token_delay: float = 0.01
+    words_per_chunk: int = 3
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-supervisor"
+
+    def _plan(self, messages: List[BaseMessage]):
+        question = next((m.content for m in reversed(messages) if isinstance(m, HumanMessage)), "")
+        question = question if isinstance(question, str) else str(question)
+        routes = route_prompt(question)
+        plan = "Use " + " and ".join(tool_name for tool_name, _ in routes) if routes else "Answer directly, no tools needed"
+        thinking = f"<thinking>\n- The user asks: {question[:80]}\n- {plan}.\n</thinking>\n\n"
+        if routes:
+            return thinking, routes
+        answer = (
+            f"Here is an explanation. {question} comes down to how the structure organizes its data, "
+            "which operations it makes cheap, and what it costs in memory. "
+            "Insertions, lookups and deletions each have a typical and a worst-case complexity worth knowing."
+        )
+        return thinking + answer, None
+
+    def _pieces(self, text: str) -> List[str]:
+        words = text.split(" ")
+        return [" ".join(words[i:i + self.words_per_chunk]) + (" " if i + self.words_per_chunk < len(words) else "")
+                for i in range(0, len(words), self.words_per_chunk)]
+
+    @staticmethod
+    def _final_chunk(messages: List[BaseMessage], text: str, routes) -> AIMessageChunk:
+        """Closing chunk: the tool calls (if any) and token usage (~4 characters per token), as Gemini reports it."""
+        input_tokens = sum(len(str(m.content)) for m in messages) // 4
+        output_tokens = len(text) // 4
+        usage = {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+        tool_calls = [
+            tool_call_chunk(name=tool_name, args=json.dumps(args), id=f"call_{uuid.uuid4().hex[:12]}", index=index)
+            for index, (tool_name, args) in enumerate(routes or [])
+        ]
+        return AIMessageChunk(content="", tool_call_chunks=tool_calls, usage_metadata=usage)
+
+    def _stream(self, messages: List[BaseMessage], stop=None, run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.profile.sample_latency())
+        if should_fail(self.profile):
+            raise InjectedError("Injected supervisor LLM error")
+        text, routes = self._plan(messages)
+        for piece in self._pieces(text):
+            time.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=self._final_chunk(messages, text, routes))
+
+    async def _astream(self, messages: List[BaseMessage], stop=None, run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.profile.sample_latency())
+        if should_fail(self.profile):
+            raise InjectedError("Injected supervisor LLM error")
+        text, routes = self._plan(messages)
+        for piece in self._pieces(text):
+            await asyncio.sleep(self.token_delay)
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+        yield ChatGenerationChunk(message=self._final_chunk(messages, text, routes))
+
+    def _generate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        chunks = list(self._stream(messages, stop, run_manager, **kwargs))
+        message = chunks[0].message
+        for chunk in chunks[1:]:
+            message = message + chunk.message
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=message.content, tool_calls=message.tool_calls, usage_metadata=message.usage_metadata))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop=None, run_manager=None, **kwargs) -> ChatResult:
+        chunks = [chunk async for chunk in self._astream(messages, stop, run_manager, **kwargs)]
+        message = chunks[0].message
+        for chunk in chunks[1:]:
+            message = message + chunk.message
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=message.content, tool_calls=message.tool_calls, usage_metadata=message.usage_metadata))])
+
+
+def fake_llm_runnable(profile: StubConfig, output: str) -> RunnableLambda:
+    """Prompt-plus-LLM chain stand-in returning a fixed message after the profile's latency."""
+    def invoke(_):
+        time.sleep(profile.sample_latency())
+        if should_fail(profile):
+            raise InjectedError("Injected Groq error")
+        return AIMessage(content=output)
+
+    async def ainvoke(_):
+        await asyncio.sleep(profile.sample_latency())
+        if should_fail(profile):
+            raise InjectedError("Injected Groq error")
+        return AIMessage(content=output)
+
+    return RunnableLambda(invoke, afunc=ainvoke)
+
+
+def fake_diagram_chains(profile: StubConfig):
+    from services.tools import DiagramChains
+    return DiagramChains(
+        diagram=fake_llm_runnable(profile, "graph TD\n  A[Root] --> B[Left]\n  A --> C[Right]"),
+        request_explanation=fake_llm_runnable(profile, "A root node with two children."),
+    )
+
+
+def fake_summarizer(profile: StubConfig):
+    async def summarize(previous_summary: str, messages: list) -> str:
+        await asyncio.sleep(profile.sample_latency())
+        if should_fail(profile):
+            raise InjectedError("Injected summarizer error")
+        return (previous_summary + f" {len(messages)} more messages about data structures.").strip()
+    return summarize
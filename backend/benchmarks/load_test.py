@@ -0,0 +1,418 @@
+"""
+Offline end-to-end load test of the FastAPI app against local stand-ins.
+
+Starts `main.app` under uvicorn on a background thread, with Gemini, Groq,
+Brave and Supabase replaced by the fakes in benchmarks.fakes and
+benchmarks.brave_stub, each with its own latency/error profile. Then N
+virtual users each create a session, and for every turn stream a chat
+answer over SSE from /api/chat/{session_id} and revalidate /api/sessions
+with If-None-Match.
+
+Reports time to first event, full-turn latency percentiles (overall and by
+prompt kind), per-endpoint latencies, throughput, and the server event
+loop's lag (how late a 10 ms timer fires). Results are written as JSON;
+--compare prints the change against an earlier run. Nothing leaves the
+machine. Run from the backend folder:
+
+    python -m benchmarks.load_test [--users 50] [--turns 3]
+        [--supervisor "latency=0.6,jitter=0.2,error_rate=0.01"] [--db "latency=0.02"]
+        [--output results.json] [--compare previous.json]
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+
+# Before the app is imported: no startup warmup (it would build real clients),
+# and a Brave key so web_search runs (against the local stub)
+os.environ["STARTUP_WARMUP"] = "0"
+os.environ["BRAVE_API_KEY"] = "load-test"
+
+import httpx
+import uvicorn
+
+from benchmarks.bench_concept_search import STRUCTURES, make_concepts
+from benchmarks.brave_stub import start_stub
+from benchmarks.fakes import (
+    FakeSupabase, FakeSupervisorLLM, fake_diagram_chains, fake_summarizer, parse_profile, profile_dict,
+)
+
+RESULTS_DIR = Path(__file__).parent / "results"
+
+PROMPTS = [
+    ("direct", "Explain how a {topic} works"),
+    ("direct", "What is the time complexity of {topic} operations?"),
+    ("diagram", "Draw a diagram of a {topic}"),
+    ("web_search", "What are the latest developments in {topic} research?"),
+    ("knowledge_base", "Look up {topic} in the knowledge base"),
+    ("multi_tool", "Draw a {topic} and find the latest research on it"),
+]
+
+# Key metrics shown by --compare (path into the results, lower is better)
+COMPARED_METRICS = [
+    ("chat_turns", "time_to_first_event_ms", "p50"),
+    ("chat_turns", "time_to_first_event_ms", "p99"),
+    ("chat_turns", "turn_latency_ms", "p50"),
+    ("chat_turns", "turn_latency_ms", "p99"),
+    ("endpoints", "list_sessions", "latency_ms", "p99"),
+    ("event_loop_lag_ms", "p99"),
+    ("event_loop_lag_ms", "max"),
+    ("chat_turns", "error_rate"),
+]
+
+
+def summarize(values) -> dict:
+    """Latency summary in milliseconds."""
+    if not values:
+        return {"count": 0}
+    ordered = sorted(values)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))] * 1000, 2)
+
+    return {
+        "count": len(ordered),
+        "mean": round(statistics.mean(ordered) * 1000, 2),
+        "p50": pct(50), "p90": pct(90), "p99": pct(99),
+        "max": round(ordered[-1] * 1000, 2),
+    }
+
+
+class Recorder:
+    """Collects the client-side measurements of one run."""
+
+    def __init__(self):
+        self.first_event = []
+        self.turns = []
+        self.turns_by_kind = {}
+        self.turn_errors = {}
+        self.requests = {}
+        self.request_errors = {}
+        self.not_modified = 0
+
+    def turn(self, kind: str, first_event, elapsed: float, error=None):
+        if error:
+            self.turn_errors[error] = self.turn_errors.get(error, 0) + 1
+            return
+        self.first_event.append(first_event)
+        self.turns.append(elapsed)
+        self.turns_by_kind.setdefault(kind, []).append(elapsed)
+
+    def request(self, name: str, elapsed: float, error=None):
+        if error:
+            errors = self.request_errors.setdefault(name, {})
+            errors[error] = errors.get(error, 0) + 1
+        else:
+            self.requests.setdefault(name, []).append(elapsed)
+
+
+class LoopLagMonitor:
+    """Measures how late a short timer fires on an event loop (time the loop spent blocked)."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.lags = []
+        self.running = True
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while self.running:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.lags.append(max(0.0, loop.time() - started - self.interval))
+
+
+class ServerThread:
+    """Runs the app under uvicorn on its own thread and event loop."""
+
+    def __init__(self, app, port: int, log_level: str = "warning"):
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level=log_level, lifespan="on"))
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_until_complete, args=(self.server.serve(),), daemon=True)
+
+    def start(self, timeout: float = 30.0):
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if not self.thread.is_alive() or time.monotonic() > deadline:
+                raise RuntimeError("Server failed to start")
+            time.sleep(0.02)
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=30)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def install_fakes(args, spill_dir: str):
+    """Points the app's external dependencies at the fakes; returns the fake database and the Brave stub."""
+    import api.chat
+    from services import agent, tools
+    from services.write_behind import chat_writer
+
+    db = FakeSupabase(parse_profile(args.db))
+    db.seed("concepts", make_concepts(args.concepts, random.Random(args.seed)))
+
+    async def fake_user_and_client(request):
+        # Every virtual user shares the in-memory database; the token names the user
+        token = request.headers.get("Authorization", "").removeprefix("Bearer ")
+        return db, str(uuid.uuid5(uuid.NAMESPACE_URL, token))
+
+    api.chat.get_current_user_and_client = fake_user_and_client
+    tools.knowledge_repo.client = db
+    chat_writer.fallback_client = db
+    chat_writer.spill_path = Path(spill_dir) / "write_behind.jsonl"
+
+    supervisor = FakeSupervisorLLM(profile=parse_profile(args.supervisor), token_delay=args.token_delay)
+    supervisor_chain = agent.supervisor_prompt | supervisor
+    agent.get_supervisor_chain = lambda: supervisor_chain
+    diagram_chains = fake_diagram_chains(parse_profile(args.groq))
+    tools.get_diagram_chains = lambda: diagram_chains
+    summarizer = fake_summarizer(parse_profile(args.groq))
+    agent.get_summarizer = lambda: summarizer
+
+    brave_profile = profile_dict(parse_profile(args.brave))
+    brave_server, brave_url = start_stub(**brave_profile)
+    tools.BRAVE_SEARCH_URL = brave_url
+    return db, brave_server
+
+
+async def stream_turn(client: httpx.AsyncClient, base_url: str, headers: dict, session_id: str, prompt: str):
+    """Streams one chat turn; returns (seconds to first event, total seconds, error or None)."""
+    started = time.perf_counter()
+    first_event, final_answer, error = None, False, None
+    try:
+        async with client.stream("POST", f"{base_url}/api/chat/{session_id}", json={"message": prompt}, headers=headers) as response:
+            if response.status_code != 200:
+                return None, time.perf_counter() - started, f"http_{response.status_code}"
+            async for line in response.aiter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if first_event is None:
+                    first_event = time.perf_counter() - started
+                event = json.loads(line[len("data: "):])
+                if event.get("type") == "final_answer":
+                    final_answer = True
+                elif event.get("type") == "error":
+                    # e.g. "overloaded" when LLM admission control shed the turn
+                    error = event.get("code", "error")
+    except httpx.HTTPError as e:
+        return first_event, time.perf_counter() - started, type(e).__name__
+    elapsed = time.perf_counter() - started
+    return first_event, elapsed, error or (None if final_answer else "no_final_answer")
+
+
+async def timed_request(recorder: Recorder, name: str, send, ok_statuses=(200,)):
+    started = time.perf_counter()
+    try:
+        response = await send()
+    except httpx.HTTPError as e:
+        recorder.request(name, time.perf_counter() - started, type(e).__name__)
+        return None
+    error = None if response.status_code in ok_statuses else f"http_{response.status_code}"
+    recorder.request(name, time.perf_counter() - started, error)
+    return response
+
+
+async def virtual_user(index: int, client: httpx.AsyncClient, base_url: str, args, recorder: Recorder, rng: random.Random):
+    await asyncio.sleep(rng.uniform(0, args.ramp_up))
+    headers = {"Authorization": f"Bearer load-test-user-{index}"}
+
+    response = await timed_request(recorder, "create_session", lambda: client.post(f"{base_url}/api/sessions", headers=headers))
+    if response is None or response.status_code != 200:
+        return
+    session_id = response.json()["id"]
+
+    etag = None
+    for _ in range(args.turns):
+        kind, template = rng.choice(PROMPTS)
+        prompt = template.format(topic=rng.choice(STRUCTURES).lower())
+        first_event, elapsed, error = await stream_turn(client, base_url, headers, session_id, prompt)
+        recorder.turn(kind, first_event, elapsed, error)
+
+        # The sidebar refreshes the session list after each turn, revalidating with its ETag
+        list_headers = dict(headers, **({"If-None-Match": etag} if etag else {}))
+        response = await timed_request(
+            recorder, "list_sessions", lambda: client.get(f"{base_url}/api/sessions", headers=list_headers), ok_statuses=(200, 304),
+        )
+        if response is not None:
+            recorder.not_modified += response.status_code == 304
+            etag = response.headers.get("ETag", etag)
+        await asyncio.sleep(rng.uniform(0, args.think_time * 2))
+
+
+async def drive(base_url: str, args, recorder: Recorder) -> float:
+    rng = random.Random(args.seed)
+    limits = httpx.Limits(max_connections=args.users * 2, max_keepalive_connections=args.users * 2)
+    async with httpx.AsyncClient(timeout=httpx.Timeout(args.timeout), limits=limits) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(
+            virtual_user(i, client, base_url, args, recorder, random.Random(rng.random())) for i in range(args.users)
+        ))
+        return time.perf_counter() - started
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def build_results(args, started_at: str, recorder: Recorder, duration: float, lags, server_stats, db) -> dict:
+    turns_attempted = len(recorder.turns) + sum(recorder.turn_errors.values())
+    total_requests = turns_attempted + sum(len(v) for v in recorder.requests.values()) + sum(
+        sum(errors.values()) for errors in recorder.request_errors.values()
+    )
+    return {
+        "benchmark": "load_test",
+        "started_at": started_at,
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "config": {
+            "users": args.users, "turns": args.turns, "ramp_up": args.ramp_up, "think_time": args.think_time,
+            "token_delay": args.token_delay, "concepts": args.concepts, "seed": args.seed,
+            "profiles": {
+                name: profile_dict(parse_profile(getattr(args, name)))
+                for name in ("supervisor", "groq", "brave", "db")
+            },
+        },
+        "duration_s": round(duration, 3),
+        "throughput": {
+            "turns_per_s": round(len(recorder.turns) / duration, 3) if duration else 0.0,
+            "requests_per_s": round(total_requests / duration, 3) if duration else 0.0,
+        },
+        "chat_turns": {
+            "attempted": turns_attempted,
+            "completed": len(recorder.turns),
+            "errors": recorder.turn_errors,
+            "error_rate": round(sum(recorder.turn_errors.values()) / turns_attempted, 4) if turns_attempted else 0.0,
+            "time_to_first_event_ms": summarize(recorder.first_event),
+            "turn_latency_ms": summarize(recorder.turns),
+            "turn_latency_by_kind_ms": {kind: summarize(values) for kind, values in sorted(recorder.turns_by_kind.items())},
+        },
+        "endpoints": {
+            name: {
+                "latency_ms": summarize(values),
+                "errors": recorder.request_errors.get(name, {}),
+                **({"not_modified": recorder.not_modified} if name == "list_sessions" else {}),
+            }
+            for name, values in recorder.requests.items()
+        },
+        "event_loop_lag_ms": summarize(lags),
+        "server_stats": server_stats,
+        "fake_database": db.stats(),
+    }
+
+
+def metric(results: dict, path):
+    value = results
+    for key in path:
+        if not isinstance(value, dict) or key not in value:
+            return None
+        value = value[key]
+    return value
+
+
+def print_comparison(previous: dict, current: dict):
+    print(f"\nvs. {previous.get('git_commit', '?')} ({previous.get('started_at', '?')})")
+    print(f"{'metric':<52}{'before':>12}{'after':>12}{'change':>10}")
+    for path in COMPARED_METRICS:
+        before, after = metric(previous, path), metric(current, path)
+        if before is None or after is None:
+            continue
+        change = f"{(after - before) / before:+.0%}" if before else "n/a"
+        print(f"{'.'.join(path):<52}{before:>12}{after:>12}{change:>10}")
+
+
+def print_report(results: dict):
+    config, turns = results["config"], results["chat_turns"]
+    print(f"{config['users']} users x {config['turns']} turns in {results['duration_s']:.1f}s "
+          f"({results['throughput']['turns_per_s']:.2f} turns/s, {results['throughput']['requests_per_s']:.2f} requests/s)")
+    print(f"turns completed {turns['completed']}/{turns['attempted']}, errors {turns['errors'] or 'none'}")
+    print(f"{'':<28}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = [("time to first event", turns["time_to_first_event_ms"]), ("full turn", turns["turn_latency_ms"])]
+    rows += [(f"  turn: {kind}", summary) for kind, summary in turns["turn_latency_by_kind_ms"].items()]
+    rows += [(name, endpoint["latency_ms"]) for name, endpoint in results["endpoints"].items()]
+    rows += [("event loop lag", results["event_loop_lag_ms"])]
+    for name, summary in rows:
+        if summary.get("count"):
+            print(f"{name:<28}{summary['p50']:>10.1f}{summary['p90']:>10.1f}{summary['p99']:>10.1f}{summary['max']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=50, help="concurrent virtual users")
+    parser.add_argument("--turns", type=int, default=3, help="chat turns per user")
+    parser.add_argument("--ramp-up", type=float, default=2.0, help="users start at random within this many seconds")
+    parser.add_argument("--think-time", type=float, default=0.5, help="mean pause between a user's turns (seconds)")
+    parser.add_argument("--supervisor", default="latency=0.6,jitter=0.2,slow_rate=0.02,slow_latency=4", help="supervisor LLM profile (time to first token)")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="seconds between streamed supervisor chunks")
+    parser.add_argument("--groq", default="latency=0.8,jitter=0.3", help="Groq diagram/summary chain profile")
+    parser.add_argument("--brave", default="latency=0.3,jitter=0.1,slow_rate=0.03,slow_latency=2,error_rate=0.01", help="Brave stub profile")
+    parser.add_argument("--db", default="latency=0.02,jitter=0.01", help="Supabase table call profile")
+    parser.add_argument("--concepts", type=int, default=2000, help="rows in the fake concepts table")
+    parser.add_argument("--timeout", type=float, default=60.0, help="client timeout per request (seconds)")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help=f"results file (default: {RESULTS_DIR.name}/load_test_<timestamp>.json)")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    parser.add_argument("--verbose", action="store_true", help="show the app's own log output")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    # The app's own prints go nowhere unless --verbose (progress goes to stderr)
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with tempfile.TemporaryDirectory() as spill_dir, quiet:
+        import main as app_main
+        db, brave_server = install_fakes(args, spill_dir)
+        # Quiet runs also hide uvicorn's tracebacks for injected errors (they are counted instead)
+        server = ServerThread(app_main.app, free_port(), log_level="warning" if args.verbose else "critical")
+        server.start()
+        base_url = f"http://127.0.0.1:{server.server.config.port}"
+        print(f"App on {base_url} with fakes; {args.users} users x {args.turns} turns...", file=sys.stderr)
+
+        started_at = datetime.now(timezone.utc).isoformat()
+        monitor = LoopLagMonitor()
+        recorder = Recorder()
+        try:
+            lag_task = asyncio.run_coroutine_threadsafe(monitor.run(), server.loop)
+            duration = asyncio.run(drive(base_url, args, recorder))
+            monitor.running = False
+            lag_task.result(timeout=5)
+            server_stats = httpx.get(f"{base_url}/stats", timeout=10).json()
+        finally:
+            server.stop()
+            brave_server.shutdown()
+
+    results = build_results(args, started_at, recorder, duration, monitor.lags, server_stats, db)
+    output = Path(args.output) if args.output else RESULTS_DIR / f"load_test_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+
+    print_report(results)
+    if args.compare:
+        print_comparison(json.loads(Path(args.compare).read_text()), results)
+    print(f"\nResults written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Tuple
+
+import httpx
+import jwt
+from supabase import create_client, Client, ClientOptions
+
+
+class SupabaseClientPool:
+    """
+    LRU pool of user-scoped Supabase clients, keyed by (user_id, token).
+
+    Every pooled client talks to Supabase through one shared httpx.Client, so
+    connections are kept alive across requests and users. An entry expires
+    together with the access token it was built for.
+    """
+
+    def __init__(
+        self,
+        supabase_url: str,
+        supabase_key: str,
+        max_size: int = 256,
+        default_ttl: int = 3600,
+        max_connections: int = 100,
+    ):
+        self.supabase_url = supabase_url
+        self.supabase_key = supabase_key
+        self.max_size = max_size
+        self.default_ttl = default_ttl
+        self.http_client = httpx.Client(
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+            ),
+            timeout=httpx.Timeout(30.0, connect=5.0),
+            follow_redirects=True,
+        )
+        self._clients: "OrderedDict[Tuple[str, str], Tuple[Client, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _token_expiry(self, token: str) -> float:
+        # The token was already verified by the caller; we only need its exp
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.PyJWTError:
+            exp = None
+        return float(exp) if exp else time.time() + self.default_ttl
+
+    def _build_client(self, token: str) -> Client:
+        # Passing the Authorization header up front makes PostgREST run as the
+        # user (RLS) without the extra auth round trip set_session would cost.
+        options = ClientOptions(
+            headers={"Authorization": f"Bearer {token}"},
+            auto_refresh_token=False,
+            persist_session=False,
+            httpx_client=self.http_client,
+        )
+        return create_client(self.supabase_url, self.supabase_key, options=options)
+
+    def get(self, user_id: str, token: str) -> Client:
+        """Returns a pooled client authenticated as the user, creating it on a miss."""
+        key = (user_id, token)
+        now = time.time()
+        with self._lock:
+            entry = self._clients.get(key)
+            if entry is not None:
+                client, expires_at = entry
+                if expires_at > now:
+                    self._clients.move_to_end(key)
+                    self.hits += 1
+                    return client
+                del self._clients[key]
+            self.misses += 1
+
+        client = self._build_client(token)
+        expires_at = self._token_expiry(token)
+
+        with self._lock:
+            self._clients[key] = (client, expires_at)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_size:
+                self._clients.popitem(last=False)
+                self.evictions += 1
+        return client
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "size": len(self._clients),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._clients.clear()
+        self.http_client.close()
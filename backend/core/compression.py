@@ -0,0 +1,138 @@
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    # In requirements.txt; if it is missing, responses fall back to gzip
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Already compressed, or (event streams) must reach the client as each chunk is sent
+EXCLUDED_CONTENT_TYPES = (
+    "text/event-stream", "application/gzip", "application/x-gzip", "application/zip",
+    "image/", "audio/", "video/", "font/woff",
+)
+
+
+def accepted_encodings(accept_encoding: str) -> set:
+    """Codings an Accept-Encoding header allows (those listed without q=0)."""
+    accepted = set()
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.partition(";")
+        params = params.strip()
+        try:
+            quality = float(params[2:]) if params.startswith("q=") else 1.0
+        except ValueError:
+            quality = 0.0
+        if coding.strip() and quality > 0:
+            accepted.add(coding.strip())
+    return accepted
+
+
+class GzipStream:
+    """gzip body encoder; chunks of a streamed body are flushed as they are sent."""
+
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        return self._compressor.compress(body) + self._compressor.flush(zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH)
+
+
+class ZstdStream:
+    """zstd body encoder; chunks of a streamed body are flushed as they are sent."""
+
+    def __init__(self, level: int):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, body: bytes, more_body: bool) -> bytes:
+        flush_mode = zstandard.COMPRESSOBJ_FLUSH_BLOCK if more_body else zstandard.COMPRESSOBJ_FLUSH_FINISH
+        return self._compressor.compress(body) + self._compressor.flush(flush_mode)
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies of at least `minimum_size` bytes with zstd or
+    gzip, whichever the client accepts (zstd preferred). Event streams are
+    left alone, so chat SSE events are never held back by a compressor.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6, zstd_level: int = 3):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.zstd_level = zstd_level
+
+    def choose_encoding(self, accept_encoding: str) -> Optional[str]:
+        accepted = accepted_encodings(accept_encoding)
+        if zstandard is not None and "zstd" in accepted:
+            return "zstd"
+        if "gzip" in accepted:
+            return "gzip"
+        return None
+
+    def open_stream(self, encoding: str):
+        if encoding == "zstd":
+            return ZstdStream(self.zstd_level)
+        return GzipStream(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or not self.minimum_size:
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self.choose_encoding(Headers(scope=scope).get("Accept-Encoding", ""))
+        # The start message is held until the first body chunk shows whether to compress
+        start: Optional[Message] = None
+        passthrough = False
+        stream = None
+
+        async def send_compressed(message: Message):
+            nonlocal start, passthrough, stream
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").partition(";")[0].strip().lower()
+                passthrough = (
+                    "content-encoding" in headers
+                    or message["status"] == 206
+                    or media_type.startswith(EXCLUDED_CONTENT_TYPES)
+                )
+                if passthrough:
+                    await send(message)
+                else:
+                    start = message
+                return
+
+            if passthrough or message["type"] != "http.response.body":
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if start is not None:
+                headers = MutableHeaders(raw=start["headers"])
+                headers.add_vary_header("Accept-Encoding")
+                if encoding is not None and (more_body or len(body) >= self.minimum_size):
+                    stream = self.open_stream(encoding)
+                    headers["Content-Encoding"] = encoding
+                    if "content-length" in headers:
+                        del headers["Content-Length"]
+                    if not more_body:
+                        body = stream.compress(body, more_body=False)
+                        headers["Content-Length"] = str(len(body))
+                        message = {**message, "body": body}
+                        stream = None
+                await send(start)
+                start = None
+
+            if stream is not None:
+                message = {**message, "body": stream.compress(body, more_body)}
+            await send(message)
+
+        await self.app(scope, receive, send_compressed)
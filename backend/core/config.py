@@ -18,13 +18,151 @@ def get_env_variable(var_name: str) -> str:
         raise ValueError(f"{var_name} is not set in the environment. Please check your .env file at {env_path}")
     return value
 
-# API Keys
-GOOGLE_API_KEY = get_env_variable("GOOGLE_API_KEY")
-GROQ_API_KEY = get_env_variable("GROQ_API_KEY")
-BRAVE_API_KEY = get_env_variable("BRAVE_API_KEY")
-SUPABASE_URL = get_env_variable("SUPABASE_URL")
-SUPABASE_KEY = get_env_variable("SUPABASE_KEY")
-
-# Set environment variables for LangChain modules
-os.environ["GOOGLE_API_KEY"] = GOOGLE_API_KEY
-os.environ["GROQ_API_KEY"] = GROQ_API_KEY
\ No newline at end of file
+# Required settings (API keys). These are read on first access rather than at
+# import time, so the app (and tools like benchmarks) can import without every
+# key present; a missing key raises when the client that needs it is built.
+REQUIRED_SETTINGS = ("GOOGLE_API_KEY", "GROQ_API_KEY", "BRAVE_API_KEY", "SUPABASE_URL", "SUPABASE_KEY")
+
+def __getattr__(name: str) -> str:
+    # Module-level __getattr__ (PEP 562): only called for names not defined yet
+    if name in REQUIRED_SETTINGS:
+        value = get_env_variable(name)
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+def is_configured(var_name: str) -> bool:
+    """True when a (required) setting has a value, without raising if it doesn't."""
+    return bool(os.getenv(var_name))
+
+def missing_settings() -> list:
+    """Required settings that are not set (used for the startup warning)."""
+    return [name for name in REQUIRED_SETTINGS if not is_configured(name)]
+
+# --- Optional settings (have sensible defaults) ---
+
+def get_int_env(var_name: str, default: int) -> int:
+    """Reads an optional integer setting, falling back to the default."""
+    value = os.getenv(var_name)
+    return int(value) if value else default
+
+def get_float_env(var_name: str, default: float) -> float:
+    """Reads an optional float setting, falling back to the default."""
+    value = os.getenv(var_name)
+    return float(value) if value else default
+
+# Auth: "local" verifies Supabase JWTs in-process, "remote" always asks Supabase Auth
+AUTH_VERIFY_MODE = os.getenv("AUTH_VERIFY_MODE", "local").lower()
+SUPABASE_JWT_SECRET = os.getenv("SUPABASE_JWT_SECRET")
+# Defaults to <SUPABASE_URL>/auth/v1/.well-known/jwks.json
+SUPABASE_JWKS_URL = os.getenv("SUPABASE_JWKS_URL")
+SUPABASE_JWT_AUDIENCE = os.getenv("SUPABASE_JWT_AUDIENCE", "authenticated")
+AUTH_TOKEN_CACHE_SIZE = get_int_env("AUTH_TOKEN_CACHE_SIZE", 1024)
+AUTH_TOKEN_CACHE_TTL = get_int_env("AUTH_TOKEN_CACHE_TTL", 300)
+AUTH_JWKS_TTL = get_int_env("AUTH_JWKS_TTL", 600)
+
+# Pool of user-scoped Supabase clients sharing one HTTP connection pool
+SUPABASE_CLIENT_POOL_SIZE = get_int_env("SUPABASE_CLIENT_POOL_SIZE", 256)
+SUPABASE_HTTP_MAX_CONNECTIONS = get_int_env("SUPABASE_HTTP_MAX_CONNECTIONS", 100)
+
+# Worker threads for blocking Supabase calls made from async handlers
+DB_MAX_WORKERS = get_int_env("DB_MAX_WORKERS", 16)
+
+# Chat streaming: "tokens" forwards supervisor tokens as they arrive,
+# "values" waits for each whole message (the original behaviour)
+CHAT_STREAM_MODE = os.getenv("CHAT_STREAM_MODE", "tokens").lower()
+# Adds `trace` events (the request's trace id, then its per-span timings) to the chat stream
+CHAT_TRACE_EVENTS = os.getenv("CHAT_TRACE_EVENTS", "0") == "1"
+
+# In-process tier in front of the knowledge_cache table (TTLs in seconds)
+KNOWLEDGE_CACHE_MAX_SIZE = get_int_env("KNOWLEDGE_CACHE_MAX_SIZE", 1024)
+KNOWLEDGE_CACHE_TTL_WEB_SEARCH = get_int_env("KNOWLEDGE_CACHE_TTL_WEB_SEARCH", 3600)
+KNOWLEDGE_CACHE_TTL_DIAGRAM = get_int_env("KNOWLEDGE_CACHE_TTL_DIAGRAM", 86400)
+
+# How long knowledge_cache table rows are served, per source (seconds, 0 = no expiry);
+# checked on read. scripts/maintain_knowledge_cache.py deletes expired rows and trims
+# the table to KNOWLEDGE_CACHE_MAX_ROWS, least recently hit first
+KNOWLEDGE_CACHE_ROW_TTL_WEB_SEARCH = get_int_env("KNOWLEDGE_CACHE_ROW_TTL_WEB_SEARCH", 86400)
+KNOWLEDGE_CACHE_ROW_TTL_DIAGRAM = get_int_env("KNOWLEDGE_CACHE_ROW_TTL_DIAGRAM", 0)
+KNOWLEDGE_CACHE_MAX_ROWS = get_int_env("KNOWLEDGE_CACHE_MAX_ROWS", 50000)
+
+# Brave web search client (timeouts in seconds; WEB_SEARCH_HEDGE_AFTER=0 disables hedging).
+# WEB_SEARCH_DEADLINE caps a whole search, retries and hedges included (0 = no cap)
+BRAVE_SEARCH_URL = os.getenv("BRAVE_SEARCH_URL", "https://api.search.brave.com/res/v1/web/search")
+WEB_SEARCH_CONNECT_TIMEOUT = get_float_env("WEB_SEARCH_CONNECT_TIMEOUT", 3.0)
+WEB_SEARCH_READ_TIMEOUT = get_float_env("WEB_SEARCH_READ_TIMEOUT", 8.0)
+WEB_SEARCH_MAX_RETRIES = get_int_env("WEB_SEARCH_MAX_RETRIES", 2)
+WEB_SEARCH_RETRY_BUDGET = get_float_env("WEB_SEARCH_RETRY_BUDGET", 0.2)
+WEB_SEARCH_HEDGE_AFTER = get_float_env("WEB_SEARCH_HEDGE_AFTER", 0.0)
+WEB_SEARCH_DEADLINE = get_float_env("WEB_SEARCH_DEADLINE", 10.0)
+
+# Conversation context sent to the supervisor: the last CONTEXT_RECENT_TURNS turns
+# verbatim, older turns folded into a rolling summary, all under CONTEXT_MAX_TOKENS
+CONTEXT_MAX_TOKENS = get_int_env("CONTEXT_MAX_TOKENS", 6000)
+CONTEXT_RECENT_TURNS = get_int_env("CONTEXT_RECENT_TURNS", 6)
+CONTEXT_HISTORY_LIMIT = get_int_env("CONTEXT_HISTORY_LIMIT", 200)
+CONTEXT_SUMMARY_MODEL = os.getenv("CONTEXT_SUMMARY_MODEL", "llama-3.1-8b-instant")
+
+# Write-behind queue for chat messages and titles. Writes are spilled until
+# confirmed, each process to its own file next to WRITE_BEHIND_SPILL_PATH
+# (write_behind.<pid>.jsonl); SUPABASE_SERVICE_KEY (optional) lets writes left
+# over from a crashed process be replayed on the next start
+SUPABASE_SERVICE_KEY = os.getenv("SUPABASE_SERVICE_KEY")
+WRITE_BEHIND_SPILL_PATH = os.getenv("WRITE_BEHIND_SPILL_PATH", str(Path(__file__).parent.parent / "write_behind.jsonl"))
+WRITE_BEHIND_BATCH_SIZE = get_int_env("WRITE_BEHIND_BATCH_SIZE", 50)
+WRITE_BEHIND_FLUSH_INTERVAL = get_float_env("WRITE_BEHIND_FLUSH_INTERVAL", 0.5)
+WRITE_BEHIND_MAX_ATTEMPTS = get_int_env("WRITE_BEHIND_MAX_ATTEMPTS", 5)
+WRITE_BEHIND_FSYNC = os.getenv("WRITE_BEHIND_FSYNC", "1") != "0"
+
+# In-process trigram index over the concepts table used by query_supabase.
+# Rows changed since the last load are pulled every CONCEPT_INDEX_REFRESH_INTERVAL
+# seconds; a full reload (which also drops deleted concepts) runs less often
+CONCEPT_INDEX_REFRESH_INTERVAL = get_int_env("CONCEPT_INDEX_REFRESH_INTERVAL", 300)
+CONCEPT_INDEX_FULL_RELOAD_INTERVAL = get_int_env("CONCEPT_INDEX_FULL_RELOAD_INTERVAL", 86400)
+CONCEPT_INDEX_MIN_SCORE = get_float_env("CONCEPT_INDEX_MIN_SCORE", 0.3)
+# A trigram in more titles than this first offers only its shortest ones as candidates.
+# Results stay exact (a search that could miss a match is ranked again in full); only
+# worth setting if benchmarks/bench_concept_search shows a gain on your table (0 = off)
+CONCEPT_INDEX_MAX_POSTING = get_int_env("CONCEPT_INDEX_MAX_POSTING", 0)
+
+# Page sizes for the session and message listings (clients may ask for up to the max)
+SESSIONS_PAGE_SIZE = get_int_env("SESSIONS_PAGE_SIZE", 100)
+SESSIONS_MAX_PAGE_SIZE = get_int_env("SESSIONS_MAX_PAGE_SIZE", 500)
+MESSAGES_PAGE_SIZE = get_int_env("MESSAGES_PAGE_SIZE", 200)
+MESSAGES_MAX_PAGE_SIZE = get_int_env("MESSAGES_MAX_PAGE_SIZE", 1000)
+
+# Responses of at least this many bytes are sent zstd- or gzip-encoded when the
+# client accepts it (0 = never); event streams are never compressed
+RESPONSE_COMPRESSION_MIN_SIZE = get_int_env("RESPONSE_COMPRESSION_MIN_SIZE", 1024)
+
+# Admission control for LLM calls, per provider: concurrent calls, a tokens-per-minute
+# budget (0 = none; match the provider's rate limit) and how long a call may queue
+# before it is refused with an "overloaded" error instead
+LLM_GEMINI_MAX_CONCURRENCY = get_int_env("LLM_GEMINI_MAX_CONCURRENCY", 16)
+LLM_GEMINI_TOKENS_PER_MINUTE = get_int_env("LLM_GEMINI_TOKENS_PER_MINUTE", 1000000)
+LLM_GROQ_MAX_CONCURRENCY = get_int_env("LLM_GROQ_MAX_CONCURRENCY", 4)
+LLM_GROQ_TOKENS_PER_MINUTE = get_int_env("LLM_GROQ_TOKENS_PER_MINUTE", 12000)
+LLM_QUEUE_MAX_WAIT = get_float_env("LLM_QUEUE_MAX_WAIT", 10.0)
+
+# Whole-turn answers to first-turn questions, replayed without calling the supervisor.
+# Keyed by question, model and prompt version; shared through the knowledge_cache table
+TURN_CACHE_ENABLED = os.getenv("TURN_CACHE_ENABLED", "1") != "0"
+TURN_CACHE_TTL = get_int_env("TURN_CACHE_TTL", 21600)
+TURN_CACHE_MAX_SIZE = get_int_env("TURN_CACHE_MAX_SIZE", 2048)
+
+# Seconds a chat turn may take before its tools are cut off: tools still running at
+# the deadline are left out of the answer (0 = no limit). Tools always get at least
+# TOOL_MIN_TIME_BUDGET seconds, even when the supervisor used up the turn's time
+CHAT_TURN_DEADLINE = get_float_env("CHAT_TURN_DEADLINE", 30.0)
+TOOL_MIN_TIME_BUDGET = get_float_env("TOOL_MIN_TIME_BUDGET", 2.0)
+
+# Local intent router in front of the supervisor: greetings get a canned reply and clear
+# diagram/web-search requests go straight to their tool, skipping the Gemini call.
+# Trained at startup from INTENT_ROUTER_TRAINING_PATH (label<TAB>query lines)
+INTENT_ROUTER_ENABLED = os.getenv("INTENT_ROUTER_ENABLED", "1") != "0"
+INTENT_ROUTER_MIN_CONFIDENCE = get_float_env("INTENT_ROUTER_MIN_CONFIDENCE", 0.9)
+INTENT_ROUTER_TRAINING_PATH = os.getenv("INTENT_ROUTER_TRAINING_PATH", str(Path(__file__).parent.parent / "services" / "data" / "intent_training.tsv"))
+
+# Build the Supabase/LLM clients and the agent graph in the background at startup
+# (otherwise they are created by the first request that needs them)
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "1") != "0"
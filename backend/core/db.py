@@ -0,0 +1,27 @@
+import asyncio
+import contextvars
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from .config import DB_MAX_WORKERS
+from .metrics import DB_POOL_WAIT
+
+# supabase-py's PostgREST calls are blocking. Running them on a bounded pool keeps
+# a slow round trip from stalling the event loop (and every other user's stream),
+# while capping how many connections one worker can hold open at once.
+db_executor = ThreadPoolExecutor(max_workers=DB_MAX_WORKERS, thread_name_prefix="supabase-db")
+
+async def run_db(fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Runs a blocking database call on the DB thread pool and awaits its result."""
+    loop = asyncio.get_running_loop()
+    call = functools.partial(fn, *args, **kwargs)
+    submitted = time.perf_counter()
+
+    def run():
+        # Time spent queued for a free thread shows when the pool is the bottleneck
+        DB_POOL_WAIT.observe(time.perf_counter() - submitted)
+        return call()
+
+    # Run in a copy of the caller's context so timings land in the request's trace
+    return await loop.run_in_executor(db_executor, contextvars.copy_context().run, run)
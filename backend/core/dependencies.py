@@ -1,11 +1,92 @@
 from fastapi import Request, HTTPException
 from supabase import create_client, Client
 from gotrue.errors import AuthApiError
-from .config import SUPABASE_URL, SUPABASE_KEY
+import jwt
+from . import config
+from .config import (
+    AUTH_VERIFY_MODE, SUPABASE_JWT_SECRET, SUPABASE_JWKS_URL, SUPABASE_JWT_AUDIENCE,
+    AUTH_TOKEN_CACHE_SIZE, AUTH_TOKEN_CACHE_TTL, AUTH_JWKS_TTL,
+    SUPABASE_CLIENT_POOL_SIZE, SUPABASE_HTTP_MAX_CONNECTIONS,
+)
+from .jwt_verifier import TokenVerifier
+from .client_pool import SupabaseClientPool
+from .db import run_db
+from .lazy import lazy_singleton
+from .metrics import AUTH_DURATION, observe
 from typing import Tuple
+import time
 
-# This is the global, anonymous client, used only for initial auth checks
-supabase_anon: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Clients are built on first use (or by the startup warmup), not at import time
+
+@lazy_singleton
+def get_supabase_anon() -> Client:
+    """The global, anonymous client, used only for initial auth checks."""
+    return create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
+
+@lazy_singleton
+def get_token_verifier() -> TokenVerifier:
+    """Verifies tokens in-process so most requests skip the Supabase Auth round trip."""
+    return TokenVerifier(
+        jwt_secret=SUPABASE_JWT_SECRET,
+        jwks_url=SUPABASE_JWKS_URL or f"{config.SUPABASE_URL.rstrip('/')}/auth/v1/.well-known/jwks.json",
+        audience=SUPABASE_JWT_AUDIENCE,
+        cache_size=AUTH_TOKEN_CACHE_SIZE,
+        cache_ttl=AUTH_TOKEN_CACHE_TTL,
+        jwks_ttl=AUTH_JWKS_TTL,
+    )
+
+@lazy_singleton
+def get_client_pool() -> SupabaseClientPool:
+    """User-scoped clients are reused across requests instead of rebuilt every time."""
+    return SupabaseClientPool(
+        config.SUPABASE_URL,
+        config.SUPABASE_KEY,
+        max_size=SUPABASE_CLIENT_POOL_SIZE,
+        max_connections=SUPABASE_HTTP_MAX_CONNECTIONS,
+    )
+
+def verify_token_blocking(token: str, started: float) -> str:
+    """
+    The part of verify_token that may block on HTTP (JWKS refresh, Supabase
+    Auth); run it on a worker thread.
+    """
+    token_verifier = get_token_verifier()
+    if AUTH_VERIFY_MODE == "local":
+        user_id = token_verifier.verify(token)
+        if user_id is not None:
+            observe(AUTH_DURATION, "auth:local", time.perf_counter() - started, method="local")
+            return user_id
+
+    try:
+        user_response = get_supabase_anon().auth.get_user(token)
+    except Exception:
+        observe(AUTH_DURATION, "auth:remote", time.perf_counter() - started, method="remote_error")
+        raise
+    user_id = str(user_response.user.id)
+    token_verifier.remember(token, user_id)
+    observe(AUTH_DURATION, "auth:remote", time.perf_counter() - started, method="remote")
+    return user_id
+
+async def verify_token(token: str) -> str:
+    """
+    Returns the user id for a token. Verifies locally when we hold the signing
+    key and only falls back to Supabase Auth when the key is unknown or rotated.
+    Only the network calls leave the event loop.
+    """
+    started = time.perf_counter()
+    token_verifier = get_token_verifier()
+    if AUTH_VERIFY_MODE == "local":
+        user_id = token_verifier.verify(token, fetch_keys=False)
+        if user_id is not None:
+            observe(AUTH_DURATION, "auth:local", time.perf_counter() - started, method="local")
+            return user_id
+    else:
+        user_id = token_verifier.cache.get(token)
+        if user_id is not None:
+            observe(AUTH_DURATION, "auth:cache", time.perf_counter() - started, method="cache")
+            return user_id
+
+    return await run_db(verify_token_blocking, token, started)
 
 async def get_current_user_and_client(request: Request) -> Tuple[Client, str]:
     """
@@ -22,17 +103,15 @@ async def get_current_user_and_client(request: Request) -> Tuple[Client, str]:
         
     try:
         # 1. Verify the token and get the user's data
-        user_response = supabase_anon.auth.get_user(token)
-        user_id = user_response.user.id
+        user_id = await verify_token(token)
         
-        # 2. Create a new, user-specific Supabase client for this request
+        # 2. Get a pooled, user-specific Supabase client for this request
         # This client will have the user's permissions for RLS.
-        supabase_user_client: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
-        supabase_user_client.auth.set_session(access_token=token, refresh_token=token)
+        supabase_user_client: Client = get_client_pool().get(user_id, token)
         
         return supabase_user_client, str(user_id)
         
-    except AuthApiError as e:
+    except (AuthApiError, jwt.InvalidTokenError) as e:
         raise HTTPException(status_code=401, detail=f"Invalid token: {e}")
     except Exception as e:
         print(f"--- UNEXPECTED AUTH ERROR: {e} ---")
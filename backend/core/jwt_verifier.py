@@ -0,0 +1,175 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+import jwt
+import requests
+
+# Algorithms Supabase Auth signs access tokens with
+HMAC_ALGORITHMS = ["HS256"]
+ASYMMETRIC_ALGORITHMS = ["RS256", "ES256", "EdDSA"]
+
+# Don't hammer the JWKS endpoint when a token carries a kid we've never seen
+JWKS_MIN_REFRESH_INTERVAL = 30
+
+
+class TokenCache:
+    """Bounded LRU cache of verified tokens -> user ids, with per-entry expiry."""
+
+    def __init__(self, max_size: int = 1024, ttl: int = 300):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[str]:
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is None:
+                return None
+            user_id, expires_at = entry
+            if expires_at <= now:
+                del self._entries[token]
+                return None
+            self._entries.move_to_end(token)
+            return user_id
+
+    def put(self, token: str, user_id: str, token_exp: Optional[float] = None):
+        # Never keep a token around longer than the token itself is valid
+        expires_at = time.time() + self.ttl
+        if token_exp is not None:
+            expires_at = min(expires_at, token_exp)
+        with self._lock:
+            self._entries[token] = (user_id, expires_at)
+            self._entries.move_to_end(token)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class JWKSCache:
+    """Caches the project's JSON Web Key Set and resolves signing keys by kid."""
+
+    def __init__(self, jwks_url: Optional[str], ttl: int = 600):
+        self.jwks_url = jwks_url
+        self.ttl = ttl
+        self._keys: Dict[str, jwt.PyJWK] = {}
+        self._fetched_at = 0.0
+        self._lock = threading.Lock()
+
+    def set_keys(self, jwks: dict):
+        """Loads keys from a JWKS document (also handy for seeding keys locally)."""
+        keys = {}
+        for jwk in jwks.get("keys", []):
+            kid = jwk.get("kid")
+            if not kid:
+                continue
+            try:
+                keys[kid] = jwt.PyJWK(jwk)
+            except jwt.PyJWTError as e:
+                print(f"Skipping unusable JWK '{kid}': {e}")
+        with self._lock:
+            self._keys = keys
+            self._fetched_at = time.time()
+
+    def _refresh(self):
+        response = requests.get(self.jwks_url, timeout=5)
+        response.raise_for_status()
+        self.set_keys(response.json())
+
+    def get_key(self, kid: Optional[str], fetch: bool = True) -> Optional[jwt.PyJWK]:
+        """
+        Returns the key for kid, refetching once if it's stale or unknown (rotated).
+        With fetch=False it never goes to the network and returns None instead.
+        """
+        if not kid:
+            return None
+        now = time.time()
+        key = self._keys.get(kid)
+        stale = now - self._fetched_at > self.ttl
+        if key is not None and not stale:
+            return key
+        if not fetch:
+            return None
+        if not self.jwks_url or (key is None and not stale and now - self._fetched_at < JWKS_MIN_REFRESH_INTERVAL):
+            return key
+        try:
+            self._refresh()
+        except Exception as e:
+            print(f"JWKS refresh failed: {e}")
+            return key
+        return self._keys.get(kid)
+
+
+class TokenVerifier:
+    """
+    Verifies Supabase access tokens locally (signature, expiry, audience).
+
+    `verify` returns the user id, or None when the token is signed with a key
+    we don't know (no JWT secret configured, or a rotated/unknown kid). In that
+    case the caller should fall back to asking Supabase Auth and `remember`
+    the answer. Invalid or expired tokens raise `jwt.InvalidTokenError`.
+
+    Fetching the JWKS is a blocking HTTP call: async callers pass
+    fetch_keys=False on the event loop and retry in a thread if that gives None.
+    """
+
+    def __init__(
+        self,
+        jwt_secret: Optional[str] = None,
+        jwks_url: Optional[str] = None,
+        audience: str = "authenticated",
+        cache_size: int = 1024,
+        cache_ttl: int = 300,
+        jwks_ttl: int = 600,
+    ):
+        self.jwt_secret = jwt_secret
+        self.audience = audience
+        self.cache = TokenCache(max_size=cache_size, ttl=cache_ttl)
+        self.jwks = JWKSCache(jwks_url, ttl=jwks_ttl)
+
+    def verify(self, token: str, fetch_keys: bool = True) -> Optional[str]:
+        user_id = self.cache.get(token)
+        if user_id is not None:
+            return user_id
+
+        header = jwt.get_unverified_header(token)
+        alg = header.get("alg")
+        if alg in HMAC_ALGORITHMS:
+            if not self.jwt_secret:
+                return None
+            key = self.jwt_secret
+        elif alg in ASYMMETRIC_ALGORITHMS:
+            jwk = self.jwks.get_key(header.get("kid"), fetch=fetch_keys)
+            if jwk is None:
+                return None
+            key = jwk.key
+        else:
+            raise jwt.InvalidAlgorithmError(f"Unsupported token algorithm: {alg}")
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=[alg],
+            audience=self.audience,
+            options={"require": ["exp", "sub"]},
+        )
+        user_id = str(claims["sub"])
+        self.cache.put(token, user_id, claims.get("exp"))
+        return user_id
+
+    def remember(self, token: str, user_id: str):
+        """Caches a user id that was verified remotely, bounded by the token's exp."""
+        try:
+            exp = jwt.decode(token, options={"verify_signature": False}).get("exp")
+        except jwt.PyJWTError:
+            exp = None
+        self.cache.put(token, user_id, exp)
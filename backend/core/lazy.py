@@ -0,0 +1,62 @@
+import functools
+import threading
+from typing import Any, Callable, Generic, TypeVar
+
+T = TypeVar("T")
+
+_UNSET = object()
+
+
+class LazySingleton(Generic[T]):
+    """
+    Thread-safe, create-on-first-use wrapper around a zero-argument factory.
+
+    Calling the instance returns the one shared object, building it on the
+    first call (concurrent first callers wait for that single build). A
+    factory that raises is retried on the next call.
+    """
+
+    def __init__(self, factory: Callable[[], T]):
+        self.factory = factory
+        self._value: Any = _UNSET
+        self._lock = threading.Lock()
+        functools.update_wrapper(self, factory)
+
+    def __call__(self) -> T:
+        value = self._value
+        if value is _UNSET:
+            with self._lock:
+                value = self._value
+                if value is _UNSET:
+                    value = self._value = self.factory()
+        return value
+
+    def is_initialized(self) -> bool:
+        return self._value is not _UNSET
+
+    def reset(self):
+        """Forgets the built object (the next call builds a new one)."""
+        with self._lock:
+            self._value = _UNSET
+
+
+def lazy_singleton(factory: Callable[[], T]) -> LazySingleton[T]:
+    """Decorator form of LazySingleton."""
+    return LazySingleton(factory)
+
+
+class LazyProxy:
+    """
+    Stand-in for a module-level object whose creation is deferred: attribute
+    access is forwarded to `factory()`, so existing `thing.method()` call
+    sites keep working while `thing` is only built when first used.
+    """
+
+    def __init__(self, factory: Callable[[], Any]):
+        object.__setattr__(self, "_factory", factory)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._factory(), name)
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._factory(), name, value)
@@ -0,0 +1,352 @@
+import asyncio
+import contextvars
+import functools
+import math
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Prometheus text exposition format, version 0.0.4
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans cache hits (~ms) up to slow LLM turns
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Iterable[str], values: Iterable[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict) -> Tuple[str, ...]:
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"] + self._samples()
+
+    def _samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count, optionally per label set."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in values]
+
+
+class Histogram(_Metric):
+    """Distribution of observed values (seconds, by default buckets) per label set."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label key -> (per-bucket counts, sum, count)
+        self._values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(entry[0]), entry[1], entry[2])) for key, entry in self._values.items())
+        lines = []
+        for key, (bucket_counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, bucket_counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Holds the app's metrics and renders them for /metrics.
+
+    Components that already keep counters (the caches, the write-behind
+    queue, ...) are exposed through stats collectors instead of being
+    rewritten: their stats() dict is read at scrape time.
+    """
+
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._stats_collectors: List[Tuple[str, Callable[[], Optional[dict]], Tuple[str, ...]]] = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Tuple[str, ...] = ()) -> Counter:
+        return self.register(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def add_stats_collector(self, prefix: str, stats: Callable[[], Optional[dict]], counters: Tuple[str, ...] = ()):
+        """Exposes the numeric values of stats() as `<prefix>_<key>` gauges (`_total` counters for `counters`)."""
+        self._stats_collectors.append((prefix, stats, tuple(counters)))
+
+    def _render_stats(self, prefix: str, stats: Callable[[], Optional[dict]], counters: Tuple[str, ...]) -> List[str]:
+        try:
+            values = stats()
+        except Exception as e:
+            print(f"Could not collect {prefix} stats: {e}")
+            return []
+        lines = []
+        for key, value in (values or {}).items():
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            name = re.sub(r"[^a-zA-Z0-9_]", "_", f"{prefix}_{key}")
+            kind = "counter" if key in counters else "gauge"
+            name = f"{name}_total" if kind == "counter" else name
+            lines += [f"# TYPE {name} {kind}", f"{name} {_format_value(value)}"]
+        return lines
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines += metric.render()
+        for prefix, stats, counters in self._stats_collectors:
+            lines += self._render_stats(prefix, stats, counters)
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_DURATION = registry.histogram(
+    "http_request_duration_seconds", "HTTP requests by route, including the whole streamed body.", ("method", "route", "status"),
+)
+NODE_DURATION = registry.histogram("agent_node_duration_seconds", "Time spent in each LangGraph node.", ("node",))
+TOOL_DURATION = registry.histogram("agent_tool_duration_seconds", "Time spent in each agent tool.", ("tool",))
+CACHE_LOOKUP_DURATION = registry.histogram(
+    "knowledge_cache_lookup_duration_seconds", "knowledge_cache table lookups made on memory misses.", ("source",),
+)
+DB_CALL_DURATION = registry.histogram("supabase_call_duration_seconds", "Supabase calls by repository operation.", ("operation", "status"))
+DB_POOL_WAIT = registry.histogram("supabase_pool_wait_seconds", "Time DB calls waited for a thread of the DB pool.")
+AUTH_DURATION = registry.histogram("auth_verify_duration_seconds", "Token verification by how it was decided.", ("method",))
+LLM_TOKENS = registry.counter("llm_tokens_total", "LLM tokens reported by the providers.", ("llm", "type"))
+LLM_QUEUE_WAIT = registry.histogram("llm_queue_wait_seconds", "Time LLM calls waited for admission, per provider.", ("provider",))
+LLM_SHED = registry.counter("llm_requests_shed_total", "LLM calls refused by admission control.", ("provider", "reason"))
+ROUTER_DECISIONS = registry.counter("intent_router_decisions_total", "Local intent router decisions by route and reason.", ("route", "method"))
+
+
+# --- Per-request traces ---
+
+class Trace:
+    """Time per span (node, tool, DB operation, ...) within one request, for the SSE trace event."""
+
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.started = time.perf_counter()
+        self._spans: Dict[str, list] = {}
+        self.tokens: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def add_span(self, name: str, seconds: float):
+        with self._lock:
+            span = self._spans.setdefault(name, [0, 0.0])
+            span[0] += 1
+            span[1] += seconds
+
+    def add_tokens(self, kind: str, count: int):
+        with self._lock:
+            self.tokens[kind] = self.tokens.get(kind, 0) + count
+
+    def summary(self) -> dict:
+        with self._lock:
+            spans = {name: {"calls": calls, "ms": round(seconds * 1000, 1)} for name, (calls, seconds) in self._spans.items()}
+            tokens = dict(self.tokens)
+        return {"total_ms": round((time.perf_counter() - self.started) * 1000, 1), "spans": spans, "tokens": tokens}
+
+
+_current_trace: contextvars.ContextVar[Optional[Trace]] = contextvars.ContextVar("current_trace", default=None)
+
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9-]{8,64}$")
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def observe(histogram: Histogram, span: str, seconds: float, **labels):
+    """Records a timing in the histogram and in the current request's trace."""
+    histogram.observe(seconds, **labels)
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.add_span(span, seconds)
+
+
+@contextmanager
+def timed(histogram: Histogram, span: str, **labels):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(histogram, span, time.perf_counter() - started, **labels)
+
+
+def instrumented(histogram: Histogram, span: str, **labels):
+    """Decorator timing every call of a sync or async function."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with timed(histogram, span, **labels):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timed(histogram, span, **labels):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed_db_call(fn):
+    """Decorator for repository methods: times each call as `Class.method`, with its outcome."""
+    operation = fn.__qualname__
+
+    def record(started: float, status: str):
+        observe(DB_CALL_DURATION, f"db:{operation}", time.perf_counter() - started, operation=operation, status=status)
+
+    if asyncio.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = await fn(*args, **kwargs)
+            except Exception:
+                record(started, "error")
+                raise
+            record(started, "ok")
+            return result
+        return async_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception:
+            record(started, "error")
+            raise
+        record(started, "ok")
+        return result
+    return wrapper
+
+
+def record_llm_usage(llm: str, message) -> None:
+    """Counts the input/output tokens a provider reported on a message (if it did)."""
+    usage = getattr(message, "usage_metadata", None) or {}
+    trace = _current_trace.get()
+    for kind in ("input", "output"):
+        count = usage.get(f"{kind}_tokens") or 0
+        if count:
+            LLM_TOKENS.inc(count, llm=llm, type=kind)
+            if trace is not None:
+                trace.add_tokens(f"{llm}_{kind}", count)
+
+
+def route_template(scope) -> str:
+    """The matched route's path template (not the raw path, so session ids don't explode the label set)."""
+    # Newer FastAPI versions keep an included router's routes without the prefix
+    # and record the full path on the effective route context instead
+    effective = (scope.get("fastapi") or {}).get("effective_route_context")
+    path = getattr(effective, "path", None) or getattr(scope.get("route"), "path", None)
+    return path or "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: times every HTTP request by route template and gives it a
+    trace (id from an incoming X-Trace-Id header, or a new one). The id is
+    echoed in the X-Trace-Id response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        incoming = dict(scope.get("headers") or []).get(b"x-trace-id", b"").decode("latin-1")
+        trace = Trace(incoming if TRACE_ID_PATTERN.match(incoming) else uuid.uuid4().hex)
+        token = _current_trace.set(trace)
+        status = [500]
+
+        async def send_with_trace_id(message):
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                message = dict(message, headers=list(message.get("headers") or []) + [(b"x-trace-id", trace.trace_id.encode())])
+            await send(message)
+
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_trace_id)
+        finally:
+            _current_trace.reset(token)
+            HTTP_REQUEST_DURATION.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route_template(scope),
+                status=str(status[0]),
+            )
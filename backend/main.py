@@ -1,8 +1,53 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from api import auth, chat 
+from core.compression import CompressionMiddleware
+from core.config import RESPONSE_COMPRESSION_MIN_SIZE, STARTUP_WARMUP, missing_settings
+from core.dependencies import get_client_pool, get_supabase_anon, get_token_verifier
+from core.metrics import CONTENT_TYPE, MetricsMiddleware, registry
+from services.agent import turn_cache, warm_up as warm_up_agent
+from services.tools import knowledge_cache, brave_client, concept_index, run_concept_index_refresher
+from services.write_behind import chat_writer
+from services.llm_scheduler import gemini_scheduler, groq_scheduler
 
-app = FastAPI(title="Data-Structure AI Backend") # UPDATED NAME
+def warm_up_clients():
+    """Builds the Supabase clients, LLM clients and the agent graph before the first request needs them."""
+    try:
+        get_supabase_anon()
+        get_token_verifier()
+        get_client_pool()
+        warm_up_agent()
+        print("✓ Clients and agent graph initialized")
+    except Exception as e:
+        print(f"Warning: Warmup failed, clients will be created on first use: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    missing = missing_settings()
+    if missing:
+        print(f"Warning: Missing settings {', '.join(missing)}; features that need them will fail when used")
+    # Clients are created lazily; warming them in the background keeps startup fast
+    # while sparing the first request the cost (set STARTUP_WARMUP=0 to skip)
+    client_warmup = asyncio.create_task(asyncio.to_thread(warm_up_clients)) if STARTUP_WARMUP else None
+    # Load the concepts table into memory and keep it fresh
+    concept_refresher = asyncio.create_task(run_concept_index_refresher())
+    # Replays chat writes spilled before a crash and starts the background flusher
+    await chat_writer.start()
+    yield
+    if client_warmup is not None:
+        client_warmup.cancel()
+    concept_refresher.cancel()
+    # Flush queued chat writes before the process exits
+    await chat_writer.close()
+    # Close the shared connection pools on shutdown
+    await brave_client.aclose()
+    if get_client_pool.is_initialized():
+        get_client_pool().close()
+
+app = FastAPI(title="Data-Structure AI Backend", lifespan=lifespan) # UPDATED NAME
 
 # Add middleware
 app.add_middleware(
@@ -11,7 +56,13 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # Pagination cursor and validator for the session/message listings, and the request's trace id
+    expose_headers=["ETag", "X-Next-Cursor", "X-Trace-Id"],
 )
+# zstd/gzip for large JSON responses such as long message histories (SSE streams pass through)
+app.add_middleware(CompressionMiddleware, minimum_size=RESPONSE_COMPRESSION_MIN_SIZE)
+# Times every request and gives it a trace id (outermost, so it sees the whole response)
+app.add_middleware(MetricsMiddleware)
 
 # Include the API routers
 app.include_router(auth.router, prefix="/api/auth", tags=["Authentication"])
@@ -22,3 +73,35 @@ def read_root():
     """A simple endpoint to check if the server is running."""
     return {"status": "Data-Structure AI Backend is running!"}
 
+@app.get("/stats")
+def read_stats():
+    """Runtime counters for the in-process pools and caches."""
+    return {
+        "supabase_client_pool": get_client_pool().stats() if get_client_pool.is_initialized() else None,
+        "knowledge_cache": knowledge_cache.stats(),
+        "turn_cache": turn_cache.stats(),
+        "web_search_client": brave_client.stats(),
+        "chat_writer": chat_writer.stats(),
+        "concept_index": {"concepts": len(concept_index), "last_updated_at": concept_index.last_updated_at},
+        "llm_scheduler": {"gemini": gemini_scheduler.stats(), "groq": groq_scheduler.stats()},
+    }
+
+# The components' own counters, read at scrape time
+registry.add_stats_collector("knowledge_cache", knowledge_cache.stats, counters=("hits", "db_hits", "misses", "coalesced"))
+registry.add_stats_collector("turn_cache", turn_cache.stats, counters=("hits", "db_hits", "misses", "stored"))
+registry.add_stats_collector("web_search_client", brave_client.stats, counters=("requests", "retries", "hedges"))
+registry.add_stats_collector("chat_writer", chat_writer.stats, counters=("flushed", "batches", "failures", "dropped", "replayed"))
+registry.add_stats_collector(
+    "supabase_client_pool",
+    lambda: get_client_pool().stats() if get_client_pool.is_initialized() else None,
+    counters=("hits", "misses", "evictions"),
+)
+registry.add_stats_collector("concept_index", lambda: {"concepts": len(concept_index)})
+# Queue depth and admissions per LLM provider (wait times and sheds are in llm_queue_wait_seconds / llm_requests_shed_total)
+registry.add_stats_collector("llm_scheduler_gemini", gemini_scheduler.stats, counters=("admitted", "shed"))
+registry.add_stats_collector("llm_scheduler_groq", groq_scheduler.stats, counters=("admitted", "shed"))
+
+@app.get("/metrics", include_in_schema=False)
+def read_metrics():
+    """Timings, token counts and cache counters in Prometheus text format."""
+    return PlainTextResponse(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,45 @@
+-- knowledge_cache: write and hit timestamps, one row per cache_key, and a size
+-- function for scripts/maintain_knowledge_cache.py. Run once in the Supabase SQL
+-- editor (or psql) before deploying the code that upserts on cache_key; it is
+-- safe to run again.
+
+-- updated_at: when the answer was (re)written; rows older than their source's
+-- TTL are no longer served. last_hit_at: when the row was last read (refreshed
+-- at most hourly), for least-recently-hit eviction. Existing rows start out
+-- with their created_at for both.
+do $$
+begin
+    if not exists (
+        select 1 from information_schema.columns
+        where table_schema = 'public' and table_name = 'knowledge_cache' and column_name = 'updated_at'
+    ) then
+        alter table public.knowledge_cache
+            add column updated_at timestamptz not null default now(),
+            add column last_hit_at timestamptz not null default now();
+        update public.knowledge_cache
+            set updated_at = coalesce(created_at, now()), last_hit_at = coalesce(created_at, now());
+    end if;
+end $$;
+
+-- Concurrent misses used to insert the same key several times; keep the newest
+-- row of each key so the unique index below can be built
+delete from public.knowledge_cache older
+using public.knowledge_cache newer
+where older.cache_key = newer.cache_key
+  and (older.updated_at, older.ctid) < (newer.updated_at, newer.ctid);
+
+-- Upserts resolve conflicts on cache_key, and lookups by key become index scans
+create unique index if not exists knowledge_cache_cache_key_key on public.knowledge_cache (cache_key);
+-- Expiry deletes (per source, by age) and eviction (oldest hit first)
+create index if not exists knowledge_cache_source_updated_at_idx on public.knowledge_cache (source, updated_at);
+create index if not exists knowledge_cache_last_hit_at_idx on public.knowledge_cache (last_hit_at);
+
+-- On-disk size of the table, reported by the maintenance job
+create or replace function public.knowledge_cache_size()
+returns table (total_bytes bigint, table_bytes bigint, index_bytes bigint)
+language sql stable
+as $$
+    select pg_total_relation_size('public.knowledge_cache'),
+           pg_relation_size('public.knowledge_cache'),
+           pg_indexes_size('public.knowledge_cache');
+$$;
@@ -0,0 +1,10 @@
+-- chat_messages: store long message contents lz4-compressed. Postgres already
+-- compresses (TOASTs) any text value over ~2 KB when it writes the row, with
+-- pglz by default; lz4 compresses and decompresses several times faster, which
+-- matters for long Mermaid answers that are read every time a session opens.
+-- The setting applies to values written from now on. Rows already stored stay
+-- readable as they are (each value records how it was compressed), so there is
+-- nothing to migrate. Needs Postgres 14+ built with lz4 (Supabase is); safe to
+-- run again.
+alter table public.chat_messages alter column content set compression lz4;
+alter table public.chat_messages alter column thinking_process set compression lz4;
@@ -1,11 +1,32 @@
-from pydantic import BaseModel
-from typing import List
+from pydantic import BaseModel, model_validator
+from typing import List, Optional
 
 class HistoryMessage(BaseModel):
     # THIS IS THE FIX: Changed 'type' to 'role' to match the frontend
     role: str 
     text: str
+    # Set on stored messages; orders the conversation for the context summary
+    created_at: Optional[str] = None
+
+class SessionMessage(BaseModel):
+    # A stored message as the history endpoint returns it; thinkingProcess only with ?fields=full
+    id: Optional[str] = None
+    role: str
+    text: str
+    thinkingProcess: Optional[List[str]] = None
+
+class ThinkingProcess(BaseModel):
+    id: str
+    thinkingProcess: List[str]
 
 class ChatRequest(BaseModel):
-    messages: List[HistoryMessage]
+    # Preferred: just the new user message; history is loaded server-side
+    message: Optional[str] = None
+    # Legacy: the whole conversation, resent by the client every turn
+    messages: Optional[List[HistoryMessage]] = None
 
+    @model_validator(mode="after")
+    def check_has_message(self):
+        if not self.message and not self.messages:
+            raise ValueError("Either 'message' or 'messages' must be provided")
+        return self
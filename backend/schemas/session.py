@@ -1,5 +1,6 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from datetime import datetime
+from typing import List
 from uuid import UUID
 
 class Session(BaseModel):
@@ -10,3 +11,12 @@ class Session(BaseModel):
 
     class Config:
         from_attributes = True
+
+class BulkDeleteRequest(BaseModel):
+    session_ids: List[UUID] = Field(..., min_length=1, max_length=1000)
+
+class DeleteSessionsResult(BaseModel):
+    deleted_sessions: int
+    deleted_messages: int
+    deleted_session_ids: List[UUID]
+    not_found: List[UUID]
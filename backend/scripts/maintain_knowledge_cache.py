@@ -0,0 +1,180 @@
+"""
+Compacts the knowledge_cache table: removes duplicate keys, expired rows and,
+past a size budget, the least recently hit rows.
+
+Reads every row's key, source and timestamps (not the answers), then:
+
+1. deletes all but the newest row of any cache_key that has several (left
+   over from concurrent misses before writes became upserts),
+2. deletes rows older than their source's row TTL
+   (KNOWLEDGE_CACHE_ROW_TTL_* / TURN_CACHE_TTL; sources without one keep
+   their rows), which are no longer served anyway,
+3. if more than --max-rows remain, deletes the least recently hit ones.
+
+Reports rows per source, how long ago rows were written and last hit, and the
+table's on-disk size (needs the knowledge_cache_size() function from
+migrations/001_knowledge_cache_expiry.sql). Meant to run nightly from the
+backend folder:
+
+    python -m scripts.maintain_knowledge_cache [--max-rows 50000] [--report maintenance.json] [--dry-run]
+"""
+import argparse
+import json
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.config import KNOWLEDGE_CACHE_MAX_ROWS
+from services.repository import parse_timestamp
+from services.tools import KNOWLEDGE_CACHE_ROW_TTLS, knowledge_repo
+
+
+def percentile(values: List[float], fraction: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def hours(seconds: Optional[float]) -> Optional[float]:
+    return round(seconds / 3600, 1) if seconds is not None else None
+
+
+def table_stats(rows: List[dict], now: float) -> dict:
+    """Rows per source, with how long ago they were written and last hit (hours)."""
+    by_source: Dict[str, List[dict]] = defaultdict(list)
+    for row in rows:
+        by_source[row.get("source") or "unknown"].append(row)
+
+    sources = {}
+    for source, source_rows in sorted(by_source.items()):
+        written = [now - parse_timestamp(row["updated_at"]) for row in source_rows if row.get("updated_at")]
+        hit = [now - parse_timestamp(row["last_hit_at"]) for row in source_rows if row.get("last_hit_at")]
+        sources[source] = {
+            "rows": len(source_rows),
+            "ttl_hours": hours(KNOWLEDGE_CACHE_ROW_TTLS.get(source) or None),
+            "written_hours_ago": {"p50": hours(percentile(written, 0.5)), "max": hours(max(written, default=None))},
+            "last_hit_hours_ago": {
+                "p50": hours(percentile(hit, 0.5)),
+                "p90": hours(percentile(hit, 0.9)),
+                "max": hours(max(hit, default=None)),
+            },
+            # last_hit_at is set on write, so these were never read back
+            "not_hit_since_write": sum(1 for row in source_rows if row.get("last_hit_at") == row.get("updated_at")),
+        }
+    return {"rows": len(rows), "sources": sources}
+
+
+def plan(rows: List[dict], max_rows: int, now: float) -> dict:
+    """What a run deletes: older duplicates, expired rows per source and evictions, plus the rows kept."""
+    by_key: Dict[str, List[dict]] = defaultdict(list)
+    for row in rows:
+        by_key[row["cache_key"]].append(row)
+
+    duplicates: Dict[str, dict] = {}
+    unique = []
+    for cache_key, key_rows in by_key.items():
+        newest = max(key_rows, key=lambda row: parse_timestamp(row.get("updated_at")) or 0.0)
+        unique.append(newest)
+        if len(key_rows) > 1:
+            duplicates[cache_key] = {"newest_updated_at": newest["updated_at"], "extra_rows": len(key_rows) - 1}
+
+    expired: Dict[str, int] = defaultdict(int)
+    live = []
+    for row in unique:
+        ttl = KNOWLEDGE_CACHE_ROW_TTLS.get(row.get("source"))
+        written = parse_timestamp(row.get("updated_at"))
+        if ttl and written is not None and written < now - ttl:
+            expired[row["source"]] += 1
+        else:
+            live.append(row)
+
+    evicted = []
+    if max_rows and len(live) > max_rows:
+        live.sort(key=lambda row: parse_timestamp(row.get("last_hit_at")) or 0.0)
+        evicted, live = live[:len(live) - max_rows], live[len(live) - max_rows:]
+    return {"duplicates": duplicates, "expired": dict(expired), "evicted": evicted, "kept": live}
+
+
+def maintain(args) -> dict:
+    now = time.time()
+    size_before = knowledge_repo.cache_table_size()
+    rows = knowledge_repo.list_cache_rows()
+    work = plan(rows, args.max_rows, now)
+    print(
+        f"{len(rows)} rows: {sum(d['extra_rows'] for d in work['duplicates'].values())} duplicate, "
+        f"{sum(work['expired'].values())} expired, {len(work['evicted'])} over the {args.max_rows}-row budget"
+    )
+
+    report = {
+        "max_rows": args.max_rows,
+        "before": table_stats(rows, now),
+        "size_before": size_before,
+        "duplicate_keys": len(work["duplicates"]),
+    }
+    if args.dry_run:
+        report.update({
+            "would_delete_duplicates": sum(d["extra_rows"] for d in work["duplicates"].values()),
+            "would_delete_expired": work["expired"],
+            "would_evict": len(work["evicted"]),
+        })
+        return report
+
+    started = time.perf_counter()
+    deleted_duplicates = sum(
+        knowledge_repo.delete_older_duplicates(cache_key, duplicate["newest_updated_at"])
+        for cache_key, duplicate in work["duplicates"].items()
+    )
+    deleted_expired = {
+        source: knowledge_repo.delete_expired_cache_rows(source, KNOWLEDGE_CACHE_ROW_TTLS[source])
+        for source in work["expired"]
+    }
+    evicted = knowledge_repo.delete_cache_keys([row["cache_key"] for row in work["evicted"]])
+
+    report.update({
+        "deleted_duplicates": deleted_duplicates,
+        "deleted_expired": deleted_expired,
+        "evicted": evicted,
+        "elapsed_s": round(time.perf_counter() - started, 2),
+        "after": table_stats(work["kept"], now),
+        "size_after": knowledge_repo.cache_table_size(),
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--max-rows", type=int, default=KNOWLEDGE_CACHE_MAX_ROWS, help="rows to keep at most (0 = no budget)")
+    parser.add_argument("--report", help="also write the summary as JSON to this file")
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be deleted")
+    args = parser.parse_args()
+
+    report = maintain(args)
+
+    for label in ("before", "after"):
+        if label not in report:
+            continue
+        print(f"{label}: {report[label]['rows']} rows")
+        for source, stats in report[label]["sources"].items():
+            hit = stats["last_hit_hours_ago"]
+            ttl = f"ttl {stats['ttl_hours']}h" if stats["ttl_hours"] else "no ttl"
+            print(
+                f"  {source}: {stats['rows']} rows ({ttl}), last hit p50 {hit['p50']}h / "
+                f"p90 {hit['p90']}h / max {hit['max']}h ago, {stats['not_hit_since_write']} never read"
+            )
+    for label in ("size_before", "size_after"):
+        size = report.get(label)
+        if size:
+            print(f"{label}: {size['total_bytes'] / 1e6:.1f} MB ({size['index_bytes'] / 1e6:.1f} MB indexes)")
+    if "deleted_duplicates" in report:
+        print(
+            f"Deleted {report['deleted_duplicates']} duplicate and {sum(report['deleted_expired'].values())} expired rows, "
+            f"evicted {report['evicted']} in {report['elapsed_s']}s"
+        )
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
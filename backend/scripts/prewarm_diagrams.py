@@ -0,0 +1,202 @@
+"""
+Pre-warms the diagram cache for a catalog of common DSA topics.
+
+Reads a topic catalog (one request per line, see data/diagram_topics.txt),
+skips topics whose cache key already has an unexpired knowledge_cache row, and
+generates the rest through the same diagram + explanation pipeline as the
+generate_diagram tool, writing each answer to knowledge_cache under the key
+a live request for that topic would use.
+
+Generation runs with bounded concurrency and a rate limit (topics started
+per second; each topic is two Groq calls). A run is resumable: finished
+topics are in the table, so re-running (or running again after Ctrl-C)
+only does what is still missing. Failed topics are retried with backoff,
+then reported. Meant to run nightly from the backend folder:
+
+    python -m scripts.prewarm_diagrams [--catalog scripts/data/diagram_topics.txt]
+        [--concurrency 4] [--rate 1.0] [--attempts 3] [--report prewarm.json] [--dry-run]
+
+Exits with status 1 if any topic failed.
+"""
+import argparse
+import asyncio
+import json
+import signal
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from core.db import run_db
+from services.tools import KNOWLEDGE_CACHE_ROW_TTLS, abuild_diagram_answer, generate_cache_key, get_diagram_chains, knowledge_repo
+
+DEFAULT_CATALOG = Path(__file__).parent / "data" / "diagram_topics.txt"
+SOURCE = "diagram_generation"
+
+
+def load_catalog(path: Path) -> Dict[str, str]:
+    """cache key -> topic, keeping the first topic for keys that several lines share."""
+    topics: Dict[str, str] = {}
+    for line in path.read_text(encoding="utf-8").splitlines():
+        topic = line.strip()
+        if not topic or topic.startswith("#"):
+            continue
+        topics.setdefault(generate_cache_key(topic, "diagram"), topic)
+    return topics
+
+
+class RateLimiter:
+    """Spaces out starts to at most `rate` per second (no bursts)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            delay = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class PrewarmJob:
+    def __init__(self, topics: Dict[str, str], chains, concurrency: int, rate: float, attempts: int, backoff: float):
+        self.queue: "asyncio.Queue[tuple[str, str]]" = asyncio.Queue()
+        for item in topics.items():
+            self.queue.put_nowait(item)
+        self.chains = chains
+        self.concurrency = concurrency
+        self.limiter = RateLimiter(rate)
+        self.attempts = attempts
+        self.backoff = backoff
+        self.stopping = False
+        self.generated: List[str] = []
+        self.failed: Dict[str, str] = {}
+        self.latencies: List[float] = []
+        self.retries = 0
+
+    async def _generate(self, cache_key: str, topic: str) -> Optional[str]:
+        """Generates and stores one topic; returns the last error, or None on success."""
+        error = None
+        for attempt in range(self.attempts):
+            if attempt:
+                self.retries += 1
+                await asyncio.sleep(self.backoff * 2 ** (attempt - 1))
+            await self.limiter.wait()
+            started = time.perf_counter()
+            try:
+                answer = await abuild_diagram_answer(topic, self.chains)
+                await knowledge_repo.asave_cached_answer(cache_key, topic, answer, SOURCE)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                print(f"  ✗ {topic} (attempt {attempt + 1}/{self.attempts}): {error}")
+                continue
+            self.latencies.append(time.perf_counter() - started)
+            return None
+        return error
+
+    async def _worker(self):
+        while not self.stopping:
+            try:
+                cache_key, topic = self.queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            error = await self._generate(cache_key, topic)
+            if error is None:
+                self.generated.append(topic)
+                print(f"  ✓ {topic}")
+            else:
+                self.failed[topic] = error
+
+    async def run(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.concurrency)))
+
+    def stop(self):
+        """Lets in-flight topics finish but starts no new ones (the next run picks them up)."""
+        if not self.stopping:
+            print("Stopping after the topics in flight; re-run to continue.")
+        self.stopping = True
+
+
+async def prewarm(args) -> dict:
+    topics = load_catalog(Path(args.catalog))
+    existing = await run_db(knowledge_repo.existing_cache_keys, list(topics), KNOWLEDGE_CACHE_ROW_TTLS[SOURCE] or None)
+    missing = {key: topic for key, topic in topics.items() if key not in existing}
+    print(f"{len(topics)} catalog topics: {len(existing)} already cached, {len(missing)} to generate")
+
+    report = {
+        "catalog": str(args.catalog),
+        "topics": len(topics),
+        "already_cached": len(existing),
+        "to_generate": len(missing),
+    }
+    if args.dry_run or not missing:
+        for topic in missing.values():
+            print(f"  - {topic}")
+        return report
+
+    chains = get_diagram_chains()
+    if chains is None:
+        raise SystemExit("Groq is not configured (GROQ_API_KEY); nothing generated.")
+
+    job = PrewarmJob(missing, chains, args.concurrency, args.rate, args.attempts, args.backoff)
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(signum, job.stop)
+        except NotImplementedError:
+            pass
+
+    started = time.perf_counter()
+    await job.run()
+    elapsed = time.perf_counter() - started
+
+    report.update({
+        "generated": len(job.generated),
+        "failed": job.failed,
+        "not_started": job.queue.qsize(),
+        "retries": job.retries,
+        "elapsed_s": round(elapsed, 2),
+        "topics_per_minute": round(len(job.generated) / elapsed * 60, 2) if elapsed else 0.0,
+        "latency_s": {
+            "p50": round(statistics.median(job.latencies), 3),
+            "max": round(max(job.latencies), 3),
+        } if job.latencies else {},
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--catalog", default=str(DEFAULT_CATALOG), help="topic catalog file")
+    parser.add_argument("--concurrency", type=int, default=4, help="topics generated at once")
+    parser.add_argument("--rate", type=float, default=1.0, help="topics started per second (0 = unlimited)")
+    parser.add_argument("--attempts", type=int, default=3, help="tries per topic before it counts as failed")
+    parser.add_argument("--backoff", type=float, default=2.0, help="seconds before the first retry (doubles after)")
+    parser.add_argument("--report", help="also write the summary as JSON to this file")
+    parser.add_argument("--dry-run", action="store_true", help="only list the topics that would be generated")
+    args = parser.parse_args()
+
+    report = asyncio.run(prewarm(args))
+
+    if "generated" in report:
+        print(
+            f"Generated {report['generated']}/{report['to_generate']} in {report['elapsed_s']}s "
+            f"({report['topics_per_minute']} topics/min), {len(report['failed'])} failed, "
+            f"{report['not_started']} not started, {report['retries']} retries"
+        )
+        for topic, error in report["failed"].items():
+            print(f"  failed: {topic}: {error}")
+    if args.report:
+        Path(args.report).write_text(json.dumps(report, indent=2))
+    sys.exit(1 if report.get("failed") else 0)
+
+
+if __name__ == "__main__":
+    main()
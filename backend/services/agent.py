@@ -1,19 +1,44 @@
-from typing import TypedDict, Annotated
+from typing import TypedDict, Annotated, List, Optional
+import asyncio
+import hashlib
+import json
 import operator
-from langchain_core.messages import BaseMessage, AIMessage, SystemMessage
+import time
+import uuid
+from langchain_core.messages import BaseMessage, AIMessage, HumanMessage, SystemMessage, ToolMessage
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
-from .tools import query_supabase, web_search, generate_diagram
+from langchain_core.runnables import RunnableConfig
+from core import config
+from core.config import (
+    CONTEXT_MAX_TOKENS, CONTEXT_RECENT_TURNS, CONTEXT_SUMMARY_MODEL, CHAT_TURN_DEADLINE, TOOL_MIN_TIME_BUDGET,
+    TURN_CACHE_TTL, TURN_CACHE_MAX_SIZE,
+    INTENT_ROUTER_ENABLED, INTENT_ROUTER_MIN_CONFIDENCE, INTENT_ROUTER_TRAINING_PATH,
+)
+from core.lazy import lazy_singleton
+from core.metrics import NODE_DURATION, ROUTER_DECISIONS, instrumented, record_llm_usage
+from .tools import query_supabase, web_search, generate_diagram, get_diagram_chains, knowledge_repo
+from .context import ContextWindowManager, estimate_tokens, make_llm_summarizer
+from .llm_scheduler import LLMOverloaded, current_llm_user, gemini_scheduler
+from .intent_router import INTENT_TOOLS, IntentRouter, canned_reply
+from .streaming import content_text
+from .turn_cache import TurnAnswerCache
 
 class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], operator.add]
     session_id: str
     user_id: str
+    # time.monotonic() by which the turn should be answered (None: no limit)
+    deadline: Optional[float]
 
 tools = [query_supabase, web_search, generate_diagram]
-tool_node = ToolNode(tools)
+tools_by_name = {tool.name: tool for tool in tools}
+
+# Section titles when several tool results are merged into one answer (shown as plain text)
+TOOL_RESULT_TITLES = {
+    "generate_diagram": "Diagram",
+    "web_search": "Recent information",
+    "query_supabase": "From the knowledge base",
+}
 
 system_prompt = SystemMessage(
     content="""You are an expert Data Structures and Algorithms tutor with intelligent tool routing.
@@ -48,25 +73,171 @@ TOOL ROUTING RULES:
 4. **Greetings/Casual** (keywords: "hello", "hi", "thanks"):
    → Answer directly, no tools needed
 
+5. **Multi-part Requests** (e.g. "explain and draw Dijkstra and find recent variants"):
+   → Call every tool the request needs in this one step
+   → They run at the same time and their results are combined into one answer
+
 After your <thinking> block, execute your plan. Be concise and educational."""
 )
 
+# Prompt overhead and expected completion size of a supervisor call, for the Gemini token budget
+SYSTEM_PROMPT_TOKENS = estimate_tokens(system_prompt)
+SUPERVISOR_OUTPUT_TOKENS = 600
+
 supervisor_prompt = ChatPromptTemplate.from_messages([system_prompt, ("placeholder", "{messages}")])
-supervisor_llm = ChatGoogleGenerativeAI(model="gemini-2.0-flash-exp", temperature=0.3)
-supervisor_llm_with_tools = supervisor_llm.bind_tools(tools)
-supervisor_chain = supervisor_prompt | supervisor_llm_with_tools
 
-def supervisor_node(state: AgentState) -> dict:
+SUPERVISOR_MODEL = "gemini-2.0-flash-exp"
+
+# Changes whenever the system prompt or the tools the supervisor sees change,
+# which invalidates every cached turn answer
+PROMPT_VERSION = hashlib.md5(json.dumps(
+    [system_prompt.content] + [[tool.name, tool.description] for tool in tools]
+).encode()).hexdigest()[:12]
+
+# The Gemini client and the compiled graph are built on first use (or by the
+# startup warmup); importing their libraries alone takes about a second
+
+@lazy_singleton
+def get_supervisor_chain():
+    """Supervisor prompt piped into Gemini with the tools bound."""
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    supervisor_llm = ChatGoogleGenerativeAI(model=SUPERVISOR_MODEL, temperature=0.3, google_api_key=config.GOOGLE_API_KEY)
+    return supervisor_prompt | supervisor_llm.bind_tools(tools)
+
+@lazy_singleton
+def get_intent_router() -> IntentRouter:
+    """Keyword rules plus a naive Bayes classifier trained on the labeled queries file."""
+    return IntentRouter.from_file(INTENT_ROUTER_TRAINING_PATH, min_confidence=INTENT_ROUTER_MIN_CONFIDENCE)
+
+@instrumented(NODE_DURATION, "node:router", node="router")
+def router_node(state: AgentState) -> dict:
+    """Answers greetings and dispatches clear diagram/search requests without the supervisor's LLM call."""
+    last_message = state["messages"][-1]
+    if not INTENT_ROUTER_ENABLED or not isinstance(last_message, HumanMessage):
+        return {"messages": []}
+    
+    text = content_text(last_message.content)
+    decision = get_intent_router().classify(text, has_history=len(state["messages"]) > 1)
+    ROUTER_DECISIONS.inc(route=decision.intent, method=decision.method)
+    if not decision.routed:
+        return {"messages": []}
+    
+    print(f"---ROUTER: {decision.intent} ({decision.method}, p={decision.confidence:.2f})---")
+    if decision.intent == "greeting":
+        thinking = "<thinking>\n- The user is greeting or thanking me; no tools needed.\n</thinking>"
+        return {"messages": [AIMessage(content=f"{thinking}\n\n{canned_reply(text)}")]}
+    
+    # Same shape as a supervisor tool call, so the tools -> presenter path runs unchanged
+    tool_name, arg = INTENT_TOOLS[decision.intent]
+    thinking = f"<thinking>\n- This is a {decision.intent.replace('_', ' ')} request, so I'll use {tool_name}.\n</thinking>"
+    tool_call = {"name": tool_name, "args": {arg: text}, "id": f"call_{uuid.uuid4().hex[:24]}", "type": "tool_call"}
+    return {"messages": [AIMessage(content=thinking, tool_calls=[tool_call])]}
+
+def route_after_router(state: AgentState) -> str:
+    """Supervisor unless the router already answered (end) or picked a tool."""
+    last_message = state["messages"][-1]
+    if isinstance(last_message, AIMessage):
+        return "continue" if last_message.tool_calls else "end"
+    return "supervisor"
+
+@instrumented(NODE_DURATION, "node:supervisor", node="supervisor")
+async def supervisor_node(state: AgentState) -> dict:
     """Main decision node with smart routing."""
     print("---SUPERVISOR---")
-    response = supervisor_chain.invoke({"messages": state["messages"]})
+    # Waits for a Gemini slot and token budget (or raises LLMOverloaded when the queue is too long)
+    tokens = SYSTEM_PROMPT_TOKENS + sum(estimate_tokens(message) for message in state["messages"]) + SUPERVISOR_OUTPUT_TOKENS
+    async with gemini_scheduler.slot(tokens) as lease:
+        response = await get_supervisor_chain().ainvoke({"messages": state["messages"]})
+        lease.record(response)
+    record_llm_usage("supervisor", response)
     return {"messages": [response]}
 
+async def run_tool_call(tool_call: dict, config: RunnableConfig) -> ToolMessage:
+    """Runs one tool call; failures become an error result instead of failing the turn."""
+    name = tool_call["name"]
+    tool = tools_by_name.get(name)
+    if tool is None:
+        return ToolMessage(content=f"Unknown tool {name}.", name=name, tool_call_id=tool_call["id"], status="error")
+    try:
+        return await tool.ainvoke({**tool_call, "type": "tool_call"}, config)
+    except LLMOverloaded:
+        raise
+    except Exception as e:
+        print(f"Error in tool {name}: {e}")
+        return ToolMessage(content=f"{name} failed: {e}", name=name, tool_call_id=tool_call["id"], status="error")
+
+def _log_late_tool(task: asyncio.Task):
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Tool left running after the deadline failed: {task.exception()}")
+
+async def run_tool_calls(tool_calls: List[dict], config: RunnableConfig, deadline: Optional[float]) -> List[ToolMessage]:
+    """
+    Runs all of a message's tool calls at once, so the step takes as long as
+    the slowest tool rather than the sum of them all. Tools still running at
+    the turn's deadline are reported as timed out and the rest are returned;
+    the late ones keep running in the background, so their (cached) result
+    is ready if the user asks again.
+    """
+    timeout = max(TOOL_MIN_TIME_BUDGET, deadline - time.monotonic()) if deadline is not None else None
+    tasks = [asyncio.ensure_future(run_tool_call(tool_call, config)) for tool_call in tool_calls]
+    try:
+        await asyncio.wait(tasks, timeout=timeout)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    
+    results, overloaded = [], []
+    for tool_call, task in zip(tool_calls, tasks):
+        name = tool_call["name"]
+        if not task.done():
+            print(f"---TOOL: {name} missed the turn deadline ({timeout:.1f}s)---")
+            task.add_done_callback(_log_late_tool)
+            note = f"{name} didn't finish in time, so this answer leaves it out. Ask again in a moment to include it."
+        elif isinstance(task.exception(), LLMOverloaded):
+            overloaded.append(task.exception())
+            note = f"{name} was skipped because the model is busy. Ask again in a moment to include it."
+        else:
+            results.append(task.result())
+            continue
+        results.append(ToolMessage(content=note, name=name, tool_call_id=tool_call["id"], status="error"))
+    if overloaded and len(overloaded) == len(tasks):
+        # Nothing to show at all: end the turn with the "overloaded" error
+        raise overloaded[0]
+    return results
+
+def merge_tool_results(tool_messages: List[ToolMessage]) -> str:
+    """One answer from a step's tool results: a section per result, notes for the ones that failed."""
+    succeeded = [message for message in tool_messages if message.status != "error"]
+    failed = [message for message in tool_messages if message.status == "error"]
+    if len(tool_messages) == 1:
+        return content_text(tool_messages[0].content)
+    
+    sections, diagram_shown = [], False
+    for message in succeeded:
+        text = content_text(message.content).strip()
+        if "%%MERMAID%%" in text:
+            # The client renders one Mermaid block per answer; later diagrams stay readable as code
+            if diagram_shown:
+                text = text.replace("%%MERMAID%%", "```mermaid").replace("%%/MERMAID%%", "```")
+            diagram_shown = True
+        title = TOOL_RESULT_TITLES.get(message.name)
+        sections.append(f"{title}:\n{text}" if title and len(succeeded) > 1 else text)
+    sections += [f"Note: {content_text(message.content).strip()}" for message in failed]
+    return "\n\n".join(sections)
+
+@instrumented(NODE_DURATION, "node:presenter", node="presenter")
 def present_tool_result_node(state: AgentState) -> dict:
-    """Presents tool results as final answer."""
+    """Presents the tool results of the last step as the final answer."""
     print("---PRESENTER---")
-    tool_message = state["messages"][-1]
-    final_answer = AIMessage(content=tool_message.content)
+    tool_messages = []
+    for message in reversed(state["messages"]):
+        if not isinstance(message, ToolMessage):
+            break
+        tool_messages.insert(0, message)
+    # Marked partial when a tool failed or timed out, so the answer isn't cached as the turn's answer
+    partial = any(message.status == "error" for message in tool_messages)
+    final_answer = AIMessage(content=merge_tool_results(tool_messages), response_metadata={"partial": partial})
     return {"messages": [final_answer]}
 
 def should_continue(state: AgentState) -> str:
@@ -74,24 +245,82 @@ def should_continue(state: AgentState) -> str:
     last_message = state["messages"][-1]
     return "continue" if isinstance(last_message, AIMessage) and last_message.tool_calls else "end"
 
-# Build graph
-workflow = StateGraph(AgentState)
-workflow.add_node("supervisor", supervisor_node)
-workflow.add_node("tools", tool_node)
-workflow.add_node("presenter", present_tool_result_node)
-workflow.add_conditional_edges("supervisor", should_continue, {"continue": "tools", "end": END})
-workflow.add_edge("tools", "presenter")
-workflow.add_edge("presenter", END)
-workflow.set_entry_point("supervisor")
+@lazy_singleton
+def get_app_graph():
+    """Builds and compiles the agent graph."""
+    from langgraph.graph import StateGraph, END
+    
+    @instrumented(NODE_DURATION, "node:tools", node="tools")
+    async def tools_node(state: AgentState, config: RunnableConfig) -> dict:
+        # Runs every tool call of the last message concurrently; each tool is also timed on its own
+        tool_calls = state["messages"][-1].tool_calls
+        return {"messages": await run_tool_calls(tool_calls, config, state.get("deadline"))}
+    
+    workflow = StateGraph(AgentState)
+    workflow.add_node("router", router_node)
+    workflow.add_node("supervisor", supervisor_node)
+    workflow.add_node("tools", tools_node)
+    workflow.add_node("presenter", present_tool_result_node)
+    workflow.add_conditional_edges("router", route_after_router, {"supervisor": "supervisor", "continue": "tools", "end": END})
+    workflow.add_conditional_edges("supervisor", should_continue, {"continue": "tools", "end": END})
+    workflow.add_edge("tools", "presenter")
+    workflow.add_edge("presenter", END)
+    workflow.set_entry_point("router")
+    return workflow.compile()
+
+@lazy_singleton
+def get_summarizer():
+    """LLM summarizer for long histories (None if Groq can't be initialized)."""
+    try:
+        from langchain_groq import ChatGroq
+        return make_llm_summarizer(ChatGroq(model_name=CONTEXT_SUMMARY_MODEL, temperature=0, api_key=config.GROQ_API_KEY))
+    except Exception as e:
+        print(f"Warning: Could not initialize history summarizer: {e}")
+        return None
+
+async def summarize_history(previous_summary: str, messages: list) -> str:
+    summarizer = get_summarizer()
+    if summarizer is None:
+        return previous_summary
+    return await summarizer(previous_summary, messages)
+
+# Keeps long sessions under a token budget with a cached rolling summary
+context_manager = ContextWindowManager(
+    max_tokens=CONTEXT_MAX_TOKENS,
+    recent_turns=CONTEXT_RECENT_TURNS,
+    summarizer=summarize_history,
+)
+
+# Replays answers to first-turn questions asked before (same model and prompt version)
+turn_cache = TurnAnswerCache(
+    version=f"{SUPERVISOR_MODEL}:{PROMPT_VERSION}",
+    ttl=TURN_CACHE_TTL,
+    max_size=TURN_CACHE_MAX_SIZE,
+    repo=knowledge_repo,
+)
+
+def warm_up():
+    """Builds the LLM clients and the graph ahead of the first request."""
+    get_supervisor_chain()
+    get_intent_router()
+    get_app_graph()
+    get_summarizer()
+    get_diagram_chains()
 
-app_graph = workflow.compile()
+async def astream_with_learning_context(messages, session_id=None, user_id=None, stream_mode="values"):
+    """
+    Async streaming with session context.
 
-async def astream_with_learning_context(messages, session_id=None, user_id=None):
-    """Async streaming with session context."""
+    stream_mode="values" yields full state snapshots after each node;
+    stream_mode="messages" yields (message_chunk, metadata) pairs as LLM tokens arrive.
+    """
+    # LLM calls made for this turn are queued under the user (fair queueing across users)
+    current_llm_user.set(user_id or "anonymous")
     inputs = {
         "messages": messages,
         "session_id": session_id,
-        "user_id": user_id
+        "user_id": user_id,
+        "deadline": time.monotonic() + CHAT_TURN_DEADLINE if CHAT_TURN_DEADLINE else None,
     }
-    async for event in app_graph.astream(inputs, stream_mode="values"):
+    async for event in get_app_graph().astream(inputs, stream_mode=stream_mode):
         yield event
\ No newline at end of file
@@ -0,0 +1,166 @@
+import asyncio
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from core.metrics import CACHE_LOOKUP_DURATION, timed
+from .repository import KnowledgeRepository
+
+MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU cache whose entries expire after a per-entry TTL."""
+
+    def __init__(self, max_size: int = 1024):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires_at = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (value, time.time() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class AsyncSingleFlight:
+    """Collapses concurrent awaits on the same key into one task."""
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> "tuple[Any, bool]":
+        call = self._calls.get(key)
+        if call is not None:
+            return await asyncio.shield(call), True
+
+        call = self._calls[key] = asyncio.ensure_future(fn())
+        try:
+            return await asyncio.shield(call), False
+        finally:
+            if call.done():
+                self._calls.pop(key, None)
+            else:
+                # The leader was cancelled; let the shared call finish for the others
+                call.add_done_callback(lambda _: self._calls.pop(key, None))
+
+
+class KnowledgeCache:
+    """
+    Memory tier in front of the knowledge_cache table.
+
+    Lookups go memory -> table -> upstream. Concurrent misses on the same key
+    share a single table lookup and upstream call, so a burst of users asking
+    the same popular question costs one Brave/Groq request and one write.
+    Table rows older than their source's row TTL count as misses.
+    """
+
+    def __init__(
+        self,
+        repo: KnowledgeRepository,
+        max_size: int = 1024,
+        ttls: Optional[Dict[str, int]] = None,
+        default_ttl: int = 3600,
+        row_ttls: Optional[Dict[str, int]] = None,
+    ):
+        self.repo = repo
+        self.memory = TTLCache(max_size=max_size)
+        self.ttls = ttls or {}
+        self.default_ttl = default_ttl
+        self.row_ttls = row_ttls or {}
+        self._async_flight = AsyncSingleFlight()
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def ttl_for(self, source: str) -> int:
+        return self.ttls.get(source, self.default_ttl)
+
+    def row_ttl_for(self, source: str) -> Optional[int]:
+        """Max age of a table row for source, or None if its rows don't expire."""
+        return self.row_ttls.get(source) or None
+
+    async def _load_or_compute(self, cache_key: str, question: str, source: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        with timed(CACHE_LOOKUP_DURATION, "cache:lookup", source=source):
+            try:
+                cached = await self.repo.aget_cached_answer(cache_key, self.row_ttl_for(source))
+            except Exception as e:
+                print(f"Cache check error: {e}")
+                cached = None
+        if cached is not None:
+            self._count("db_hits")
+            self.memory.set(cache_key, cached, self.ttl_for(source))
+            return cached
+
+        self._count("misses")
+        answer = await compute()
+        if answer is None:
+            return None
+
+        self.memory.set(cache_key, answer, self.ttl_for(source))
+        try:
+            await self.repo.asave_cached_answer(cache_key, question, answer, source)
+        except Exception as e:
+            print(f"Cache save error: {e}")
+        return answer
+
+    async def aget_or_compute(self, cache_key: str, question: str, source: str, compute: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """
+        Returns the cached answer for cache_key, or computes, stores and returns it.
+
+        compute is a coroutine function returning None when there is nothing
+        worth caching; exceptions it raises reach every caller that was
+        waiting on the same key.
+        """
+        cached = self.memory.get(cache_key)
+        if cached is not MISSING:
+            self._count("hits")
+            return cached
+
+        answer, shared = await self._async_flight.do(cache_key, lambda: self._load_or_compute(cache_key, question, source, compute))
+        if shared:
+            self._count("coalesced")
+        return answer
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.db_hits + self.misses + self.coalesced
+        return {
+            "size": len(self.memory),
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_ratio": round((lookups - self.misses) / lookups, 4) if lookups else 0.0,
+        }
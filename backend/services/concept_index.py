@@ -0,0 +1,274 @@
+import heapq
+import math
+import re
+import threading
+from collections import Counter, defaultdict
+from itertools import chain
+from typing import Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from .cache import MISSING, TTLCache
+
+WORD_PATTERN = re.compile(r"[a-z0-9+#]+")
+EMPTY_POSTING: FrozenSet[int] = frozenset()
+
+
+def normalize_title(text: str) -> str:
+    return " ".join(WORD_PATTERN.findall(text.lower()))
+
+
+def trigrams(text: str) -> FrozenSet[str]:
+    """pg_trgm-style trigrams: each word padded with two spaces in front and one behind."""
+    grams: Set[str] = set()
+    for word in normalize_title(text).split():
+        padded = f"  {word} "
+        for i in range(len(padded) - 2):
+            grams.add(padded[i:i + 3])
+    return frozenset(grams)
+
+
+class _IndexData:
+    """One version of the index. Never changed once published, so searches read it without the lock."""
+
+    def __init__(self):
+        self.slots: Dict[str, int] = {}
+        # Per-slot data; a replaced concept keeps its slot
+        self.rows: List[Optional[dict]] = []
+        self.titles: List[str] = []
+        self.grams: List[FrozenSet[str]] = []
+        self.postings: Dict[str, FrozenSet[int]] = {}
+        # For trigrams in more than max_posting titles: the max_posting shortest of them,
+        # and a lower bound on the trigram count of every title left out
+        self.heads: Dict[str, FrozenSet[int]] = {}
+        self.head_floors: Dict[str, int] = {}
+
+    def copy(self) -> "_IndexData":
+        data = _IndexData()
+        data.slots, data.rows, data.titles = dict(self.slots), list(self.rows), list(self.titles)
+        data.grams, data.postings, data.heads = list(self.grams), dict(self.postings), dict(self.heads)
+        data.head_floors = dict(self.head_floors)
+        return data
+
+
+class ConceptIndex:
+    """
+    In-process trigram index over the concepts table.
+
+    `search` ranks titles by trigram similarity to the query (the same measure
+    as pg_trgm's similarity()), with a bonus when the query appears in the
+    title as-is. Typos ("binary serach tree") and reordered words still match,
+    and titles containing the query come first, as they did with ILIKE.
+    Rows are upserted by id, which lets the refresher apply only the rows
+    whose updated_at moved since the last load. Recent results are memoized
+    until the next change.
+
+    Writes build a new version of the index (copy-on-write) and swap it in, so
+    a search only holds the lock long enough to pick up the current version.
+    With max_posting set, a trigram in more than `max_posting` titles (" tr",
+    "ree") first brings only its `max_posting` shortest titles in as
+    candidates, to skip counting tens of thousands of long titles that share
+    just common trigrams. When a title left out could still make the results,
+    the search runs again without the heads, so results are always the same
+    as with the default max_posting=0.
+    """
+
+    def __init__(self, threshold: float = 0.3, result_cache_size: int = 2048, max_posting: int = 0):
+        self.threshold = threshold
+        self.max_posting = max_posting
+        self._data = _IndexData()
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._results = TTLCache(max_size=result_cache_size)
+        self.last_updated_at: Optional[str] = None
+        self.loaded = False
+
+    def _apply(self, data: _IndexData, rows: Iterable[dict]) -> int:
+        """Upserts rows into data (an unpublished copy); returns how many were applied."""
+        added: Dict[str, Set[int]] = defaultdict(set)
+        removed: Dict[str, Set[int]] = defaultdict(set)
+        applied = 0
+        for row in rows:
+            concept_id = str(row["id"])
+            slot = data.slots.get(concept_id)
+            if slot is None:
+                slot = data.slots[concept_id] = len(data.rows)
+                data.rows.append(None)
+                data.titles.append("")
+                data.grams.append(frozenset())
+            for gram in data.grams[slot]:
+                removed[gram].add(slot)
+                added[gram].discard(slot)
+
+            title = row.get("title") or ""
+            grams = trigrams(title)
+            data.rows[slot] = row
+            data.titles[slot] = normalize_title(title)
+            data.grams[slot] = grams
+            for gram in grams:
+                added[gram].add(slot)
+                removed[gram].discard(slot)
+
+            updated_at = row.get("updated_at")
+            if updated_at and (self.last_updated_at is None or updated_at > self.last_updated_at):
+                self.last_updated_at = updated_at
+            applied += 1
+
+        # Each touched posting is rebuilt once per batch, not once per row
+        title_size = lambda slot: len(data.grams[slot])
+        for gram in added.keys() | removed.keys():
+            posting = (data.postings.get(gram, EMPTY_POSTING) - removed.get(gram, EMPTY_POSTING)) | added.get(gram, EMPTY_POSTING)
+            if posting:
+                data.postings[gram] = frozenset(posting)
+            else:
+                data.postings.pop(gram, None)
+            if not self.max_posting or len(posting) <= self.max_posting:
+                data.heads.pop(gram, None)
+                data.head_floors.pop(gram, None)
+                continue
+            head = data.heads.get(gram)
+            floor = data.head_floors.get(gram)
+            if head is None:
+                head = posting
+            else:
+                # Titles only join or leave a head when they change: rank just those
+                # (a head that lost titles is refilled at the next full reload)
+                head = (head - removed.get(gram, EMPTY_POSTING)) | added.get(gram, EMPTY_POSTING)
+            ranked = sorted(head, key=title_size)
+            data.heads[gram] = frozenset(ranked[:self.max_posting])
+            # Removed titles can only raise the true floor, so the old one stays a valid bound
+            if len(ranked) > self.max_posting:
+                dropped = title_size(ranked[self.max_posting])
+                floor = dropped if floor is None else min(floor, dropped)
+            data.head_floors[gram] = floor
+        return applied
+
+    def upsert(self, rows: Iterable[dict]) -> int:
+        """Adds or replaces rows (id, title, explanation, updated_at). Returns how many were applied."""
+        rows = list(rows)
+        # Writers take turns building the next version; searches only wait for the swap
+        with self._write_lock:
+            applied = 0
+            if rows:
+                data = self._data.copy()
+                applied = self._apply(data, rows)
+            with self._lock:
+                if rows:
+                    self._data = data
+                self.loaded = True
+        if applied:
+            self._results.clear()
+        return applied
+
+    def replace_all(self, rows: Iterable[dict]) -> int:
+        """Rebuilds the index from a full load (also drops concepts deleted upstream)."""
+        # Build on the side and swap, so searches keep working during a reload
+        fresh = ConceptIndex(self.threshold, max_posting=self.max_posting)
+        applied = fresh.upsert(rows)
+        with self._write_lock, self._lock:
+            self._data = fresh._data
+            self.last_updated_at = fresh.last_updated_at
+            self.loaded = True
+        self._results.clear()
+        return applied
+
+    @staticmethod
+    def _score(data: _IndexData, slot: int, query_grams: FrozenSet[str], needle: str) -> float:
+        grams = data.grams[slot]
+        count = len(query_grams & grams)
+        score = count / (len(query_grams) + len(grams) - count)
+        # Containment needs every query trigram, so the substring test is rarely run
+        if count == len(query_grams) and needle in data.titles[slot]:
+            score += 1.0
+        return score
+
+    def _search(self, query: str, limit: int) -> List[Tuple[float, dict]]:
+        query_grams = trigrams(query)
+        if not query_grams:
+            return []
+        needle = normalize_title(query)
+        query_size = len(query_grams)
+
+        with self._lock:
+            data = self._data
+        grams = data.grams
+        present = sorted((gram for gram in query_grams if gram in data.postings), key=lambda gram: len(data.postings[gram]))
+        if not present:
+            return []
+        postings = [data.postings[gram] for gram in present]
+        # Similarity is at most shared / query_size, and the bonus needs every trigram
+        if len(present) < self.threshold * query_size:
+            return []
+
+        # Probe: titles holding as many of the rarest trigrams as possible (set
+        # intersections run in C), shortest first, give a guess at the k-th best score
+        probe = postings[0]
+        for posting in postings[1:]:
+            narrowed = probe & posting
+            if len(narrowed) < limit:
+                break
+            probe = narrowed
+        guesses = sorted(
+            (self._score(data, slot, query_grams, needle) for slot in heapq.nsmallest(limit * 4, probe, key=lambda slot: len(grams[slot]))),
+            reverse=True,
+        )
+        floor = max(self.threshold, guesses[limit - 1] if len(guesses) >= limit else 0.0)
+
+        # A title missing the `required` rarest trigrams has similarity below the floor,
+        # so candidates only come from those postings (or first their heads, see above)
+        needed = math.ceil(min(floor, 1.0) * query_size - 1e-9)
+        required = max(1, len(present) - needed + 1)
+        best = self._rank(data, query_grams, needle, present, postings, required, floor, limit, data.heads)
+        # A title a head left out has at least min(cut) trigrams, so its similarity is at
+        # most query_size / min(cut); if that could reach the k-th result, rank again
+        # from the full postings, so capping never changes the results
+        cut = [data.head_floors[gram] for gram in present[:required] if gram in data.heads]
+        if cut:
+            kth = best[-1][0] if len(best) == limit else self.threshold
+            if query_size / max(query_size, min(cut)) >= kth:
+                best = self._rank(data, query_grams, needle, present, postings, required, floor, limit, {})
+        return [(round(score, 4), data.rows[slot]) for score, slot in best]
+
+    def _rank(
+        self, data: _IndexData, query_grams: FrozenSet[str], needle: str, present: List[str],
+        postings: List[FrozenSet[int]], required: int, floor: float, limit: int, heads: Dict[str, FrozenSet[int]],
+    ) -> List[Tuple[float, int]]:
+        """The `limit` best (score, slot) pairs among titles holding one of the `required` rarest trigrams."""
+        grams = data.grams
+        query_size = len(query_grams)
+        uncounted = len(present) - required
+        shared = Counter(chain.from_iterable(heads.get(gram, posting) for gram, posting in zip(present[:required], postings)))
+        # Titles that contain the query may be long, so they are found separately:
+        # they are in every posting, and intersecting rarest first stays small
+        if len(present) == query_size:
+            containing = postings[0]
+            for posting in postings[1:]:
+                if not containing:
+                    break
+                containing = containing & posting
+            for slot in containing:
+                shared[slot] = required
+
+        scored = []
+        for slot, count in shared.items():
+            # Upper bound if the title also has every uncounted trigram
+            size = len(grams[slot])
+            best_case = min(count + uncounted, query_size, size)
+            bound = best_case / (query_size + size - best_case) + (1.0 if best_case == query_size else 0.0)
+            if bound < floor:
+                continue
+            score = self._score(data, slot, query_grams, needle)
+            if score >= self.threshold:
+                scored.append((score, slot))
+        return heapq.nlargest(limit, scored)
+
+    def search(self, query: str, limit: int = 3) -> List[Tuple[float, dict]]:
+        """Best matches for query as (score, row), highest score first."""
+        key = f"{limit}:{normalize_title(query)}"
+        cached = self._results.get(key)
+        if cached is not MISSING:
+            return cached
+        results = self._search(query, limit)
+        self._results.set(key, results, ttl=3600)
+        return results
+
+    def __len__(self) -> int:
+        return len(self._data.slots)
@@ -0,0 +1,139 @@
+from typing import Awaitable, Callable, List, Optional
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+from langchain_core.prompts import ChatPromptTemplate
+from core.metrics import record_llm_usage
+from .cache import MISSING, TTLCache
+from .streaming import content_text
+
+SUMMARY_PREFIX = "[Summary of our earlier conversation]"
+
+Summarizer = Callable[[str, List[BaseMessage]], Awaitable[str]]
+
+
+def estimate_tokens(message: BaseMessage) -> int:
+    """Cheap token estimate (~4 characters per token plus per-message overhead)."""
+    return len(content_text(message.content)) // 4 + 4
+
+
+def split_turns(messages: List[BaseMessage]) -> List[List[BaseMessage]]:
+    """Groups a transcript into turns, each starting at a user message."""
+    turns: List[List[BaseMessage]] = []
+    for message in messages:
+        if isinstance(message, HumanMessage) or not turns:
+            turns.append([message])
+        else:
+            turns[-1].append(message)
+    return turns
+
+
+class ContextWindowManager:
+    """
+    Keeps the prompt for long sessions under a token budget.
+
+    The last `recent_turns` turns are sent verbatim. Anything older is folded
+    into a rolling summary that is cached per session and only extended with
+    the turns that have aged out since it was last built, so each turn costs
+    at most one small summarization call.
+
+    The summary remembers the position (created_at) of the last message it
+    covers, not how many it covers: stored history is a sliding window of the
+    newest messages, so counts stop meaning anything once a session outgrows it.
+    """
+
+    def __init__(
+        self,
+        max_tokens: int = 6000,
+        recent_turns: int = 6,
+        summarizer: Optional[Summarizer] = None,
+        cache_size: int = 1024,
+        cache_ttl: int = 6 * 3600,
+    ):
+        self.max_tokens = max_tokens
+        self.recent_turns = recent_turns
+        self.summarizer = summarizer
+        self.cache_ttl = cache_ttl
+        # session_id -> (position of the last message covered, summary text)
+        self._summaries = TTLCache(max_size=cache_size)
+
+    async def _summary_for(self, session_id: str, older: List[BaseMessage], positions: List[float]) -> str:
+        cached = self._summaries.get(session_id)
+        covered, summary = (None, "") if cached is MISSING else cached
+        if covered is not None and covered > positions[-1]:
+            # Summarized messages were deleted; start over
+            covered, summary = None, ""
+        new = [message for message, position in zip(older, positions) if covered is None or position > covered]
+        if not new:
+            return summary
+
+        if self.summarizer is not None:
+            try:
+                summary = await self.summarizer(summary, new)
+            except Exception as e:
+                print(f"Error summarizing history: {e}")
+                return summary
+        self._summaries.set(session_id, (positions[-1], summary), self.cache_ttl)
+        return summary
+
+    def _trim_to_budget(self, messages: List[BaseMessage], budget: int) -> List[BaseMessage]:
+        # Drop whole turns from the front, but always keep the newest turn
+        turns = split_turns(messages)
+        while len(turns) > 1 and sum(estimate_tokens(m) for turn in turns for m in turn) > budget:
+            turns.pop(0)
+        return [message for turn in turns for message in turn]
+
+    def forget(self, session_id: str):
+        """Drops the cached summary of a deleted session."""
+        self._summaries.delete(session_id)
+
+    async def build(self, session_id: str, history: List[BaseMessage], positions: Optional[List[Optional[float]]] = None) -> List[BaseMessage]:
+        """
+        Returns the messages to send to the supervisor for this turn.
+
+        `positions` orders the messages across turns (their created_at
+        timestamps); without them (e.g. a client-sent conversation, which
+        always starts at the first message) the list index is used.
+        """
+        if sum(estimate_tokens(m) for m in history) <= self.max_tokens:
+            return history
+        if positions is None or None in positions:
+            positions = list(range(len(history)))
+
+        turns = split_turns(history)
+        older = [message for turn in turns[:-self.recent_turns] for message in turn]
+        recent = [message for turn in turns[-self.recent_turns:] for message in turn]
+
+        summary = await self._summary_for(session_id, older, positions[:len(older)]) if older else ""
+        if not summary:
+            return self._trim_to_budget(recent, self.max_tokens)
+
+        summary_message = HumanMessage(content=f"{SUMMARY_PREFIX}\n{summary}")
+        recent = self._trim_to_budget(recent, self.max_tokens - estimate_tokens(summary_message))
+        return [summary_message] + recent
+
+
+summary_prompt = ChatPromptTemplate.from_template("""You maintain a running summary of a tutoring conversation about data structures and algorithms.
+
+Current summary (may be empty):
+{summary}
+
+New messages to fold in:
+{transcript}
+
+Write the updated summary in at most 150 words. Keep the topics covered, what the student already understands or struggled with, and any open questions:""")
+
+
+def make_llm_summarizer(llm) -> Summarizer:
+    """Builds a summarizer that extends the rolling summary with an LLM call."""
+    chain = summary_prompt | llm
+
+    async def summarize(previous_summary: str, messages: List[BaseMessage]) -> str:
+        transcript = "\n".join(
+            f"{'Student' if isinstance(m, HumanMessage) else 'Tutor'}: {content_text(m.content)}"
+            for m in messages
+            if isinstance(m, (HumanMessage, AIMessage))
+        )
+        response = await chain.ainvoke({"summary": previous_summary or "(empty)", "transcript": transcript})
+        record_llm_usage("summarizer", response)
+        return content_text(response.content).strip()
+
+    return summarize
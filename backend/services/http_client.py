@@ -0,0 +1,150 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Optional
+
+import httpx
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class RetryBudget:
+    """
+    Caps retries to a fraction of recent requests so a struggling upstream
+    doesn't get hit with a retry storm. Every request deposits `ratio` tokens,
+    every retry withdraws one; `min_retries` keeps a small floor for quiet periods.
+    """
+
+    def __init__(self, ratio: float = 0.2, min_retries: int = 10):
+        self.ratio = ratio
+        # Unused allowance carries over, up to roughly 100 requests' worth
+        self.max_tokens = min_retries + 100 * ratio
+        self._tokens = float(min_retries)
+        self._lock = threading.Lock()
+
+    def record_request(self):
+        with self._lock:
+            self._tokens = min(self.max_tokens, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class ResilientHTTPClient:
+    """
+    Shared keep-alive async HTTP client with timeouts, jittered retries and hedging.
+
+    - Connect and read timeouts are separate, so a dead host fails fast.
+    - Timeouts, connection errors, 429 and 5xx are retried with full-jitter
+      exponential backoff, as long as the retry budget allows.
+    - With `hedge_after` set, a second identical request is started if the first
+      hasn't answered in that many seconds; whichever finishes first wins.
+    - With `deadline` set, a call gives up after that many seconds in total,
+      counting every attempt, hedge and backoff, and raises a timeout.
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = 3.0,
+        read_timeout: float = 8.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.2,
+        retry_budget: Optional[RetryBudget] = None,
+        hedge_after: Optional[float] = None,
+        max_connections: int = 20,
+        deadline: Optional[float] = None,
+    ):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.retry_budget = retry_budget or RetryBudget()
+        self.hedge_after = hedge_after or None
+        self.deadline = deadline or None
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests = 0
+        self.retries = 0
+        self.hedges = 0
+        self.deadlines_exceeded = 0
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        # Created on first use so it binds to the running event loop
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    async def _attempt(self, url: str, headers: dict, params: dict) -> httpx.Response:
+        response = await self.client.get(url, headers=headers, params=params)
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            raise httpx.HTTPStatusError(f"Retryable status {response.status_code}", request=response.request, response=response)
+        response.raise_for_status()
+        return response
+
+    async def _hedged_attempt(self, url: str, headers: dict, params: dict) -> httpx.Response:
+        if self.hedge_after is None:
+            return await self._attempt(url, headers, params)
+
+        first = asyncio.ensure_future(self._attempt(url, headers, params))
+        pending = {first}
+        error: Optional[BaseException] = None
+        try:
+            done, pending = await asyncio.wait(pending, timeout=self.hedge_after)
+            if done:
+                return first.result()
+
+            self.hedges += 1
+            pending.add(asyncio.ensure_future(self._attempt(url, headers, params)))
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Also when the caller's deadline cancels this call
+            for task in pending:
+                task.cancel()
+
+    async def get_json(self, url: str, headers: Optional[dict] = None, params: Optional[dict] = None) -> dict:
+        """GETs url and returns the decoded JSON body, retrying transient failures until the deadline."""
+        self.requests += 1
+        self.retry_budget.record_request()
+        deadline_at = time.monotonic() + self.deadline if self.deadline else None
+        attempt = 0
+        while True:
+            try:
+                remaining = None if deadline_at is None else deadline_at - time.monotonic()
+                response = await asyncio.wait_for(self._hedged_attempt(url, headers or {}, params or {}), remaining)
+                return response.json()
+            except asyncio.TimeoutError:
+                self.deadlines_exceeded += 1
+                raise httpx.TimeoutException(f"No response within the {self.deadline}s deadline") from None
+            except (httpx.TimeoutException, httpx.TransportError, httpx.HTTPStatusError) as e:
+                retryable = not isinstance(e, httpx.HTTPStatusError) or e.response.status_code in RETRYABLE_STATUS_CODES
+                if not retryable or attempt >= self.max_retries:
+                    raise
+                backoff = random.uniform(0, self.backoff_base * 2 ** (attempt + 1))
+                # A retry that can't start before the deadline would only fail later
+                if deadline_at is not None and time.monotonic() + backoff >= deadline_at:
+                    self.deadlines_exceeded += 1
+                    raise
+                if not self.retry_budget.try_spend():
+                    raise
+                attempt += 1
+                self.retries += 1
+                await asyncio.sleep(backoff)
+
+    def stats(self) -> dict:
+        return {"requests": self.requests, "retries": self.retries, "hedges": self.hedges, "deadlines_exceeded": self.deadlines_exceeded}
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
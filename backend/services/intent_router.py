@@ -0,0 +1,180 @@
+import math
+import re
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Tuple
+
+from .query_normalizer import TOKEN_PATTERN
+
+SUPERVISOR = "supervisor"
+
+# Intents the router may dispatch itself: tool name and the argument the query goes in
+INTENT_TOOLS = {
+    "diagram": ("generate_diagram", "query"),
+    "web_search": ("web_search", "topic"),
+}
+
+# The supervisor prompt's keyword rules, compiled. A rule alone never routes a
+# diagram/search request: the classifier has to agree (it knows "draw on your
+# knowledge" or "the current node" aren't diagram/search requests)
+DIAGRAM_RULE = re.compile(r"\b(?:draw(?!\s+(?:on|from|conclusions?)\b)|diagram|visuali[sz]e|flow ?chart|illustrate)\b")
+RECENT_RULE = re.compile(r"\b(?:latest|recent(?:ly)?|current(?:ly)?|newest|news|trending|today'?s?|this year|20[2-9]\d|look up|search the web)\b")
+
+# A message made only of these words is a greeting/thanks/goodbye
+GREETING_WORDS = {
+    "hi", "hello", "hey", "hiya", "yo", "good", "morning", "afternoon", "evening", "night",
+    "thanks", "thank", "thx", "ty", "cheers", "many", "you", "so", "much", "very", "a", "lot",
+    "bye", "goodbye", "see", "ok", "okay", "great", "cool", "there", "again", "tutor",
+    "for", "the", "your", "help", "explaining", "how", "are",
+}
+THANKS_WORDS = {"thanks", "thank", "thx", "ty", "cheers"}
+GOODBYE_WORDS = {"bye", "goodbye", "night", "see"}
+
+# Words that point back at the conversation ("draw it", "visualize that"); the
+# supervisor has to resolve those from the history
+BACK_REFERENCES = {"it", "that", "this", "them", "those", "these", "above", "previous", "again", "same"}
+
+CANNED_REPLIES = {
+    "hello": "Hello! I'm your Data Structures and Algorithms tutor. Ask me about a concept, or ask me to draw a diagram of one.",
+    "thanks": "You're welcome! Let me know if you'd like to go deeper or try another topic.",
+    "goodbye": "Goodbye, and happy studying! Come back any time you have a DSA question.",
+}
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+def load_examples(path: Path) -> List[Tuple[str, str]]:
+    """(label, query) pairs from a tab-separated file; # lines are comments."""
+    examples = []
+    for line in Path(path).read_text(encoding="utf-8").splitlines():
+        if not line.strip() or line.startswith("#"):
+            continue
+        label, _, query = line.partition("\t")
+        examples.append((label.strip(), query.strip()))
+    return examples
+
+
+class NaiveBayesClassifier:
+    """Multinomial naive Bayes over word unigrams and bigrams, with add-alpha smoothing."""
+
+    def __init__(self, alpha: float = 1.0):
+        self.alpha = alpha
+        self.labels: List[str] = []
+        self._log_priors: Dict[str, float] = {}
+        self._counts: Dict[str, Counter] = {}
+        self._totals: Dict[str, int] = {}
+        self._vocabulary: set = set()
+
+    @staticmethod
+    def features(text: str) -> List[str]:
+        tokens = tokenize(text)
+        return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+    def fit(self, examples: List[Tuple[str, str]]) -> "NaiveBayesClassifier":
+        counts: Dict[str, Counter] = defaultdict(Counter)
+        documents = Counter()
+        for label, text in examples:
+            documents[label] += 1
+            counts[label].update(self.features(text))
+        self.labels = sorted(documents)
+        self._log_priors = {label: math.log(documents[label] / len(examples)) for label in self.labels}
+        self._counts = dict(counts)
+        self._totals = {label: sum(counts[label].values()) for label in self.labels}
+        self._vocabulary = {feature for counter in counts.values() for feature in counter}
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        features = [feature for feature in self.features(text) if feature in self._vocabulary]
+        vocabulary_size = len(self._vocabulary)
+        scores = {}
+        for label in self.labels:
+            denominator = math.log(self._totals[label] + self.alpha * vocabulary_size)
+            scores[label] = self._log_priors[label] + sum(
+                math.log(self._counts[label][feature] + self.alpha) - denominator for feature in features
+            )
+        # Softmax over the log scores
+        top = max(scores.values())
+        exps = {label: math.exp(score - top) for label, score in scores.items()}
+        total = sum(exps.values())
+        return {label: value / total for label, value in exps.items()}
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        probabilities = self.predict_proba(text)
+        label = max(probabilities, key=probabilities.get)
+        return label, probabilities[label]
+
+
+class RouteDecision(NamedTuple):
+    intent: str
+    confidence: float
+    # "rule", "rule+model" or "model" when routed; why not, otherwise
+    method: str
+
+    @property
+    def routed(self) -> bool:
+        return self.intent != SUPERVISOR
+
+
+class IntentRouter:
+    """
+    Decides, before the supervisor runs, whether a message can skip it.
+
+    Greetings (messages made only of greeting words) that open a conversation
+    get a canned reply; later in a conversation they go to the supervisor.
+    Diagram and web-search requests go straight to their tool when the
+    keyword rule and the classifier agree, or when the classifier alone is
+    at least `min_confidence` sure and no rule contradicts it. Everything
+    else, including multi-part requests and anything that refers back to
+    the conversation, goes to the supervisor as before.
+    """
+
+    def __init__(self, classifier: NaiveBayesClassifier, min_confidence: float = 0.9):
+        self.classifier = classifier
+        self.min_confidence = min_confidence
+
+    @classmethod
+    def from_file(cls, path: Path, min_confidence: float = 0.9) -> "IntentRouter":
+        return cls(NaiveBayesClassifier().fit(load_examples(path)), min_confidence)
+
+    @staticmethod
+    def rule_intents(text: str) -> List[str]:
+        """The intents the keyword rules point to (several for a multi-part request)."""
+        lowered = text.lower()
+        tokens = tokenize(lowered)
+        if tokens and len(tokens) <= 8 and set(tokens) <= GREETING_WORDS:
+            return ["greeting"]
+        return [intent for intent, rule in (("diagram", DIAGRAM_RULE), ("web_search", RECENT_RULE)) if rule.search(lowered)]
+
+    def classify(self, text: str, has_history: bool = False) -> RouteDecision:
+        rules = self.rule_intents(text)
+        if rules == ["greeting"]:
+            # Mid-conversation, "ok" / "great" / "cool" are acknowledgements the
+            # supervisor should answer in context, not a cue for the welcome message
+            if has_history:
+                return RouteDecision(SUPERVISOR, 1.0, "mid_conversation")
+            return RouteDecision("greeting", 1.0, "rule")
+
+        label, confidence = self.classifier.predict(text)
+        if has_history and BACK_REFERENCES & set(tokenize(text)):
+            return RouteDecision(SUPERVISOR, confidence, "refers_back")
+        if len(rules) > 1:
+            # Needs several tools; the supervisor calls them together
+            return RouteDecision(SUPERVISOR, confidence, "multi_intent")
+        if label not in INTENT_TOOLS:
+            return RouteDecision(SUPERVISOR, confidence, "model")
+        if rules == [label]:
+            return RouteDecision(label, confidence, "rule+model")
+        if not rules and confidence >= self.min_confidence:
+            return RouteDecision(label, confidence, "model")
+        return RouteDecision(SUPERVISOR, confidence, "conflict" if rules else "low_confidence")
+
+
+def canned_reply(text: str) -> str:
+    tokens = set(tokenize(text))
+    if tokens & GOODBYE_WORDS:
+        return CANNED_REPLIES["goodbye"]
+    if tokens & THANKS_WORDS:
+        return CANNED_REPLIES["thanks"]
+    return CANNED_REPLIES["hello"]
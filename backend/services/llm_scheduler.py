@@ -0,0 +1,232 @@
+import asyncio
+import contextvars
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Optional
+
+from core.config import (
+    LLM_GEMINI_MAX_CONCURRENCY, LLM_GEMINI_TOKENS_PER_MINUTE,
+    LLM_GROQ_MAX_CONCURRENCY, LLM_GROQ_TOKENS_PER_MINUTE, LLM_QUEUE_MAX_WAIT,
+)
+from core.metrics import LLM_QUEUE_WAIT, LLM_SHED, observe
+
+# Who an LLM call is made for; set once per chat turn so every call the graph
+# makes for it (supervisor, tools) is queued under that user
+current_llm_user: contextvars.ContextVar[str] = contextvars.ContextVar("current_llm_user", default="anonymous")
+
+
+class LLMOverloaded(Exception):
+    """Raised instead of queueing a call that would not be admitted within the provider's max wait."""
+
+    def __init__(self, provider: str, reason: str, retry_after: float):
+        self.provider = provider
+        self.reason = reason
+        self.retry_after = retry_after
+        super().__init__(f"{provider} is busy ({reason}); try again in {retry_after:.0f}s")
+
+
+class _Waiter:
+    __slots__ = ("user", "tokens", "future")
+
+    def __init__(self, user: str, tokens: int, future: asyncio.Future):
+        self.user = user
+        self.tokens = tokens
+        self.future = future
+
+
+class Lease:
+    """An admitted call. Report the provider's response so the token budget is charged what was actually used."""
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+
+    def record(self, message):
+        usage = getattr(message, "usage_metadata", None) or {}
+        if usage.get("total_tokens"):
+            self.tokens = usage["total_tokens"]
+
+
+class ProviderScheduler:
+    """
+    Admission control for one LLM provider.
+
+    - At most `max_concurrency` calls are in flight.
+    - Calls draw their estimated tokens from a bucket that refills at
+      `tokens_per_minute` (0 disables the budget); the estimate is corrected
+      with the provider's reported usage when the call finishes.
+    - Waiting calls are queued per user and admitted round-robin across
+      users, so one user's burst can't starve everyone else.
+    - A call whose expected wait is over `max_wait` is refused right away,
+      and one still queued after `max_wait` is dropped (LLMOverloaded), so a
+      spike fails fast instead of every turn timing out.
+    """
+
+    def __init__(self, provider: str, max_concurrency: int = 8, tokens_per_minute: int = 0, max_wait: float = 10.0):
+        self.provider = provider
+        self.max_concurrency = max(1, max_concurrency)
+        self.tokens_per_minute = tokens_per_minute
+        self.max_wait = max_wait
+        self._tokens = float(tokens_per_minute)
+        self._refilled_at = time.monotonic()
+        # user -> their waiting calls; users are served in insertion order and
+        # moved to the back after each admission (round robin)
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._in_flight = 0
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        # Moving average of how long a call holds its slot, for the expected-wait estimate
+        self._avg_hold: Optional[float] = None
+        self.admitted = 0
+        self.shed = 0
+
+    # --- Token bucket ---
+
+    def _refill(self):
+        if not self.tokens_per_minute:
+            return
+        now = time.monotonic()
+        self._tokens = min(self.tokens_per_minute, self._tokens + (now - self._refilled_at) * self.tokens_per_minute / 60)
+        self._refilled_at = now
+
+    def _token_wait(self, tokens: float) -> float:
+        """Seconds until the bucket holds `tokens` (0 without a budget)."""
+        if not self.tokens_per_minute:
+            return 0.0
+        # A call larger than the whole bucket goes through once the bucket is full
+        deficit = min(tokens, self.tokens_per_minute) - self._tokens
+        return max(0.0, deficit * 60 / self.tokens_per_minute)
+
+    # --- Queue ---
+
+    def queued(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def _expected_wait(self, tokens: int) -> float:
+        self._refill()
+        ahead = [waiter for queue in self._queues.values() for waiter in queue if not waiter.future.done()]
+        token_wait = self._token_wait(sum(waiter.tokens for waiter in ahead) + tokens)
+        slot_wait = 0.0
+        if self._avg_hold is not None:
+            # Calls that have to finish before a slot is free for this one
+            excess = len(ahead) + 1 - (self.max_concurrency - self._in_flight)
+            slot_wait = max(0, excess) / self.max_concurrency * self._avg_hold
+        return max(token_wait, slot_wait)
+
+    def _dispatch(self):
+        """Admits queued calls while slots and tokens allow, one user at a time."""
+        self._wakeup = None
+        self._refill()
+        while self._queues and self._in_flight < self.max_concurrency:
+            user, queue = next(iter(self._queues.items()))
+            while queue and queue[0].future.done():
+                # Timed out or cancelled while queued
+                queue.popleft()
+            if not queue:
+                del self._queues[user]
+                continue
+
+            waiter = queue[0]
+            wait = self._token_wait(waiter.tokens)
+            if wait > 0:
+                self._wakeup = asyncio.get_running_loop().call_later(wait, self._dispatch)
+                return
+
+            queue.popleft()
+            del self._queues[user]
+            if queue:
+                self._queues[user] = queue
+            if self.tokens_per_minute:
+                self._tokens -= waiter.tokens
+            self._in_flight += 1
+            self.admitted += 1
+            waiter.future.set_result(None)
+
+    def _shed(self, reason: str, retry_after: float) -> LLMOverloaded:
+        self.shed += 1
+        LLM_SHED.inc(provider=self.provider, reason=reason)
+        print(f"Shedding {self.provider} call ({reason}), {self._in_flight} in flight, {self.queued()} queued")
+        return LLMOverloaded(self.provider, reason, retry_after)
+
+    async def acquire(self, tokens: int, user: Optional[str] = None) -> Lease:
+        """Waits for a slot and `tokens` of budget; raises LLMOverloaded instead of waiting past max_wait."""
+        user = user or current_llm_user.get()
+        expected = self._expected_wait(tokens)
+        if self.max_wait and expected > self.max_wait:
+            raise self._shed("queue_full", expected)
+
+        started = time.perf_counter()
+        waiter = _Waiter(user, tokens, asyncio.get_running_loop().create_future())
+        self._queues.setdefault(user, deque()).append(waiter)
+        if self._wakeup is None:
+            self._dispatch()
+        try:
+            await asyncio.wait_for(waiter.future, timeout=self.max_wait or None)
+        except asyncio.TimeoutError:
+            # The slot may have been granted in the same tick the timeout fired
+            self._give_back(waiter)
+            raise self._shed("timeout", self._expected_wait(tokens)) from None
+        except BaseException:
+            # Cancelled (e.g. the client went away) right as the slot was granted
+            self._give_back(waiter)
+            raise
+        finally:
+            observe(LLM_QUEUE_WAIT, f"llm_queue:{self.provider}", time.perf_counter() - started, provider=self.provider)
+        return Lease(tokens)
+
+    def _give_back(self, waiter: _Waiter):
+        """Returns the slot and tokens of a granted call that is not going to be made."""
+        if waiter.future.done() and not waiter.future.cancelled():
+            self._release(Lease(0), waiter.tokens, 0.0)
+
+    def _release(self, lease: Lease, estimated: int, held: float):
+        self._in_flight -= 1
+        if self.tokens_per_minute:
+            # Charge (or refund) the difference between the estimate and the reported usage
+            self._tokens -= lease.tokens - estimated
+        if held:
+            self._avg_hold = held if self._avg_hold is None else 0.8 * self._avg_hold + 0.2 * held
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._dispatch()
+
+    @asynccontextmanager
+    async def slot(self, tokens: int, user: Optional[str] = None):
+        """`async with scheduler.slot(estimate) as lease:` around one LLM call."""
+        lease = await self.acquire(tokens, user)
+        started = time.perf_counter()
+        try:
+            yield lease
+        finally:
+            self._release(lease, tokens, time.perf_counter() - started)
+
+    def stats(self) -> dict:
+        self._refill()
+        return {
+            "in_flight": self._in_flight,
+            "queued": self.queued(),
+            "users_waiting": len(self._queues),
+            "tokens_available": round(self._tokens) if self.tokens_per_minute else None,
+            "avg_call_seconds": round(self._avg_hold, 3) if self._avg_hold is not None else None,
+            "admitted": self.admitted,
+            "shed": self.shed,
+        }
+
+
+def estimate_call_tokens(text: str, output_tokens: int) -> int:
+    """Rough budget for one call: ~4 characters per prompt token plus the expected output."""
+    return len(text) // 4 + output_tokens
+
+
+# One scheduler per provider, shared by every chain that calls it
+gemini_scheduler = ProviderScheduler(
+    "gemini",
+    max_concurrency=LLM_GEMINI_MAX_CONCURRENCY,
+    tokens_per_minute=LLM_GEMINI_TOKENS_PER_MINUTE,
+    max_wait=LLM_QUEUE_MAX_WAIT,
+)
+groq_scheduler = ProviderScheduler(
+    "groq",
+    max_concurrency=LLM_GROQ_MAX_CONCURRENCY,
+    tokens_per_minute=LLM_GROQ_TOKENS_PER_MINUTE,
+    max_wait=LLM_QUEUE_MAX_WAIT,
+)
@@ -0,0 +1,48 @@
+import base64
+import hashlib
+import json
+from datetime import datetime
+from typing import Optional, Tuple
+from uuid import UUID
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def encode_cursor(row: dict) -> str:
+    """Opaque keyset cursor pointing just past `row` in (created_at, id) order."""
+    payload = json.dumps([row['created_at'], str(row['id'])], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Returns (created_at, id) from a cursor made by encode_cursor."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        # Both go into a PostgREST filter, so only a real timestamp and UUID get through
+        datetime.fromisoformat(created_at)
+        return created_at, str(UUID(row_id))
+    except Exception:
+        raise InvalidCursor(f"Invalid cursor: {cursor!r}")
+
+
+def keyset_before(cursor: Tuple[str, str]) -> str:
+    """PostgREST `or` filter selecting rows that sort before the cursor in descending (created_at, id)."""
+    created_at, row_id = cursor
+    # Timestamps contain ':' and '+', so they are quoted for PostgREST
+    return f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt."{row_id}")'
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.md5(json.dumps(parts, default=str, separators=(",", ":")).encode()).hexdigest()
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """True when an If-None-Match header lists this ETag (weak comparison) or is '*'."""
+    if not if_none_match:
+        return False
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    return "*" in candidates or etag in [tag[2:] if tag.startswith("W/") else tag for tag in candidates]
@@ -0,0 +1,103 @@
+import re
+from typing import List
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9+#]+")
+
+# Filler and request phrasing that doesn't change what is being asked about
+STOPWORDS = {
+    "a", "an", "the", "of", "for", "to", "in", "on", "with", "and", "or", "how", "does", "do",
+    "is", "are", "what", "me", "my", "i", "you", "can", "could", "would", "please", "pls",
+    "show", "draw", "diagram", "flowchart", "visualize", "visualise", "visualization", "visualisation",
+    "visualizing", "illustrate", "picture", "create", "generate", "make", "give", "explain", "describe",
+    "using", "about", "some", "this", "that", "it", "work", "works",
+}
+
+# DSA abbreviations and spelling variants -> canonical words. Only words that
+# mean one thing in any DSA question: "map" (the ADT, a tree map, the map
+# function) or "bt" (backtracking?) would merge questions that differ.
+SYNONYMS = {
+    "bst": "binary search tree",
+    "ll": "linked list",
+    "sll": "singly linked list",
+    "dll": "doubly linked list",
+    "linkedlist": "linked list",
+    "bfs": "breadth first search",
+    "dfs": "depth first search",
+    "dp": "dynamic programming",
+    "pq": "priority queue",
+    "mst": "minimum spanning tree",
+    "lca": "lowest common ancestor",
+    "lis": "longest increasing subsequence",
+    "lcs": "longest common subsequence",
+    "hashmap": "hash table",
+    "hashtable": "hash table",
+    "minheap": "min heap",
+    "maxheap": "max heap",
+    "dijkstras": "dijkstra",
+    "kruskals": "kruskal",
+    "prims": "prim",
+    "algo": "algorithm",
+    "algos": "algorithm",
+    "insert": "insertion",
+    "delete": "deletion",
+    "remove": "deletion",
+    "removal": "deletion",
+    "traverse": "traversal",
+    "reverse": "reversal",
+    "reversing": "reversal",
+    "sorting": "sort",
+    "searching": "search",
+}
+
+
+def _stem(token: str) -> str:
+    """Very light plural folding: trees -> tree, queues -> queue (not 'bfs', 'class')."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith("ss") and not token.isdigit():
+        return token[:-1]
+    return token
+
+
+def tokenize(query: str) -> List[str]:
+    """Lowercases, splits, expands synonyms, folds plurals and drops stopwords."""
+    tokens = []
+    for raw in TOKEN_PATTERN.findall(query.lower().replace("'s", "s")):
+        expanded = SYNONYMS.get(raw)
+        if expanded is None:
+            expanded = SYNONYMS.get(_stem(raw), _stem(raw))
+        for token in expanded.split():
+            if token not in STOPWORDS:
+                tokens.append(token)
+    return tokens
+
+
+def canonicalize_query(query: str) -> str:
+    """
+    Canonical form of a query for cache keys: its content words in order,
+    repeats dropped.
+
+    "Draw a BST diagram" and "visualize binary search trees" both become
+    "binary search tree"; "convert a tree to a list" and "convert a list to
+    a tree" stay apart.
+    """
+    tokens = list(dict.fromkeys(tokenize(query)))
+    # Queries made only of filler ("show me") fall back to their plain form
+    return " ".join(tokens) if tokens else query.lower().strip()
+
+
+# Politeness and articles; unlike STOPWORDS, the words saying what is asked ("what", "draw") stay
+FILLER_WORDS = {"a", "an", "the", "please", "pls", "can", "could", "would", "you", "me", "i", "hi", "hey", "hello"}
+
+
+def normalize_question(query: str) -> str:
+    """
+    Light normal form of a whole question, in word order: synonyms expanded,
+    plurals folded, filler dropped. "Can you explain BSTs?" and "explain
+    binary search tree" match, "what is a heap" and "draw a heap" don't.
+    """
+    tokens = []
+    for raw in TOKEN_PATTERN.findall(query.lower().replace("'s", "s")):
+        expanded = SYNONYMS.get(raw)
+        if expanded is None:
+            expanded = SYNONYMS.get(_stem(raw), _stem(raw))
+        tokens += [token for token in expanded.split() if token not in FILLER_WORDS]
+    return " ".join(tokens)
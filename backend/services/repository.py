@@ -0,0 +1,290 @@
+import asyncio
+import re
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+from supabase import Client
+from postgrest.types import CountMethod, ReturnMethod
+from core.db import run_db
+from core.metrics import timed_db_call
+from .pagination import keyset_before
+
+# Values per `in` filter (session ids, cache keys); keeps the PostgREST URL well under proxy limits
+IN_FILTER_CHUNK_SIZE = 100
+
+# A knowledge_cache hit refreshes the row's last_hit_at at most this often (seconds),
+# so popular keys don't turn every read into a write
+HIT_TOUCH_INTERVAL = 3600
+
+
+def utc_timestamp(seconds: Optional[float] = None) -> str:
+    """ISO 8601 UTC timestamp (now by default) in a form PostgREST filters take as-is."""
+    moment = datetime.fromtimestamp(time.time() if seconds is None else seconds, timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%fZ")
+
+
+# Fractional seconds, which PostgREST sends with as many digits as they have (".5", ".12345")
+FRACTION_PATTERN = re.compile(r"\.(\d+)")
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[float]:
+    """Epoch seconds for a timestamptz value read back from PostgREST (naive values are UTC)."""
+    if not value:
+        return None
+    # Before Python 3.11, fromisoformat takes neither "Z" nor fractions other than 3 or 6 digits
+    value = FRACTION_PATTERN.sub(lambda match: "." + match.group(1)[:6].ljust(6, "0"), value.replace("Z", "+00:00"), count=1)
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+class ChatRepository:
+    """Non-blocking access to the chat_sessions and chat_messages tables."""
+
+    def __init__(self, client: Client):
+        self.client = client
+
+    @timed_db_call
+    async def create_session(self, user_id: str, title: str) -> Optional[dict]:
+        def _insert():
+            return self.client.table('chat_sessions').insert({
+                "user_id": user_id,
+                "title": title
+            }).execute()
+        response = await run_db(_insert)
+        return response.data[0] if response.data else None
+
+    @timed_db_call
+    async def latest_session(self, user_id: str) -> Optional[dict]:
+        def _select():
+            return self.client.table('chat_sessions').select("*").eq('user_id', user_id).order('created_at', desc=True).limit(1).execute()
+        response = await run_db(_select)
+        return response.data[0] if response.data else None
+
+    @timed_db_call
+    async def list_sessions(self, user_id: str, limit: Optional[int] = None, before: Optional[Tuple[str, str]] = None) -> List[dict]:
+        """Sessions newest first; with `limit`, one keyset page starting after the `before` cursor."""
+        def _select():
+            query = self.client.table('chat_sessions').select('*').eq('user_id', user_id)
+            if before is not None:
+                query = query.or_(keyset_before(before))
+            query = query.order('created_at', desc=True).order('id', desc=True)
+            if limit is not None:
+                query = query.limit(limit)
+            return query.execute()
+        response = await run_db(_select)
+        return response.data or []
+
+    @timed_db_call
+    async def session_list_version(self, user_id: str) -> list:
+        """
+        Cheap change marker for a user's session list: session count, newest
+        session and newest message. Titles only change with a session's first
+        message, so the newest message also covers renamed sessions.
+        """
+        def _sessions():
+            return self.client.table('chat_sessions').select('created_at, id', count='exact').eq('user_id', user_id).order('created_at', desc=True).order('id', desc=True).limit(1).execute()
+        def _messages():
+            return self.client.table('chat_messages').select('created_at').eq('user_id', user_id).order('created_at', desc=True).limit(1).execute()
+        sessions, messages = await asyncio.gather(run_db(_sessions), run_db(_messages))
+        return [sessions.count, sessions.data[0] if sessions.data else None, messages.data[0] if messages.data else None]
+
+    @timed_db_call
+    async def session_exists(self, session_id: str, user_id: str) -> bool:
+        def _select():
+            return self.client.table('chat_sessions').select('id').eq('id', session_id).eq('user_id', user_id).execute()
+        response = await run_db(_select)
+        return bool(response.data)
+
+    @timed_db_call
+    async def delete_sessions(self, user_id: str, session_ids: List[str]) -> dict:
+        """
+        Deletes the given sessions that belong to user_id, messages first.
+
+        Ownership is part of the delete filters, so there is no separate
+        lookup: each table gets one `in` delete per chunk of ids. Returns
+        the ids actually deleted and how many messages went with them.
+        """
+        def _delete():
+            deleted_ids: List[str] = []
+            deleted_messages = 0
+            for start in range(0, len(session_ids), IN_FILTER_CHUNK_SIZE):
+                chunk = session_ids[start:start + IN_FILTER_CHUNK_SIZE]
+                messages = self.client.table('chat_messages').delete(count=CountMethod.exact, returning=ReturnMethod.minimal).eq('user_id', user_id).in_('session_id', chunk).execute()
+                sessions = self.client.table('chat_sessions').delete().eq('user_id', user_id).in_('id', chunk).execute()
+                deleted_messages += messages.count or 0
+                deleted_ids.extend(str(row['id']) for row in sessions.data or [])
+            return {"deleted_session_ids": deleted_ids, "deleted_messages": deleted_messages}
+        return await run_db(_delete)
+
+    @timed_db_call
+    async def list_messages(self, session_id: str, limit: Optional[int] = None, before: Optional[Tuple[str, str]] = None, with_thinking: bool = True) -> List[dict]:
+        """
+        Messages oldest first. With `limit`, only the newest page (or the page
+        older than the `before` cursor) is fetched, still returned oldest first.
+        Without `with_thinking`, thinking_process isn't fetched at all.
+        """
+        columns = 'id, created_at, role, content, thinking_process' if with_thinking else 'id, created_at, role, content'
+        def _select():
+            query = self.client.table('chat_messages').select(columns).eq('session_id', session_id)
+            if limit is None:
+                return query.order('created_at', desc=False).order('id', desc=False).execute()
+            if before is not None:
+                query = query.or_(keyset_before(before))
+            return query.order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
+        response = await run_db(_select)
+        rows = response.data or []
+        return rows if limit is None else list(reversed(rows))
+
+    @timed_db_call
+    async def get_thinking_process(self, session_id: str, message_id: str) -> Optional[dict]:
+        """One message's thinking_process (in a dict, so a message without steps is told apart from a missing one)."""
+        def _select():
+            return self.client.table('chat_messages').select('thinking_process').eq('session_id', session_id).eq('id', message_id).limit(1).execute()
+        response = await run_db(_select)
+        return response.data[0] if response.data else None
+
+    @timed_db_call
+    async def message_list_version(self, session_id: str) -> list:
+        """Cheap change marker for a session's messages (they are only ever appended or deleted)."""
+        def _select():
+            return self.client.table('chat_messages').select('created_at, id', count='exact').eq('session_id', session_id).order('created_at', desc=True).order('id', desc=True).limit(1).execute()
+        response = await run_db(_select)
+        return [response.count, response.data[0] if response.data else None]
+
+    @timed_db_call
+    async def list_recent_messages(self, session_id: str, limit: int) -> List[dict]:
+        """The newest `limit` messages (role, content, created_at), oldest first."""
+        def _select():
+            return self.client.table('chat_messages').select('role, content, created_at').eq('session_id', session_id).order('created_at', desc=True).limit(limit).execute()
+        response = await run_db(_select)
+        return list(reversed(response.data or []))
+
+
+class KnowledgeRepository:
+    """
+    Access to the knowledge_cache and concepts tables used by the tools.
+
+    Tools run synchronously on LangGraph's tool threads, so the plain methods
+    block; async callers should use the `a`-prefixed variants instead.
+    """
+
+    def __init__(self, client: Client):
+        self.client = client
+
+    @timed_db_call
+    def get_cached_answer(self, cache_key: str, max_age: Optional[int] = None) -> Optional[str]:
+        """The newest answer for cache_key, if it was written less than max_age seconds ago (any age without one)."""
+        query = self.client.table('knowledge_cache').select('answer, last_hit_at').eq('cache_key', cache_key)
+        if max_age:
+            query = query.gt('updated_at', utc_timestamp(time.time() - max_age))
+        response = query.order('updated_at', desc=True).limit(1).execute()
+        if not response.data:
+            return None
+        row = response.data[0]
+        last_hit = parse_timestamp(row.get('last_hit_at'))
+        if last_hit is None or last_hit < time.time() - HIT_TOUCH_INTERVAL:
+            # Recency for the maintenance job's least-recently-hit eviction
+            try:
+                self.client.table('knowledge_cache').update({"last_hit_at": utc_timestamp()}).eq('cache_key', cache_key).execute()
+            except Exception as e:
+                print(f"Cache hit update error: {e}")
+        return row['answer']
+
+    @timed_db_call
+    def save_cached_answer(self, cache_key: str, question: str, answer: str, source: str):
+        """Writes (or rewrites) the one row for cache_key; concurrent misses on a key no longer add duplicates."""
+        now = utc_timestamp()
+        self.client.table('knowledge_cache').upsert({
+            "cache_key": cache_key,
+            "question": question,
+            "answer": answer,
+            "source": source,
+            "updated_at": now,
+            "last_hit_at": now,
+        }, on_conflict="cache_key", returning=ReturnMethod.minimal).execute()
+
+    @timed_db_call
+    def existing_cache_keys(self, cache_keys: List[str], max_age: Optional[int] = None) -> set:
+        """The subset of cache_keys that already have a row (written less than max_age seconds ago, with one)."""
+        found = set()
+        for start in range(0, len(cache_keys), IN_FILTER_CHUNK_SIZE):
+            chunk = cache_keys[start:start + IN_FILTER_CHUNK_SIZE]
+            query = self.client.table('knowledge_cache').select('cache_key').in_('cache_key', chunk)
+            if max_age:
+                query = query.gt('updated_at', utc_timestamp(time.time() - max_age))
+            response = query.execute()
+            found.update(row['cache_key'] for row in response.data or [])
+        return found
+
+    @timed_db_call
+    def list_cache_rows(self, page_size: int = 1000) -> List[dict]:
+        """Every row's key, source and timestamps (not the answers), fetched page by page."""
+        rows: List[dict] = []
+        while True:
+            response = self.client.table('knowledge_cache').select('cache_key, source, updated_at, last_hit_at').order('cache_key').order('updated_at').range(len(rows), len(rows) + page_size - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    @timed_db_call
+    def delete_expired_cache_rows(self, source: str, max_age: int) -> int:
+        """Deletes the source's rows written more than max_age seconds ago; returns how many."""
+        response = self.client.table('knowledge_cache').delete(count=CountMethod.exact, returning=ReturnMethod.minimal).eq('source', source).lt('updated_at', utc_timestamp(time.time() - max_age)).execute()
+        return response.count or 0
+
+    @timed_db_call
+    def delete_older_duplicates(self, cache_key: str, newest_updated_at: str) -> int:
+        """Deletes the rows for cache_key older than its newest one; returns how many."""
+        response = self.client.table('knowledge_cache').delete(count=CountMethod.exact, returning=ReturnMethod.minimal).eq('cache_key', cache_key).lt('updated_at', utc_timestamp(parse_timestamp(newest_updated_at))).execute()
+        return response.count or 0
+
+    @timed_db_call
+    def delete_cache_keys(self, cache_keys: List[str]) -> int:
+        deleted = 0
+        for start in range(0, len(cache_keys), IN_FILTER_CHUNK_SIZE):
+            chunk = cache_keys[start:start + IN_FILTER_CHUNK_SIZE]
+            response = self.client.table('knowledge_cache').delete(count=CountMethod.exact, returning=ReturnMethod.minimal).in_('cache_key', chunk).execute()
+            deleted += response.count or 0
+        return deleted
+
+    @timed_db_call
+    def cache_table_size(self) -> Optional[Dict[str, int]]:
+        """On-disk bytes of the table and its indexes (the knowledge_cache_size() SQL function), or None without it."""
+        try:
+            response = self.client.rpc('knowledge_cache_size').execute()
+        except Exception as e:
+            print(f"Table size unavailable: {e}")
+            return None
+        rows = response.data or []
+        return rows[0] if rows else None
+
+    @timed_db_call
+    def find_concept_explanation(self, concept: str) -> Optional[str]:
+        response = self.client.table('concepts').select('explanation').ilike('title', f'%{concept}%').execute()
+        return response.data[0]['explanation'] if response.data else None
+
+    @timed_db_call
+    def list_concepts(self, updated_after: Optional[str] = None, page_size: int = 1000) -> List[dict]:
+        """All concepts (or those updated after a timestamp), fetched page by page."""
+        rows: List[dict] = []
+        while True:
+            query = self.client.table('concepts').select('id, title, explanation, updated_at')
+            if updated_after is not None:
+                query = query.gt('updated_at', updated_after)
+            response = query.order('updated_at').order('id').range(len(rows), len(rows) + page_size - 1).execute()
+            page = response.data or []
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+
+    async def aget_cached_answer(self, cache_key: str, max_age: Optional[int] = None) -> Optional[str]:
+        return await run_db(self.get_cached_answer, cache_key, max_age)
+
+    async def asave_cached_answer(self, cache_key: str, question: str, answer: str, source: str):
+        await run_db(self.save_cached_answer, cache_key, question, answer, source)
+
+    async def afind_concept_explanation(self, concept: str) -> Optional[str]:
+        return await run_db(self.find_concept_explanation, concept)
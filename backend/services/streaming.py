@@ -0,0 +1,151 @@
+import re
+from typing import List, Tuple
+from langchain_core.messages import AIMessage
+
+THINKING_OPEN = "<thinking>"
+THINKING_CLOSE = "</thinking>"
+
+THINKING_BLOCK_PATTERN = re.compile(r"<thinking>(.*?)</thinking>", re.DOTALL)
+
+
+def content_text(content) -> str:
+    """Flattens message content (plain string or a list of content parts) to text."""
+    if isinstance(content, str):
+        return content
+    if isinstance(content, list):
+        parts = []
+        for part in content:
+            if isinstance(part, str):
+                parts.append(part)
+            elif isinstance(part, dict) and part.get("type") == "text":
+                parts.append(part.get("text", ""))
+        return "".join(parts)
+    return ""
+
+
+def _partial_tag_suffix(text: str, tag: str) -> int:
+    """Length of the longest suffix of text that could be the start of tag."""
+    for size in range(min(len(tag) - 1, len(text)), 0, -1):
+        if tag.startswith(text[-size:]):
+            return size
+    return 0
+
+
+class ThinkingStreamParser:
+    """
+    Splits a token stream into thinking steps and answer text as it arrives.
+
+    `feed` takes the next chunk of model output and returns a list of
+    ("thinking", step) and ("answer", delta) events. Thinking steps are emitted
+    one complete line at a time; answer text is emitted as soon as we know it
+    can't be the start of a <thinking> tag. Call `flush` once the stream ends.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._in_thinking = False
+        self._answer_started = False
+        self.answer = ""
+
+    def _thinking_events(self, text: str) -> List[Tuple[str, str]]:
+        return [("thinking", line.strip()) for line in text.split("\n") if line.strip()]
+
+    def _answer_events(self, text: str) -> List[Tuple[str, str]]:
+        if not text:
+            return []
+        # Drop the whitespace between </thinking> and the answer itself
+        if not self._answer_started:
+            text = text.lstrip()
+            if not text:
+                return []
+            self._answer_started = True
+        self.answer += text
+        return [("answer", text)]
+
+    def feed(self, chunk: str) -> List[Tuple[str, str]]:
+        events = []
+        self._buffer += chunk
+        while self._buffer:
+            if self._in_thinking:
+                end = self._buffer.find(THINKING_CLOSE)
+                if end >= 0:
+                    events += self._thinking_events(self._buffer[:end])
+                    self._buffer = self._buffer[end + len(THINKING_CLOSE):]
+                    self._in_thinking = False
+                    continue
+                # Only complete lines are steps; keep the unfinished one buffered
+                newline = self._buffer.rfind("\n")
+                if newline >= 0:
+                    events += self._thinking_events(self._buffer[:newline])
+                    self._buffer = self._buffer[newline + 1:]
+                break
+            start = self._buffer.find(THINKING_OPEN)
+            if start >= 0:
+                events += self._answer_events(self._buffer[:start])
+                self._buffer = self._buffer[start + len(THINKING_OPEN):]
+                self._in_thinking = True
+                continue
+            keep = _partial_tag_suffix(self._buffer, THINKING_OPEN)
+            ready = self._buffer[:len(self._buffer) - keep]
+            self._buffer = self._buffer[len(ready):]
+            events += self._answer_events(ready)
+            break
+        return events
+
+    def flush(self) -> List[Tuple[str, str]]:
+        """Emits whatever is still buffered once the stream has ended."""
+        remaining, self._buffer = self._buffer, ""
+        if self._in_thinking:
+            return self._thinking_events(remaining)
+        return self._answer_events(remaining)
+
+
+class MessageEventDiffer:
+    """
+    Turns full-state graph snapshots (stream_mode="values") into only the new events.
+
+    Every snapshot carries the whole message list, so instead of re-parsing the
+    last message each time we remember how far into the list we've already
+    looked (and which message ids we've seen) and only parse what's new.
+    `diff` returns ("thinking", step), ("tool", name) and ("answer", text) events.
+    """
+
+    def __init__(self, history_length: int = 0):
+        # The first snapshot echoes the input history back; never re-parse it
+        self._offset = history_length
+        self._seen_ids = set()
+
+    def _message_events(self, message: AIMessage) -> List[Tuple[str, str]]:
+        events = []
+        text = content_text(message.content)
+        answer = text
+        if THINKING_OPEN in text:
+            match = THINKING_BLOCK_PATTERN.search(text)
+            if match:
+                events += [("thinking", step.strip()) for step in match.group(1).split("\n") if step.strip()]
+                # Cut the block out by position; only rescan if another block follows
+                rest = text[match.end():]
+                if THINKING_OPEN in rest:
+                    rest = THINKING_BLOCK_PATTERN.sub("", rest)
+                answer = text[:match.start()] + rest
+
+        for tool_call in message.tool_calls:
+            events.append(("tool", tool_call["name"]))
+
+        answer = answer.strip()
+        if answer and not message.tool_calls:
+            events.append(("answer", answer))
+        return events
+
+    def diff(self, messages: list) -> List[Tuple[str, str]]:
+        events = []
+        new_messages = messages[self._offset:]
+        self._offset = len(messages)
+        for message in new_messages:
+            if message.id is not None:
+                if message.id in self._seen_ids:
+                    continue
+                self._seen_ids.add(message.id)
+            if isinstance(message, AIMessage):
+                events += self._message_events(message)
+        return events
@@ -1,21 +1,72 @@
-import requests
-from langchain.tools import tool
+import asyncio
+import httpx
+from langchain_core.tools import StructuredTool, tool
 from langchain_core.prompts import ChatPromptTemplate
-from langchain_groq import ChatGroq
-from supabase import create_client, Client
-from core.config import SUPABASE_URL, SUPABASE_KEY, BRAVE_API_KEY
-from typing import Optional
-import json
+from supabase import Client
+from core import config
+from core.config import (
+    BRAVE_SEARCH_URL,
+    WEB_SEARCH_CONNECT_TIMEOUT, WEB_SEARCH_READ_TIMEOUT, WEB_SEARCH_MAX_RETRIES,
+    WEB_SEARCH_RETRY_BUDGET, WEB_SEARCH_HEDGE_AFTER, WEB_SEARCH_DEADLINE,
+    KNOWLEDGE_CACHE_MAX_SIZE, KNOWLEDGE_CACHE_TTL_WEB_SEARCH, KNOWLEDGE_CACHE_TTL_DIAGRAM,
+    KNOWLEDGE_CACHE_ROW_TTL_WEB_SEARCH, KNOWLEDGE_CACHE_ROW_TTL_DIAGRAM, TURN_CACHE_TTL,
+    CONCEPT_INDEX_REFRESH_INTERVAL,
+    CONCEPT_INDEX_FULL_RELOAD_INTERVAL, CONCEPT_INDEX_MIN_SCORE, CONCEPT_INDEX_MAX_POSTING,
+)
+from core.db import run_db
+from core.lazy import LazyProxy, lazy_singleton
+from core.metrics import TOOL_DURATION, instrumented, record_llm_usage
+from .repository import KnowledgeRepository
+from .cache import KnowledgeCache
+from .query_normalizer import canonicalize_query
+from .http_client import ResilientHTTPClient, RetryBudget
+from .concept_index import ConceptIndex
+from .llm_scheduler import LLMOverloaded, estimate_call_tokens, groq_scheduler
+from .turn_cache import SOURCE as TURN_ANSWER_SOURCE
+from typing import NamedTuple, Optional
 import hashlib
+import time
 
-# Create Supabase client for tools
-tools_supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+@lazy_singleton
+def get_tools_supabase() -> Client:
+    """Supabase client for tools, created on first use."""
+    from supabase import create_client
+    return create_client(config.SUPABASE_URL, config.SUPABASE_KEY)
 
-# Initialize Groq for diagram explanations
-try:
-    groq_llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0)
-    
-    diagram_prompt_template = """You are an expert in Mermaid.js syntax. Convert the user's request into valid Mermaid.js code.
+knowledge_repo = KnowledgeRepository(LazyProxy(get_tools_supabase))
+
+# How long knowledge_cache rows are served, per source (0 = no expiry)
+KNOWLEDGE_CACHE_ROW_TTLS = {
+    "web_search": KNOWLEDGE_CACHE_ROW_TTL_WEB_SEARCH,
+    "diagram_generation": KNOWLEDGE_CACHE_ROW_TTL_DIAGRAM,
+    TURN_ANSWER_SOURCE: TURN_CACHE_TTL,
+}
+
+# In-process tier in front of the knowledge_cache table
+knowledge_cache = KnowledgeCache(
+    knowledge_repo,
+    max_size=KNOWLEDGE_CACHE_MAX_SIZE,
+    ttls={
+        "web_search": KNOWLEDGE_CACHE_TTL_WEB_SEARCH,
+        "diagram_generation": KNOWLEDGE_CACHE_TTL_DIAGRAM,
+    },
+    row_ttls=KNOWLEDGE_CACHE_ROW_TTLS,
+)
+
+# Keep-alive HTTP client for Brave: retries with a budget and can hedge slow requests
+brave_client = ResilientHTTPClient(
+    connect_timeout=WEB_SEARCH_CONNECT_TIMEOUT,
+    read_timeout=WEB_SEARCH_READ_TIMEOUT,
+    max_retries=WEB_SEARCH_MAX_RETRIES,
+    retry_budget=RetryBudget(ratio=WEB_SEARCH_RETRY_BUDGET),
+    hedge_after=WEB_SEARCH_HEDGE_AFTER,
+    deadline=WEB_SEARCH_DEADLINE,
+)
+
+# Concepts table mirrored in memory for ranked fuzzy lookups (filled at startup)
+concept_index = ConceptIndex(threshold=CONCEPT_INDEX_MIN_SCORE, max_posting=CONCEPT_INDEX_MAX_POSTING)
+
+diagram_prompt_template = """You are an expert in Mermaid.js syntax. Convert the user's request into valid Mermaid.js code.
 - For flowcharts: use graph TD
 - For data structures (trees, lists): use graph TD  
 - For ER diagrams: use erDiagram
@@ -25,149 +76,190 @@ Do NOT include explanations or markdown backticks. Only output the Mermaid code.
 User request: "{query}"
 
 Mermaid.js code:"""
-    
-    explanation_prompt_template = """You are a data structures and algorithms expert. Provide a clear, concise explanation of this diagram.
+
+# Explains from the request alone, so it can run at the same time as the
+# Mermaid generation instead of after it
+request_explanation_prompt_template = """You are a data structures and algorithms expert. A diagram is being drawn for this request.
 
 Diagram request: "{query}"
-Mermaid code:
-{mermaid_code}
 
 Provide a brief explanation (2-3 sentences) of what this diagram represents:"""
-    
-    diagram_prompt = ChatPromptTemplate.from_template(diagram_prompt_template)
-    explanation_prompt = ChatPromptTemplate.from_template(explanation_prompt_template)
-    
-    diagram_chain = diagram_prompt | groq_llm
-    explanation_chain = explanation_prompt | groq_llm
-    
-except Exception as e:
-    print(f"Warning: Could not initialize Groq: {e}")
-    diagram_chain = None
-    explanation_chain = None
 
-def generate_cache_key(query: str) -> str:
-    """Generate a consistent cache key from query."""
-    return hashlib.md5(query.lower().strip().encode()).hexdigest()
+diagram_prompt = ChatPromptTemplate.from_template(diagram_prompt_template)
+request_explanation_prompt = ChatPromptTemplate.from_template(request_explanation_prompt_template)
 
-@tool
-def web_search(topic: str) -> str:
+# Expected completion sizes, for the Groq token budget (corrected with actual usage)
+DIAGRAM_OUTPUT_TOKENS = 400
+EXPLANATION_OUTPUT_TOKENS = 150
+
+class DiagramChains(NamedTuple):
+    diagram: object
+    request_explanation: object
+
+@lazy_singleton
+def get_diagram_chains() -> Optional[DiagramChains]:
+    """Groq chains for diagrams and their explanations (None if Groq can't be initialized)."""
+    try:
+        from langchain_groq import ChatGroq
+        groq_llm = ChatGroq(model_name="llama-3.3-70b-versatile", temperature=0, api_key=config.GROQ_API_KEY)
+        return DiagramChains(
+            diagram=diagram_prompt | groq_llm,
+            request_explanation=request_explanation_prompt | groq_llm,
+        )
+    except Exception as e:
+        print(f"Warning: Could not initialize Groq: {e}")
+        return None
+
+def generate_cache_key(query: str, namespace: str = "") -> str:
+    """Generate a consistent cache key from the canonical form of a query."""
+    return hashlib.md5(f"{namespace}:{canonicalize_query(query)}".encode()).hexdigest()
+
+def refresh_concept_index(full: bool = False):
+    """Loads the concepts table into the index, or only the rows updated since the last load."""
+    try:
+        if full or not concept_index.loaded:
+            count = concept_index.replace_all(knowledge_repo.list_concepts())
+            print(f"✓ Indexed {count} concepts")
+        else:
+            rows = knowledge_repo.list_concepts(updated_after=concept_index.last_updated_at)
+            if rows:
+                concept_index.upsert(rows)
+                print(f"✓ Refreshed {len(rows)} concepts")
+    except Exception as e:
+        print(f"Could not refresh concept index: {e}")
+
+async def run_concept_index_refresher():
+    """Background task: initial load, then periodic incremental refreshes and occasional full reloads."""
+    await run_db(refresh_concept_index, True)
+    last_full_reload = time.monotonic()
+    while True:
+        await asyncio.sleep(CONCEPT_INDEX_REFRESH_INTERVAL)
+        full = time.monotonic() - last_full_reload >= CONCEPT_INDEX_FULL_RELOAD_INTERVAL
+        if full:
+            last_full_reload = time.monotonic()
+        await run_db(refresh_concept_index, full)
+
+def format_search_results(results: list) -> str:
+    snippets = []
+    for res in results:
+        title = res.get('title', 'No title')
+        description = res.get('description', 'No description')
+        snippets.append(f"**{title}**\n{description}")
+    return "\n\n".join(snippets)
+
+@instrumented(TOOL_DURATION, "tool:web_search", tool="web_search")
+async def _aweb_search(topic: str) -> str:
     """Performs web search and caches the result."""
     print(f"---TOOL: Web search for '{topic}'---")
     
-    if not BRAVE_API_KEY:
+    if not config.is_configured("BRAVE_API_KEY"):
         return "Web search unavailable - API key not configured."
     
-    # Check cache first
-    cache_key = generate_cache_key(f"web_search:{topic}")
-    try:
-        cached = tools_supabase.table('knowledge_cache').select('answer').eq('cache_key', cache_key).execute()
-        if cached.data and len(cached.data) > 0:
-            print(f"✓ Cache hit for web search: {topic}")
-            return cached.data[0]['answer']
-    except Exception as e:
-        print(f"Cache check error: {e}")
-    
-    # Perform web search
-    url = "https://api.search.brave.com/res/v1/web/search"
-    headers = {"X-Subscription-Token": BRAVE_API_KEY, "Accept": "application/json"}
-    params = {"q": topic, "count": 3}
-    
-    try:
-        response = requests.get(url, headers=headers, params=params, timeout=10)
-        response.raise_for_status()
-        results = response.json().get('web', {}).get('results', [])
-        
-        if not results:
-            return "No web search results found."
+    async def search() -> Optional[str]:
+        headers = {"X-Subscription-Token": config.BRAVE_API_KEY, "Accept": "application/json"}
+        params = {"q": topic, "count": 3}
         
-        snippets = []
-        for res in results:
-            title = res.get('title', 'No title')
-            description = res.get('description', 'No description')
-            snippets.append(f"**{title}**\n{description}")
+        data = await brave_client.get_json(BRAVE_SEARCH_URL, headers=headers, params=params)
+        results = data.get('web', {}).get('results', [])
         
-        answer = "\n\n".join(snippets)
-        
-        # Cache the result
-        try:
-            tools_supabase.table('knowledge_cache').insert({
-                "cache_key": cache_key,
-                "question": topic,
-                "answer": answer,
-                "source": "web_search"
-            }).execute()
-            print(f"✓ Cached web search result for: {topic}")
-        except Exception as e:
-            print(f"Cache save error: {e}")
-        
-        return answer
+        if not results:
+            return None
         
-    except requests.exceptions.Timeout:
+        print(f"✓ Caching web search result for: {topic}")
+        return format_search_results(results)
+    
+    # Memory cache -> knowledge_cache table -> Brave (shared by concurrent misses)
+    cache_key = generate_cache_key(topic, "web_search")
+    try:
+        answer = await knowledge_cache.aget_or_compute(cache_key, topic, "web_search", search)
+        return answer if answer is not None else "No web search results found."
+    except httpx.TimeoutException:
         return "Web search timed out. Please try again."
     except Exception as e:
         return f"Error during web search: {e}"
 
-@tool
-def generate_diagram(query: str) -> str:
+# Coroutine-only: its clients and caches are bound to the app's event loop,
+# so the tool is awaited there (ainvoke) rather than run from sync code
+web_search = StructuredTool.from_function(
+    coroutine=_aweb_search,
+    name="web_search",
+    description=_aweb_search.__doc__,
+)
+
+def format_diagram_answer(explanation: str, mermaid_code: str) -> str:
+    return f"{explanation}\n\n%%MERMAID%%\n{mermaid_code}\n%%/MERMAID%%"
+
+async def abuild_diagram_answer(query: str, chains: DiagramChains) -> str:
+    """Mermaid code plus explanation for a request, as cached (also used by the pre-warming job)."""
+    async def call(chain, template: str, output_tokens: int):
+        # Each Groq call waits for its own slot and share of the token budget
+        async with groq_scheduler.slot(estimate_call_tokens(template + query, output_tokens)) as lease:
+            response = await chain.ainvoke({"query": query})
+            lease.record(response)
+        return response
+
+    # One LLM round trip of wall-clock time instead of two back to back
+    mermaid_response, explanation_response = await asyncio.gather(
+        call(chains.diagram, diagram_prompt_template, DIAGRAM_OUTPUT_TOKENS),
+        call(chains.request_explanation, request_explanation_prompt_template, EXPLANATION_OUTPUT_TOKENS),
+    )
+    record_llm_usage("diagram", mermaid_response)
+    record_llm_usage("diagram_explanation", explanation_response)
+    return format_diagram_answer(explanation_response.content.strip(), mermaid_response.content.strip())
+
+@instrumented(TOOL_DURATION, "tool:generate_diagram", tool="generate_diagram")
+async def _agenerate_diagram(query: str) -> str:
     """Generates Mermaid diagram with Groq explanation and caches both together."""
     print(f"---TOOL: Generating diagram for '{query}'---")
     
-    if diagram_chain is None or explanation_chain is None:
+    chains = get_diagram_chains()
+    if chains is None:
         return "Diagram generation unavailable - Groq not configured."
     
-    # Check cache first
-    cache_key = generate_cache_key(f"diagram:{query}")
-    try:
-        cached = tools_supabase.table('knowledge_cache').select('answer').eq('cache_key', cache_key).execute()
-        if cached.data and len(cached.data) > 0:
-            print(f"✓ Cache hit for diagram: {query}")
-            return cached.data[0]['answer']
-    except Exception as e:
-        print(f"Cache check error: {e}")
+    async def generate() -> str:
+        answer = await abuild_diagram_answer(query, chains)
+        print(f"✓ Caching diagram + explanation for: {query}")
+        return answer
     
+    # Memory cache -> knowledge_cache table -> Groq (shared by concurrent misses)
+    cache_key = generate_cache_key(query, "diagram")
     try:
-        # Generate Mermaid code
-        mermaid_response = diagram_chain.invoke({"query": query})
-        mermaid_code = mermaid_response.content.strip()
-        
-        # Generate explanation
-        explanation_response = explanation_chain.invoke({
-            "query": query,
-            "mermaid_code": mermaid_code
-        })
-        explanation = explanation_response.content.strip()
-        
-        # Combine diagram and explanation
-        result = f"{explanation}\n\n%%MERMAID%%\n{mermaid_code}\n%%/MERMAID%%"
-        
-        # Cache the complete result
-        try:
-            tools_supabase.table('knowledge_cache').insert({
-                "cache_key": cache_key,
-                "question": query,
-                "answer": result,
-                "source": "diagram_generation"
-            }).execute()
-            print(f"✓ Cached diagram + explanation for: {query}")
-        except Exception as e:
-            print(f"Cache save error: {e}")
-        
-        return result
-        
+        return await knowledge_cache.aget_or_compute(cache_key, query, "diagram_generation", generate)
+    except LLMOverloaded:
+        # Ends the turn with an "overloaded" error rather than a tool result
+        raise
     except Exception as e:
         print(f"Error in generate_diagram: {e}")
         return f"Error generating diagram: {e}"
 
+# Coroutine-only like web_search: every Groq call goes through groq_scheduler,
+# which lives on the app's event loop. The graph's ToolNode awaits it.
+generate_diagram = StructuredTool.from_function(
+    coroutine=_agenerate_diagram,
+    name="generate_diagram",
+    description=_agenerate_diagram.__doc__,
+)
+
 @tool
+@instrumented(TOOL_DURATION, "tool:query_supabase", tool="query_supabase")
 def query_supabase(concept: str) -> str:
     """Queries Supabase knowledge base for DSA concepts (fallback only)."""
     print(f"---TOOL: Querying knowledge base for '{concept}'---")
     
     try:
-        response = tools_supabase.table('concepts').select('explanation').ilike('title', f'%{concept}%').execute()
-        
-        if response.data and len(response.data) > 0:
-            return response.data[0]['explanation']
+        if concept_index.loaded:
+            matches = concept_index.search(concept, limit=3)
+            if matches:
+                explanation = matches[0][1].get('explanation') or ""
+                related = [row['title'] for _, row in matches[1:] if row.get('title')]
+                if related:
+                    explanation += f"\n\nRelated concepts: {', '.join(related)}"
+                return explanation
+        else:
+            # Index not loaded yet (startup, or the table couldn't be read): ask the database
+            explanation = knowledge_repo.find_concept_explanation(concept)
+            if explanation is not None:
+                return explanation
         
         return f"No information found for '{concept}' in knowledge base."
     except Exception as e:
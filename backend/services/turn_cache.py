@@ -0,0 +1,92 @@
+import hashlib
+import json
+import threading
+import time
+from typing import List, Optional
+
+from .cache import MISSING, TTLCache
+from .query_normalizer import normalize_question
+from .repository import KnowledgeRepository
+
+SOURCE = "turn_answer"
+
+
+class TurnAnswerCache:
+    """
+    Whole answers (thinking steps plus final answer) to first-turn questions.
+
+    A question asked with no earlier conversation gets the same answer for
+    every user, so a repeat is replayed from here instead of going through
+    the supervisor. Keys combine the normalized question with `version`
+    (the model and a hash of the prompt and tools), so changing the prompt
+    invalidates every entry at once. Entries live in a size-bounded memory
+    tier and, with a repository, in the knowledge_cache table (shared by all
+    instances), both for `ttl` seconds.
+    """
+
+    def __init__(self, version: str, ttl: int = 6 * 3600, max_size: int = 2048, repo: Optional[KnowledgeRepository] = None):
+        self.version = version
+        self.ttl = ttl
+        self.repo = repo
+        self.memory = TTLCache(max_size=max_size)
+        self._stats_lock = threading.Lock()
+        self.hits = 0
+        self.db_hits = 0
+        self.misses = 0
+        self.stored = 0
+
+    def _count(self, counter: str):
+        with self._stats_lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def key_for(self, question: str) -> Optional[str]:
+        """Cache key for a first-turn question, or None if it is all filler ("hello", "can you?")."""
+        normalized = normalize_question(question)
+        if not normalized:
+            # Every filler-only message normalizes to "", so they would all share one answer
+            return None
+        return hashlib.md5(f"{SOURCE}:{self.version}:{normalized}".encode()).hexdigest()
+
+    async def aget(self, cache_key: str) -> Optional[dict]:
+        """{"thinking": [...], "answer": "..."} for a cached turn, or None."""
+        cached = self.memory.get(cache_key)
+        if cached is not MISSING:
+            self._count("hits")
+            return cached
+
+        if self.repo is not None:
+            try:
+                row = await self.repo.aget_cached_answer(cache_key, self.ttl)
+            except Exception as e:
+                print(f"Turn cache check error: {e}")
+                row = None
+            entry = json.loads(row) if row else None
+            # The entry carries its age, for the memory tier's remaining TTL
+            if entry is not None and entry.get("cached_at", 0) + self.ttl > time.time():
+                self._count("db_hits")
+                self.memory.set(cache_key, entry, entry["cached_at"] + self.ttl - time.time())
+                return entry
+
+        self._count("misses")
+        return None
+
+    async def aset(self, cache_key: str, question: str, thinking: List[str], answer: str):
+        entry = {"thinking": list(thinking), "answer": answer, "cached_at": time.time()}
+        self.memory.set(cache_key, entry, self.ttl)
+        self._count("stored")
+        if self.repo is not None:
+            try:
+                await self.repo.asave_cached_answer(cache_key, question, json.dumps(entry), SOURCE)
+            except Exception as e:
+                print(f"Turn cache save error: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.db_hits + self.misses
+        return {
+            "size": len(self.memory),
+            "hits": self.hits,
+            "db_hits": self.db_hits,
+            "misses": self.misses,
+            "stored": self.stored,
+            "hit_ratio": round((self.hits + self.db_hits) / lookups, 4) if lookups else 0.0,
+        }
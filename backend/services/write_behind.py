@@ -0,0 +1,436 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from supabase import Client
+from core import config
+from core.config import (
+    SUPABASE_SERVICE_KEY, WRITE_BEHIND_SPILL_PATH, WRITE_BEHIND_BATCH_SIZE,
+    WRITE_BEHIND_FLUSH_INTERVAL, WRITE_BEHIND_MAX_ATTEMPTS, WRITE_BEHIND_FSYNC,
+)
+from core.db import run_db
+from core.lazy import LazyProxy, lazy_singleton
+from core.metrics import timed_db_call
+
+
+class _Write:
+    """One queued write. `client` is only held in memory; spilled writes replay with the fallback client."""
+
+    def __init__(self, kind: str, payload: dict, client: Optional[Client] = None, write_id: Optional[str] = None, attempts: int = 0):
+        self.kind = kind
+        self.payload = payload
+        self.client = client
+        # Also the chat_messages row id, which makes re-sending a message idempotent
+        self.id = write_id or str(uuid.uuid4())
+        self.attempts = attempts
+
+    def to_record(self) -> dict:
+        return {"id": self.id, "kind": self.kind, "payload": self.payload, "attempts": self.attempts}
+
+    @classmethod
+    def from_record(cls, record: dict) -> "_Write":
+        return cls(record["kind"], record["payload"], write_id=record["id"], attempts=record.get("attempts", 0))
+
+
+def _pid_alive(pid: int) -> bool:
+    """Whether a process with this pid is running (used to tell orphaned spill files from live ones)."""
+    if os.name == "nt":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class WriteBehindQueue:
+    """
+    Write-behind queue for chat_messages inserts and session title updates.
+
+    Writes are recorded in a local spill file (JSON lines) and flushed in the
+    background once `batch_size` writes are waiting or every `flush_interval`
+    seconds. Message rows going through the same client are sent as one
+    multi-row insert. The spill file is compacted after every flush, so
+    whatever is still in it at startup was never confirmed by the database
+    and gets replayed.
+
+    All spill file I/O happens on one background thread, never on the event
+    loop: appends queued while it is busy are written (and fsynced) together
+    in one go. Each process spills to its own file next to `spill_path`
+    (write_behind.<pid>.jsonl); at startup it claims the files of processes
+    that are no longer running, so several workers never replay or overwrite
+    each other's records.
+
+    Message rows use the write's id as their primary key and are inserted
+    with ON CONFLICT DO NOTHING, so a replay after a crash between the insert
+    and the compaction doesn't duplicate them. Rows carry their own
+    created_at, taken when the write was queued, so a user message and its
+    answer keep their order even when they land in the same batch.
+    """
+
+    def __init__(
+        self,
+        spill_path: str,
+        batch_size: int = 50,
+        flush_interval: float = 0.5,
+        max_attempts: int = 5,
+        fallback_client: Optional[Client] = None,
+        fsync: bool = True,
+    ):
+        self.spill_path = Path(spill_path)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_attempts = max_attempts
+        self.fallback_client = fallback_client
+        self.fsync = fsync
+        self._pending: List[_Write] = []
+        self._lock = threading.Lock()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        # Spill thread state, guarded by _lock: records waiting to be appended,
+        # whether the file should be rewritten from _pending, and whether a write is in progress
+        self._spill_changed = threading.Condition(self._lock)
+        self._spill_buffer: List[dict] = []
+        self._compact_requested = False
+        self._spilling = False
+        self._spiller: Optional[threading.Thread] = None
+        self.flushed = 0
+        self.batches = 0
+        self.failures = 0
+        self.dropped = 0
+        self.replayed = 0
+
+    # --- Spill file ---
+
+    @property
+    def own_spill_path(self) -> Path:
+        """This process's spill file."""
+        return self.spill_path.with_name(f"{self.spill_path.stem}.{os.getpid()}{self.spill_path.suffix}")
+
+    def _ensure_spiller(self):
+        if self._spiller is None:
+            self._spiller = threading.Thread(target=self._spill_loop, name="write-behind-spill", daemon=True)
+            self._spiller.start()
+
+    def _spill_loop(self):
+        while True:
+            with self._spill_changed:
+                while not (self._spill_buffer or self._compact_requested):
+                    self._spill_changed.wait()
+                if self._compact_requested:
+                    # A rewrite covers everything still pending, including buffered appends
+                    records, rewrite = [write.to_record() for write in self._pending], True
+                else:
+                    records, rewrite = list(self._spill_buffer), False
+                self._spill_buffer.clear()
+                self._compact_requested = False
+                self._spilling = True
+            try:
+                if rewrite:
+                    self._write_spill(records)
+                else:
+                    self._append_spill(records)
+            except Exception as e:
+                print(f"Write-behind spill error: {e}")
+            finally:
+                with self._spill_changed:
+                    self._spilling = False
+                    self._spill_changed.notify_all()
+
+    def _append_spill(self, records: List[dict]):
+        with open(self.own_spill_path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+
+    def _write_spill(self, records: List[dict]):
+        path = self.own_spill_path
+        if not records:
+            if path.exists():
+                path.unlink()
+            return
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write("".join(json.dumps(record) + "\n" for record in records))
+            f.flush()
+            if self.fsync:
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def _request_compaction(self):
+        # Called with self._lock held
+        self._compact_requested = True
+        self._spill_changed.notify_all()
+
+    def wait_spilled(self):
+        """Blocks until everything queued so far is in the spill file (run off the event loop)."""
+        with self._spill_changed:
+            while self._spill_buffer or self._compact_requested or self._spilling:
+                self._spill_changed.wait()
+
+    def _orphaned_spill_files(self) -> List[Path]:
+        """
+        Spill files whose process is gone (or is an earlier run with this pid):
+        per-process files, files a worker claimed but died before replaying,
+        and the shared file older versions used.
+        """
+        stem, suffix = self.spill_path.stem, self.spill_path.suffix
+        pattern = re.compile(rf"{re.escape(stem)}\.(\d+){re.escape(suffix)}(?:\.claimed-(\d+))?")
+        orphans = [self.spill_path] if self.spill_path.exists() else []
+        for path in self.spill_path.parent.glob(f"{stem}.*"):
+            match = pattern.fullmatch(path.name)
+            if match is None:
+                continue
+            owner = int(match.group(2) or match.group(1))
+            if owner == os.getpid() or not _pid_alive(owner):
+                orphans.append(path)
+        return orphans
+
+    def _claim_spill_files(self) -> List[Path]:
+        """Renames orphaned spill files to this process; a file another worker claimed first is skipped."""
+        claimed = []
+        for path in self._orphaned_spill_files():
+            target = path.with_name(f"{path.name.split('.claimed-')[0]}.claimed-{os.getpid()}")
+            try:
+                os.rename(path, target)
+            except FileNotFoundError:
+                continue
+            claimed.append(target)
+        return claimed
+
+    def _load_spill(self, path: Path) -> List[_Write]:
+        writes = []
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    writes.append(_Write.from_record(json.loads(line)))
+                except (ValueError, KeyError) as e:
+                    # A torn last line from a crash mid-append; everything before it is intact
+                    print(f"Skipping unreadable spill record: {e}")
+        return writes
+
+    def _replay_spill_files(self) -> List[_Write]:
+        """Takes over orphaned spill files: their writes go into this process's file before the claimed copies are deleted."""
+        claimed = self._claim_spill_files()
+        writes = [write for path in claimed for write in self._load_spill(path)]
+        with self._lock:
+            self._pending = writes + self._pending
+            records = [write.to_record() for write in self._pending]
+        self._write_spill(records)
+        for path in claimed:
+            path.unlink()
+        return writes
+
+    # --- Producers ---
+
+    def _enqueue(self, write: _Write):
+        self._ensure_spiller()
+        with self._lock:
+            self._pending.append(write)
+            self._spill_buffer.append(write.to_record())
+            self._spill_changed.notify_all()
+            queued = len(self._pending)
+        if queued >= self.batch_size and self._wakeup is not None:
+            self._wakeup.set()
+
+    def enqueue_message(self, client: Client, session_id: str, user_id: str, role: str, content: str, thinking: Optional[List[str]] = None):
+        """Queues a chat_messages insert (with the answer's thinking steps, for AI messages)."""
+        self._enqueue(_Write("message", {
+            "session_id": session_id,
+            "user_id": user_id,
+            "role": role,
+            "content": content,
+            "thinking_process": thinking or None,
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }, client))
+
+    def enqueue_title(self, client: Client, session_id: str, title: str):
+        """Queues a title update that only applies while the session still has its default title."""
+        self._enqueue(_Write("title", {"session_id": session_id, "title": title}, client))
+
+    def pending_messages(self, session_id: str) -> List[dict]:
+        """Queued (not yet confirmed) message rows for a session, oldest first."""
+        with self._lock:
+            return [
+                dict(write.payload) for write in self._pending
+                if write.kind == "message" and write.payload["session_id"] == session_id
+            ]
+
+    def discard_sessions(self, session_ids: List[str]) -> int:
+        """Drops queued writes for deleted sessions so they aren't retried against missing rows."""
+        doomed = set(session_ids)
+        with self._lock:
+            kept = [write for write in self._pending if write.payload.get("session_id") not in doomed]
+            discarded = len(self._pending) - len(kept)
+            if discarded:
+                self._pending = kept
+                self._request_compaction()
+        return discarded
+
+    # --- Flushing ---
+
+    def _client_for(self, write: _Write) -> Optional[Client]:
+        # Live writes keep going through the user's own client so RLS still applies
+        return write.client or self.fallback_client
+
+    @staticmethod
+    def _message_row(write: _Write) -> dict:
+        # The write id is the row's primary key, so inserting it again is a no-op
+        return {**write.payload, "id": str(uuid.UUID(write.id))}
+
+    def _insert_messages(self, client: Client, writes: List[_Write]):
+        rows = [self._message_row(write) for write in writes]
+        client.table('chat_messages').upsert(rows, on_conflict='id', ignore_duplicates=True).execute()
+
+    @timed_db_call
+    def _execute(self, batch: List[_Write]) -> List[_Write]:
+        """Sends one batch; returns the writes that failed."""
+        failed: List[_Write] = []
+        messages_by_client: Dict[int, List[_Write]] = {}
+        for write in batch:
+            client = self._client_for(write)
+            if write.kind == "message":
+                messages_by_client.setdefault(id(client), []).append(write)
+            else:
+                try:
+                    client.table('chat_sessions').update({
+                        'title': write.payload["title"]
+                    }).eq('id', write.payload["session_id"]).like('title', 'New Chat%').execute()
+                except Exception as e:
+                    print(f"Error updating session title: {e}")
+                    failed.append(write)
+
+        for writes in messages_by_client.values():
+            client = self._client_for(writes[0])
+            try:
+                self._insert_messages(client, writes)
+            except Exception as e:
+                print(f"Error saving {len(writes)} chat messages: {e}")
+                if len(writes) == 1:
+                    failed.extend(writes)
+                    continue
+                # One bad row fails the whole insert; retry row by row so only it stays queued
+                for write in writes:
+                    try:
+                        self._insert_messages(client, [write])
+                    except Exception as e:
+                        print(f"Error saving chat message for session {write.payload.get('session_id')}: {e}")
+                        failed.append(write)
+        return failed
+
+    async def flush(self):
+        """Sends everything queued so far. Failed writes stay queued until max_attempts."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            with self._lock:
+                # Replayed writes have no client of their own; without a service client they wait
+                batch = [write for write in self._pending if self._client_for(write) is not None]
+            if not batch:
+                return
+
+            failed = await run_db(self._execute, batch)
+            failed_ids = {write.id for write in failed}
+            done_ids = {write.id for write in batch} - failed_ids
+
+            with self._lock:
+                kept = []
+                for write in self._pending:
+                    if write.id in done_ids:
+                        continue
+                    if write.id in failed_ids:
+                        write.attempts += 1
+                        if write.attempts >= self.max_attempts:
+                            print(f"Dropping {write.kind} write for session {write.payload.get('session_id')} after {write.attempts} attempts")
+                            self.dropped += 1
+                            continue
+                    kept.append(write)
+                self._pending = kept
+                self._request_compaction()
+
+            self.batches += 1
+            self.flushed += len(done_ids)
+            self.failures += len(failed_ids)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"Write-behind flush error: {e}")
+
+    async def start(self):
+        """Replays writes left in orphaned spill files and starts the background flusher."""
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        replayed = await asyncio.to_thread(self._replay_spill_files)
+        if replayed:
+            if self.fallback_client is None:
+                print(f"{len(replayed)} spilled writes need SUPABASE_SERVICE_KEY to be replayed; keeping them in {self.own_spill_path}")
+            self.replayed += len(replayed)
+        self._ensure_spiller()
+        self._worker = asyncio.create_task(self._run())
+
+    async def close(self):
+        """Stops the background flusher, flushes what is left and waits for the spill file (call on shutdown)."""
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+        await self.flush()
+        if self._spiller is not None:
+            await asyncio.to_thread(self.wait_spilled)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "flushed": self.flushed,
+            "batches": self.batches,
+            "failures": self.failures,
+            "dropped": self.dropped,
+            "replayed": self.replayed,
+        }
+
+
+@lazy_singleton
+def get_service_supabase() -> Client:
+    """Service-role client, only used to replay spilled writes after a restart."""
+    from supabase import create_client
+    return create_client(config.SUPABASE_URL, SUPABASE_SERVICE_KEY)
+
+service_supabase = LazyProxy(get_service_supabase) if SUPABASE_SERVICE_KEY else None
+
+chat_writer = WriteBehindQueue(
+    WRITE_BEHIND_SPILL_PATH,
+    batch_size=WRITE_BEHIND_BATCH_SIZE,
+    flush_interval=WRITE_BEHIND_FLUSH_INTERVAL,
+    max_attempts=WRITE_BEHIND_MAX_ATTEMPTS,
+    fallback_client=service_supabase,
+    fsync=WRITE_BEHIND_FSYNC,
+)
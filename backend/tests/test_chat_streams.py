@@ -0,0 +1,60 @@
+import asyncio
+import time
+import uuid
+
+import api.chat
+from benchmarks.fakes import FakeSupabase, FakeSupervisorLLM, now_iso, parse_profile
+from schemas.chat import ChatRequest
+from services import agent
+from services.write_behind import chat_writer
+
+DB_LATENCY = 0.3  # every query blocks its thread this long
+
+
+def test_streams_keep_flowing_while_db_calls_block(tmp_path, monkeypatch):
+    db = FakeSupabase(parse_profile(f"latency={DB_LATENCY}"))
+    sessions = [uuid.uuid4(), uuid.uuid4()]
+    # Earlier turns, so each stream loads its history from the (slow) database
+    db.seed("chat_messages", [
+        {"id": str(uuid.uuid4()), "session_id": str(session_id), "role": role, "content": text, "created_at": now_iso()}
+        for session_id in sessions
+        for role, text in (("user", "What is a hash table?"), ("ai", "A hash table maps keys to values."))
+    ])
+    supervisor_chain = agent.supervisor_prompt | FakeSupervisorLLM(profile=parse_profile("latency=0"), token_delay=0.01)
+    monkeypatch.setattr(agent, "get_supervisor_chain", lambda: supervisor_chain)
+    monkeypatch.setattr(chat_writer, "spill_path", tmp_path / "write_behind.jsonl")
+    # Build the graph and train the router up front (CPU work, not what this measures)
+    agent.get_intent_router()
+    agent.get_app_graph()
+
+    async def stream(index: int, events: list):
+        request = ChatRequest(message="How does that compare to the one you described before?")
+        async for _ in api.chat.generate_events(sessions[index], request, db, f"user-{index}"):
+            events.append((index, time.perf_counter()))
+
+    async def heartbeat(gaps: list, done: asyncio.Event):
+        last = time.perf_counter()
+        while not done.is_set():
+            await asyncio.sleep(0.01)
+            now = time.perf_counter()
+            gaps.append(now - last)
+            last = now
+
+    async def run():
+        events, gaps, done = [], [], asyncio.Event()
+        ticker = asyncio.create_task(heartbeat(gaps, done))
+        await asyncio.gather(stream(0, events), stream(1, events))
+        done.set()
+        await ticker
+        return events, gaps
+
+    events, gaps = asyncio.run(run())
+    chat_writer.wait_spilled()
+
+    # The loop never stalled for a database round trip
+    assert max(gaps) < DB_LATENCY / 2
+    # Both streams produced events, and they were interleaved rather than one after the other
+    order = [index for index, _ in sorted(events, key=lambda event: event[1])]
+    assert order.count(0) > 1 and order.count(1) > 1
+    switches = sum(1 for a, b in zip(order, order[1:]) if a != b)
+    assert switches > 2
@@ -0,0 +1,78 @@
+import gzip
+
+import zstandard
+from starlette.applications import Starlette
+from starlette.responses import PlainTextResponse, StreamingResponse
+from starlette.routing import Route
+from starlette.testclient import TestClient
+
+from core.compression import CompressionMiddleware
+
+LONG_TEXT = "binary search tree " * 200
+
+
+async def long_text(request):
+    return PlainTextResponse(LONG_TEXT)
+
+
+async def short_text(request):
+    return PlainTextResponse("ok")
+
+
+async def chunks():
+    for _ in range(3):
+        yield LONG_TEXT
+
+
+async def streamed_text(request):
+    return StreamingResponse(chunks(), media_type="text/plain")
+
+
+async def events(request):
+    return StreamingResponse(chunks(), media_type="text/event-stream")
+
+
+def make_client() -> TestClient:
+    app = Starlette(routes=[
+        Route("/long", long_text), Route("/short", short_text),
+        Route("/streamed", streamed_text), Route("/events", events),
+    ])
+    app.add_middleware(CompressionMiddleware, minimum_size=1024)
+    return TestClient(app)
+
+
+def get_raw(client: TestClient, path: str, accept_encoding: str):
+    with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+        return response, b"".join(response.iter_raw())
+
+
+def test_prefers_zstd_then_gzip():
+    client = make_client()
+    response, body = get_raw(client, "/long", "gzip, zstd")
+    assert response.headers["content-encoding"] == "zstd"
+    assert response.headers["content-length"] == str(len(body))
+    assert zstandard.ZstdDecompressor().decompressobj().decompress(body).decode() == LONG_TEXT
+
+    response, body = get_raw(client, "/long", "gzip, zstd;q=0")
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body).decode() == LONG_TEXT
+    assert "accept-encoding" in response.headers["vary"].lower()
+
+
+def test_small_and_unaccepted_responses_stay_plain():
+    client = make_client()
+    response, body = get_raw(client, "/short", "gzip")
+    assert "content-encoding" not in response.headers and body == b"ok"
+    response, body = get_raw(client, "/long", "br")
+    assert "content-encoding" not in response.headers and body.decode() == LONG_TEXT
+
+
+def test_streamed_bodies_are_compressed_and_event_streams_are_not():
+    client = make_client()
+    response, body = get_raw(client, "/streamed", "gzip")
+    assert response.headers["content-encoding"] == "gzip"
+    assert gzip.decompress(body).decode() == LONG_TEXT * 3
+
+    response, body = get_raw(client, "/events", "gzip, zstd")
+    assert "content-encoding" not in response.headers
+    assert body.decode() == LONG_TEXT * 3
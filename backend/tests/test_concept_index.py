@@ -0,0 +1,78 @@
+import random
+import threading
+import time
+
+from benchmarks.bench_concept_search import make_concepts, make_queries
+from services.concept_index import ConceptIndex
+
+
+def titles(results) -> list:
+    return [row["title"] for _, row in results]
+
+
+def test_searches_use_the_published_version_while_a_write_is_built():
+    index = ConceptIndex(threshold=0.1)
+    index.replace_all([{"id": 1, "title": "Binary Search Tree", "explanation": "BST"}])
+    snapshot = index._data
+    apply = index._apply
+
+    def slow_apply(data, rows):
+        time.sleep(0.3)
+        return apply(data, rows)
+
+    index._apply = slow_apply
+    writer = threading.Thread(target=index.upsert, args=([{"id": 2, "title": "Binary Heap", "explanation": "heap"}],))
+    writer.start()
+    time.sleep(0.05)
+
+    started = time.perf_counter()
+    assert titles(index._search("binary heap", 3)) == ["Binary Search Tree"]
+    assert time.perf_counter() - started < 0.1
+    writer.join()
+
+    assert titles(index._search("binary heap", 3))[0] == "Binary Heap"
+    # The version searches were reading was never modified
+    assert len(snapshot.slots) == 1 and "  h" not in snapshot.postings
+
+
+def test_typo_queries_rank_as_in_exact_mode():
+    # Exact search is the default; capping is opt-in and must not change the ranking
+    assert ConceptIndex().max_posting == 0
+    rng = random.Random(3)
+    rows = make_concepts(5000, rng)
+    exact = ConceptIndex(max_posting=0)
+    exact.replace_all(rows)
+    capped = ConceptIndex(max_posting=20)
+    capped.replace_all(rows)
+    assert capped._data.heads
+
+    queries = [query for kind, query in make_queries(rows, 1600, rng) if kind == "typo"]
+    for query in queries:
+        expected = exact._search(query, 3)
+        assert capped._search(query, 3)[:1] == expected[:1], query
+
+
+def test_capped_postings_return_the_exact_results():
+    rng = random.Random(5)
+    rows = make_concepts(5000, rng)
+    exact = ConceptIndex(max_posting=0)
+    exact.replace_all(rows)
+    capped = ConceptIndex(max_posting=100)
+    capped.replace_all(rows)
+
+    for kind, query in make_queries(rows, 200, rng):
+        found = capped._search(query, 3)
+        assert found == exact._search(query, 3), (kind, query)
+        if kind == "exact":
+            assert found[0][1]["title"] == query
+
+
+def test_heads_follow_upserts():
+    rows = [{"id": i, "title": f"Tree Variant Number {i}"} for i in range(50)]
+    index = ConceptIndex(max_posting=10)
+    index.replace_all(rows)
+    # A short new title sharing only common trigrams joins their heads
+    index.upsert([{"id": 100, "title": "Tree"}])
+
+    assert titles(index._search("tree", 1)) == ["Tree"]
+    assert all(len(head) <= 10 for head in index._data.heads.values())
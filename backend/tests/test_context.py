@@ -0,0 +1,64 @@
+import asyncio
+
+from langchain_core.messages import AIMessage, HumanMessage
+
+from services.context import SUMMARY_PREFIX, ContextWindowManager
+
+WINDOW = 200  # messages the chat endpoint loads per turn
+
+
+def transcript(first: int, last: int):
+    """Messages first..last (inclusive) of a session, with their positions."""
+    history, positions = [], []
+    for i in range(first, last + 1):
+        text = f"message {i} " + "x" * 400
+        history.append(HumanMessage(content=text) if i % 2 == 0 else AIMessage(content=text))
+        positions.append(float(i))
+    return history, positions
+
+
+def test_summary_keeps_extending_after_the_window_slides():
+    summarized = []
+
+    async def summarizer(summary, messages):
+        summarized.extend(message.content.split()[1] for message in messages)
+        return f"covers up to {summarized[-1]}"
+
+    manager = ContextWindowManager(max_tokens=2000, recent_turns=2, summarizer=summarizer)
+
+    async def turn(last):
+        history, positions = transcript(max(0, last - WINDOW + 1), last)
+        return await manager.build("s1", history, positions)
+
+    async def run():
+        # Before the window fills, then twice after it has slid past message 200
+        return [await turn(last) for last in (150, 300, 302)]
+
+    first, second, third = asyncio.run(run())
+
+    assert first[0].content == f"{SUMMARY_PREFIX}\ncovers up to 147"
+    assert second[0].content == f"{SUMMARY_PREFIX}\ncovers up to 297"
+    assert third[0].content == f"{SUMMARY_PREFIX}\ncovers up to 299"
+    # Every message is summarized exactly once, in order
+    assert summarized == [str(i) for i in range(0, 300)]
+
+
+def test_summary_restarts_when_summarized_messages_are_gone():
+    calls = []
+
+    async def summarizer(summary, messages):
+        calls.append((summary, len(messages)))
+        return "summary"
+
+    manager = ContextWindowManager(max_tokens=2000, recent_turns=2, summarizer=summarizer)
+
+    async def run():
+        history, positions = transcript(0, 99)
+        await manager.build("s1", history, positions)
+        # The session was cleared and has started over
+        history, positions = transcript(0, 19)
+        await manager.build("s1", history, positions)
+
+    asyncio.run(run())
+
+    assert calls == [("", 96), ("", 16)]
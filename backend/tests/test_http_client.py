@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from benchmarks.brave_stub import start_stub
+from services import http_client
+from services.http_client import ResilientHTTPClient, RetryBudget
+
+
+def run_search(client: ResilientHTTPClient, url: str):
+    async def search():
+        try:
+            return await client.get_json(url, params={"q": "binary heap"})
+        finally:
+            await client.aclose()
+    return asyncio.run(search())
+
+
+def test_deadline_covers_hedges():
+    server, url = start_stub(latency=0.0, jitter=0.0, slow_rate=1.0, slow_latency=2.0)
+    client = ResilientHTTPClient(read_timeout=5.0, hedge_after=0.1, deadline=0.4)
+    try:
+        started = time.perf_counter()
+        with pytest.raises(httpx.TimeoutException):
+            run_search(client, url)
+        assert time.perf_counter() - started < 0.8
+        assert client.hedges == 1 and client.deadlines_exceeded == 1
+    finally:
+        server.shutdown()
+
+
+def test_no_retry_starts_past_the_deadline(monkeypatch):
+    # Longest backoff every time: 0.5s, then 1s, ...
+    monkeypatch.setattr(http_client.random, "uniform", lambda low, high: high)
+    server, url = start_stub(latency=0.0, jitter=0.0, error_rate=1.0)
+    client = ResilientHTTPClient(max_retries=5, backoff_base=0.25, retry_budget=RetryBudget(min_retries=10), deadline=0.8)
+    try:
+        started = time.perf_counter()
+        with pytest.raises(httpx.HTTPStatusError):
+            run_search(client, url)
+        # One retry after 0.5s; the next would wait until past the deadline
+        assert time.perf_counter() - started < 0.8
+        assert client.retries == 1 and client.deadlines_exceeded == 1
+    finally:
+        server.shutdown()
@@ -0,0 +1,87 @@
+import asyncio
+import json
+import threading
+import time
+
+import jwt
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+
+from core import dependencies
+from core.jwt_verifier import TokenVerifier
+
+SECRET = "test-secret-at-least-32-bytes-long!!"
+USER_ID = "7d0f1c9e-0d55-4a1e-9a55-2c2f1d3e4b5a"
+
+
+def mint(key, alg="HS256", kid=None, **claims) -> str:
+    payload = {"sub": USER_ID, "aud": "authenticated", "exp": int(time.time()) + 3600, **claims}
+    return jwt.encode(payload, key, algorithm=alg, headers={"kid": kid} if kid else None)
+
+
+@pytest.fixture
+def signing_key():
+    return ec.generate_private_key(ec.SECP256R1())
+
+
+def jwks_for(private_key, kid: str) -> dict:
+    jwk = json.loads(jwt.algorithms.ECAlgorithm.to_jwk(private_key.public_key()))
+    return {"keys": [{**jwk, "kid": kid, "alg": "ES256"}]}
+
+
+def test_valid_tokens_verify_locally(signing_key):
+    verifier = TokenVerifier(jwt_secret=SECRET)
+    verifier.jwks.set_keys(jwks_for(signing_key, "k1"))
+
+    assert verifier.verify(mint(SECRET)) == USER_ID
+    assert verifier.verify(mint(signing_key, "ES256", kid="k1")) == USER_ID
+
+
+def test_expired_token_is_rejected():
+    verifier = TokenVerifier(jwt_secret=SECRET)
+    with pytest.raises(jwt.ExpiredSignatureError):
+        verifier.verify(mint(SECRET, exp=int(time.time()) - 60))
+
+
+def test_wrong_audience_is_rejected(signing_key):
+    verifier = TokenVerifier(jwt_secret=SECRET)
+    verifier.jwks.set_keys(jwks_for(signing_key, "k1"))
+
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier.verify(mint(SECRET, aud="anon"))
+    with pytest.raises(jwt.InvalidAudienceError):
+        verifier.verify(mint(signing_key, "ES256", kid="k1", aud="anon"))
+
+
+def test_unknown_kid_is_left_to_supabase_auth(signing_key):
+    verifier = TokenVerifier()
+    verifier.jwks.set_keys(jwks_for(signing_key, "k1"))
+    # Signed by a key the project's JWKS does not list (rotated or foreign)
+    other_key = ec.generate_private_key(ec.SECP256R1())
+
+    assert verifier.verify(mint(other_key, "ES256", kid="k2")) is None
+    # A known kid with the wrong key still fails the signature check
+    with pytest.raises(jwt.InvalidSignatureError):
+        verifier.verify(mint(other_key, "ES256", kid="k1"))
+
+
+def test_jwks_refresh_runs_off_the_event_loop(signing_key, monkeypatch):
+    verifier = TokenVerifier(jwks_url="https://auth.invalid/jwks.json")
+    refreshed_on = []
+
+    def refresh():
+        refreshed_on.append(threading.current_thread().name)
+        verifier.jwks.set_keys(jwks_for(signing_key, "k1"))
+
+    verifier.jwks._refresh = refresh
+    monkeypatch.setattr(dependencies, "get_token_verifier", lambda: verifier)
+    monkeypatch.setattr(dependencies, "AUTH_VERIFY_MODE", "local")
+    token = mint(signing_key, "ES256", kid="k1")
+
+    async def verify_twice():
+        return [await dependencies.verify_token(token), await dependencies.verify_token(token)]
+
+    assert asyncio.run(verify_twice()) == [USER_ID, USER_ID]
+    # Fetched once, on a worker thread; the second call is answered from the cache
+    assert len(refreshed_on) == 1
+    assert refreshed_on[0].startswith("supabase-db")
@@ -0,0 +1,94 @@
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage
+
+from services import llm_scheduler
+from services.llm_scheduler import LLMOverloaded, ProviderScheduler
+
+
+def test_waiting_users_are_admitted_round_robin():
+    async def run():
+        scheduler = ProviderScheduler("test", max_concurrency=1, max_wait=5)
+        order = []
+
+        async def call(user: str, name: str):
+            async with scheduler.slot(10, user=user):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        async with scheduler.slot(10, user="holder"):
+            # One user's burst queues ahead of another user's single call
+            tasks = [asyncio.create_task(call("a", f"a{i}")) for i in range(3)]
+            tasks.append(asyncio.create_task(call("b", "b0")))
+            await asyncio.sleep(0)
+            assert scheduler.queued() == 4
+        await asyncio.gather(*tasks)
+        return order, scheduler
+
+    order, scheduler = asyncio.run(run())
+    assert order == ["a0", "b0", "a1", "a2"]
+    assert scheduler.stats()["in_flight"] == 0
+
+
+def test_calls_over_the_expected_wait_are_refused_up_front():
+    async def run():
+        # 10 tokens a second; the first call empties the bucket
+        scheduler = ProviderScheduler("test", max_concurrency=4, tokens_per_minute=600, max_wait=1)
+        async with scheduler.slot(600):
+            with pytest.raises(LLMOverloaded) as refused:
+                await scheduler.acquire(300)
+        return refused.value, scheduler
+
+    refused, scheduler = asyncio.run(run())
+    assert refused.reason == "queue_full" and refused.retry_after > 1
+    assert scheduler.shed == 1 and scheduler.queued() == 0
+
+
+def test_calls_still_queued_at_max_wait_are_shed():
+    async def run():
+        scheduler = ProviderScheduler("test", max_concurrency=1, max_wait=0.1)
+        async with scheduler.slot(10, user="holder"):
+            with pytest.raises(LLMOverloaded) as shed:
+                await scheduler.acquire(10, user="late")
+        # The slot is free again and the dropped waiter is gone
+        async with scheduler.slot(10):
+            pass
+        return shed.value, scheduler
+
+    shed, scheduler = asyncio.run(run())
+    assert shed.reason == "timeout"
+    assert scheduler.stats()["in_flight"] == 0 and scheduler.queued() == 0
+
+
+def test_token_bucket_is_charged_the_reported_usage():
+    async def run():
+        scheduler = ProviderScheduler("test", tokens_per_minute=6000)
+        async with scheduler.slot(1000) as lease:
+            assert scheduler._tokens == pytest.approx(5000, abs=5)
+            lease.record(AIMessage(content="ok", usage_metadata={"input_tokens": 150, "output_tokens": 50, "total_tokens": 200}))
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    # The 1000-token estimate was corrected to the 200 tokens actually used
+    assert scheduler._tokens == pytest.approx(5800, abs=5)
+
+
+def test_slot_granted_as_the_timeout_fires_is_given_back(monkeypatch):
+    async def granted_then_timed_out(future, timeout):
+        # The slot is granted, but the timeout wins the race to wake the caller
+        await asyncio.shield(future)
+        raise asyncio.TimeoutError
+
+    monkeypatch.setattr(llm_scheduler.asyncio, "wait_for", granted_then_timed_out)
+
+    async def run():
+        scheduler = ProviderScheduler("test", max_concurrency=1, tokens_per_minute=600, max_wait=1)
+        with pytest.raises(LLMOverloaded):
+            await scheduler.acquire(100)
+        return scheduler
+
+    scheduler = asyncio.run(run())
+    assert scheduler.stats()["in_flight"] == 0
+    # The call was never made, so its tokens are back in the bucket
+    assert scheduler._tokens == pytest.approx(600, abs=5)
@@ -0,0 +1,39 @@
+import asyncio
+
+import api.chat
+from schemas.chat import ChatRequest
+from services.repository import parse_timestamp
+from services.write_behind import chat_writer
+
+
+class StoredHistory:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def list_recent_messages(self, session_id, limit):
+        return self.rows
+
+
+def test_parse_timestamp_accepts_postgrest_forms():
+    expected = 1735725600.5
+    for value in ("2025-01-01T10:00:00.5+00:00", "2025-01-01T10:00:00.50000Z", "2025-01-01 10:00:00.500000", "2025-01-01T12:00:00.5+02:00"):
+        assert parse_timestamp(value) == expected, value
+
+
+def test_queued_messages_are_merged_with_naive_stored_timestamps(monkeypatch):
+    stored = [
+        {"role": "user", "content": "What is a heap?", "created_at": "2025-01-01T10:00:00.12345"},
+        {"role": "ai", "content": "A tree-shaped priority queue.", "created_at": "2025-01-01T10:00:05Z"},
+    ]
+    queued = [
+        # Already flushed (also in stored), and one still waiting to be written
+        {"role": "ai", "content": "A tree-shaped priority queue.", "created_at": "2025-01-01T10:00:05+00:00"},
+        {"role": "user", "content": "And a min-heap?", "created_at": "2025-01-01T10:00:09.5+00:00"},
+    ]
+    monkeypatch.setattr(chat_writer, "pending_messages", lambda session_id: list(queued))
+
+    messages = asyncio.run(api.chat.load_conversation(StoredHistory(stored), "s1", ChatRequest(message="Show one")))
+
+    assert [message.text for message in messages] == [
+        "What is a heap?", "A tree-shaped priority queue.", "And a min-heap?", "Show one",
+    ]
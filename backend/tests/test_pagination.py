@@ -0,0 +1,27 @@
+import base64
+import json
+
+import pytest
+
+from services.pagination import InvalidCursor, decode_cursor, encode_cursor
+
+
+def make_cursor(*values) -> str:
+    return base64.urlsafe_b64encode(json.dumps(list(values)).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    row = {"created_at": "2025-01-01T10:00:00.123456+00:00", "id": "0b7c6a3e-2f7d-4b8e-9a51-3c1f0d2e4a6b"}
+    assert decode_cursor(encode_cursor(row)) == (row["created_at"], row["id"])
+
+
+@pytest.mark.parametrize("cursor", [
+    "not a cursor",
+    make_cursor("2025-01-01T10:00:00+00:00"),
+    make_cursor('2025-01-01",id.gt.0', "0b7c6a3e-2f7d-4b8e-9a51-3c1f0d2e4a6b"),
+    make_cursor("2025-01-01T10:00:00+00:00", '1"),or(id.gt.0'),
+    make_cursor(1735725600, "0b7c6a3e-2f7d-4b8e-9a51-3c1f0d2e4a6b"),
+])
+def test_decode_cursor_rejects_forged_values(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor)
@@ -0,0 +1,71 @@
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from services.streaming import MessageEventDiffer, ThinkingStreamParser
+
+
+def parse(chunks):
+    parser = ThinkingStreamParser()
+    events = []
+    for chunk in chunks:
+        events += parser.feed(chunk)
+    return events + parser.flush(), parser.answer
+
+
+def test_tags_split_across_chunks():
+    text = "<thinking>Plan the lookup\nCall web_search\n</thinking>\n\nA heap is a tree."
+    steps = [("thinking", "Plan the lookup"), ("thinking", "Call web_search")]
+
+    events, answer = parse(["<thi", "nking>Plan the lookup\nCall web_", "search\n</th", "inking>\n\nA heap ", "is a tree."])
+    assert events == steps + [("answer", "A heap "), ("answer", "is a tree.")]
+    assert answer == "A heap is a tree."
+
+    # One character at a time splits every tag at every position
+    events, answer = parse(list(text))
+    assert [event for event in events if event[0] == "thinking"] == steps
+    assert answer == "A heap is a tree."
+    assert "".join(delta for kind, delta in events if kind == "answer") == answer
+
+
+def test_unclosed_thinking_block_is_flushed_as_steps():
+    parser = ThinkingStreamParser()
+    assert parser.feed("<thinking>Look up heaps\nCompare with") == [("thinking", "Look up heaps")]
+    # The stream ended without </thinking>: the unfinished line is still a step, not answer text
+    assert parser.flush() == [("thinking", "Compare with")]
+    assert parser.answer == ""
+
+
+def test_answer_without_thinking_streams_as_it_arrives():
+    parser = ThinkingStreamParser()
+    assert parser.feed("A heap keeps ") == [("answer", "A heap keeps ")]
+    # A trailing "<" could start <thinking>, so only it is held back
+    assert parser.feed("a < b and ") == [("answer", "a < b and ")]
+    assert parser.feed("b <") == [("answer", "b ")]
+    assert parser.feed("= c") == [("answer", "<= c")]
+    assert parser.flush() == []
+    assert parser.answer == "A heap keeps a < b and b <= c"
+
+
+def test_values_snapshots_only_emit_new_events():
+    history = [HumanMessage(content="Earlier question", id="h0"), AIMessage(content="Earlier answer", id="a0")]
+    question = HumanMessage(content="Draw a heap", id="h1")
+    tool_call = AIMessage(
+        content="<thinking>A diagram helps here</thinking>",
+        tool_calls=[{"name": "generate_diagram", "args": {"query": "heap"}, "id": "call-1"}],
+        id="a1",
+    )
+    tool_result = ToolMessage(content="graph TD", tool_call_id="call-1", id="t1")
+    final = AIMessage(content="<thinking>The diagram is ready\nExplain it</thinking>\nHere is the heap.", id="a2")
+
+    differ = MessageEventDiffer(history_length=len(history) + 1)
+    # The first snapshot echoes the input back: nothing to emit
+    assert differ.diff(history + [question]) == []
+    assert differ.diff(history + [question, tool_call]) == [
+        ("thinking", "A diagram helps here"), ("tool", "generate_diagram"),
+    ]
+    snapshot = history + [question, tool_call, tool_result, final]
+    assert differ.diff(snapshot) == [
+        ("thinking", "The diagram is ready"), ("thinking", "Explain it"), ("answer", "Here is the heap."),
+    ]
+    # A repeated snapshot, or one that re-sends a seen message, adds nothing
+    assert differ.diff(snapshot) == []
+    assert differ.diff(snapshot + [final]) == []
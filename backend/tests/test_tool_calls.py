@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+
+from services import agent
+
+LATENCIES = {"web_search": 0.1, "generate_diagram": 0.3, "query_supabase": 0.2}
+
+
+def stub_tool(name: str, latency: float) -> StructuredTool:
+    async def run(query: str) -> str:
+        await asyncio.sleep(latency)
+        return f"{name} result for {query}"
+    return StructuredTool.from_function(coroutine=run, name=name, description=f"Stub {name}.")
+
+
+def tool_calls(names):
+    return [{"name": name, "args": {"query": "heaps"}, "id": f"call-{name}"} for name in names]
+
+
+def use_stub_tools(monkeypatch, latencies):
+    monkeypatch.setattr(agent, "tools_by_name", {name: stub_tool(name, latency) for name, latency in latencies.items()})
+
+
+def test_tools_run_concurrently(monkeypatch):
+    use_stub_tools(monkeypatch, LATENCIES)
+
+    async def run():
+        started = time.perf_counter()
+        results = await agent.run_tool_calls(tool_calls(LATENCIES), {}, deadline=None)
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+
+    # About the slowest tool (0.3s), not the sum (0.6s)
+    assert 0.3 <= elapsed < 0.45
+    assert [message.name for message in results] == list(LATENCIES)
+    assert all(message.status != "error" for message in results)
+
+
+def test_tools_running_at_the_deadline_are_reported_missing(monkeypatch):
+    use_stub_tools(monkeypatch, {"web_search": 0.05, "generate_diagram": 1.0})
+    monkeypatch.setattr(agent, "TOOL_MIN_TIME_BUDGET", 0.0)
+
+    async def run():
+        started = time.perf_counter()
+        results = await agent.run_tool_calls(tool_calls(["web_search", "generate_diagram"]), {}, deadline=time.monotonic() + 0.2)
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(run())
+
+    assert elapsed < 0.3
+    search, diagram = results
+    assert search.status != "error" and search.content == "web_search result for heaps"
+    assert diagram.status == "error" and "didn't finish in time" in diagram.content
+
+    # The presenter merges what finished, notes what didn't, and marks the answer partial
+    state = {"messages": [HumanMessage(content="heaps"), AIMessage(content="", tool_calls=tool_calls(["web_search", "generate_diagram"]))] + results}
+    answer = agent.present_tool_result_node(state)["messages"][0]
+    assert answer.response_metadata["partial"] is True
+    assert answer.content.startswith("web_search result for heaps")
+    assert "Note: generate_diagram didn't finish in time" in answer.content
+
+
+def test_merged_results_get_a_section_per_tool():
+    messages = [
+        ToolMessage(content="Fresh news about heaps.", name="web_search", tool_call_id="1"),
+        ToolMessage(content="A heap.\n\n%%MERMAID%%\ngraph TD\n%%/MERMAID%%", name="generate_diagram", tool_call_id="2"),
+        ToolMessage(content="Another view.\n\n%%MERMAID%%\ngraph LR\n%%/MERMAID%%", name="generate_diagram", tool_call_id="3"),
+    ]
+    merged = agent.merge_tool_results(messages)
+
+    assert merged.startswith("Recent information:\nFresh news about heaps.")
+    assert "Diagram:\nA heap." in merged
+    # Only the first diagram is rendered; the second stays readable as a code block
+    assert merged.count("%%MERMAID%%") == 1 and "```mermaid\ngraph LR\n```" in merged
@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from benchmarks.fakes import fake_diagram_chains, parse_profile
+from services import tools
+from services.llm_scheduler import groq_scheduler
+
+
+class MemoryRepo:
+    def __init__(self):
+        self.rows = {}
+
+    async def aget_cached_answer(self, cache_key, max_age=None):
+        return self.rows.get(cache_key)
+
+    async def asave_cached_answer(self, cache_key, question, answer, source):
+        self.rows[cache_key] = answer
+
+
+def test_diagram_calls_are_scheduled_and_cached(monkeypatch):
+    repo = MemoryRepo()
+    monkeypatch.setattr(tools.knowledge_cache, "repo", repo)
+    chains = fake_diagram_chains(parse_profile("latency=0.01"))
+    monkeypatch.setattr(tools, "get_diagram_chains", lambda: chains)
+    admitted = groq_scheduler.admitted
+
+    answer = asyncio.run(tools.generate_diagram.ainvoke({"query": "binary tree with three nodes"}))
+
+    assert "%%MERMAID%%" in answer
+    # Mermaid code and explanation each took a Groq slot
+    assert groq_scheduler.admitted == admitted + 2
+    assert list(repo.rows.values()) == [answer]
+    # Served from the cache the async path fills
+    assert asyncio.run(tools.generate_diagram.ainvoke({"query": "binary tree with three nodes"})) == answer
+    assert groq_scheduler.admitted == admitted + 2
+
+
+def test_loop_bound_tools_have_no_sync_entry_point():
+    # A sync caller would run them on a second event loop, next to the app's
+    with pytest.raises(NotImplementedError):
+        tools.web_search.invoke({"topic": "heaps"})
+    with pytest.raises(NotImplementedError):
+        tools.generate_diagram.invoke({"query": "heap"})
@@ -0,0 +1,47 @@
+import asyncio
+import uuid
+
+import api.chat
+from benchmarks.fakes import FakeSupabase, FakeSupervisorLLM, parse_profile
+from schemas.chat import ChatRequest
+from services import agent
+from services.turn_cache import TurnAnswerCache
+from services.write_behind import chat_writer
+
+
+def test_filler_only_messages_are_not_cached():
+    cache = TurnAnswerCache(version="test")
+    assert cache.key_for("hello") is None
+    assert cache.key_for("Can you?") is None
+    assert cache.key_for("hey, please") is None
+
+
+def test_filler_only_first_turns_skip_the_turn_cache(tmp_path, monkeypatch):
+    db = FakeSupabase(parse_profile("latency=0"))
+    supervisor_chain = agent.supervisor_prompt | FakeSupervisorLLM(profile=parse_profile("latency=0"), token_delay=0)
+    monkeypatch.setattr(agent, "get_supervisor_chain", lambda: supervisor_chain)
+    monkeypatch.setattr(chat_writer, "spill_path", tmp_path / "write_behind.jsonl")
+    before = agent.turn_cache.stats()
+
+    async def first_turn(message: str):
+        request = ChatRequest(message=message)
+        return [event async for event in api.chat.generate_events(uuid.uuid4(), request, db, "user-1")]
+
+    async def run():
+        return await first_turn("hello"), await first_turn("hey")
+
+    hello_events, hey_events = asyncio.run(run())
+    chat_writer.wait_spilled()
+
+    assert hello_events and hey_events
+    # Neither turn was looked up, stored or replayed
+    after = agent.turn_cache.stats()
+    for counter in ("hits", "db_hits", "misses", "stored"):
+        assert after[counter] == before[counter], counter
+
+
+
+def test_questions_still_share_keys_by_normal_form():
+    cache = TurnAnswerCache(version="test")
+    assert cache.key_for("Can you explain BSTs?") == cache.key_for("explain binary search tree")
+    assert cache.key_for("what is a heap") != cache.key_for("draw a heap")
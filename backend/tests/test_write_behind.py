@@ -0,0 +1,129 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from benchmarks.fakes import FakeSupabase, parse_profile
+from services.write_behind import WriteBehindQueue, _Write
+
+DEAD_PID = 2**22 + 1  # above Linux's largest possible pid_max, so never a running process
+
+
+def make_queue(tmp_path, client=None, **kwargs) -> WriteBehindQueue:
+    return WriteBehindQueue(str(tmp_path / "write_behind.jsonl"), fallback_client=client, flush_interval=60, fsync=False, **kwargs)
+
+
+def spill_records(path) -> list:
+    return [json.loads(line) for line in path.read_text().splitlines() if line.strip()]
+
+
+def test_enqueue_spills_on_the_spill_thread_in_groups(tmp_path):
+    queue = make_queue(tmp_path)
+    calls = []
+    append = queue._append_spill
+
+    def slow_append(records):
+        calls.append((threading.current_thread().name, len(records)))
+        time.sleep(0.05)
+        append(records)
+
+    queue._append_spill = slow_append
+    started = time.perf_counter()
+    for i in range(20):
+        queue.enqueue_message(None, "s1", "u1", "user", f"message {i}")
+    enqueue_seconds = time.perf_counter() - started
+    queue.wait_spilled()
+
+    assert enqueue_seconds < 0.05
+    assert {name for name, _ in calls} == {"write-behind-spill"}
+    # Appends queued while the thread was busy went out together
+    assert len(calls) < 20
+    assert sum(count for _, count in calls) == 20
+    assert len(spill_records(queue.own_spill_path)) == 20
+
+
+def test_start_replays_only_orphaned_spill_files(tmp_path):
+    dead = tmp_path / f"write_behind.{DEAD_PID}.jsonl"
+    live = tmp_path / f"write_behind.{os.getppid()}.jsonl"
+    dead.write_text(json.dumps(_Write("title", {"session_id": "s1", "title": "dead"}).to_record()) + "\n")
+    live.write_text(json.dumps(_Write("title", {"session_id": "s2", "title": "live"}).to_record()) + "\n")
+
+    async def run():
+        queue = make_queue(tmp_path)
+        await queue.start()
+        await queue.close()
+        return queue
+
+    queue = asyncio.run(run())
+    assert queue.replayed == 1
+    assert not dead.exists()
+    assert live.exists()
+    assert [record["payload"]["title"] for record in spill_records(queue.own_spill_path)] == ["dead"]
+
+
+def test_replay_after_insert_does_not_duplicate_messages(tmp_path):
+    db = FakeSupabase(parse_profile("latency=0"))
+
+    async def first_run():
+        queue = make_queue(tmp_path, db)
+        await queue.start()
+        queue.enqueue_message(db, "s1", "u1", "user", "hello")
+        queue.enqueue_message(db, "s1", "u1", "ai", "hi there")
+        await asyncio.to_thread(queue.wait_spilled)
+        records = spill_records(queue.own_spill_path)
+        await queue.flush()
+        await queue.close()
+        return records
+
+    # Crash after the insert but before compaction: the spill file still has both messages
+    records = asyncio.run(first_run())
+    orphan = tmp_path / f"write_behind.{DEAD_PID}.jsonl"
+    orphan.write_text("".join(json.dumps(record) + "\n" for record in records))
+
+    async def second_run():
+        queue = make_queue(tmp_path, db)
+        await queue.start()
+        await queue.close()
+        return queue
+
+    queue = asyncio.run(second_run())
+    assert queue.replayed == 2
+    assert sorted(row["content"] for row in db.tables["chat_messages"]) == ["hello", "hi there"]
+
+
+class PoisonClient:
+    """Fails any insert that contains a row with content "poison"."""
+
+    def __init__(self):
+        self.rows = []
+
+    def table(self, name):
+        return self
+
+    def upsert(self, rows, **kwargs):
+        self._batch = rows
+        return self
+
+    def execute(self):
+        if any(row["content"] == "poison" for row in self._batch):
+            raise RuntimeError("invalid row")
+        self.rows.extend(self._batch)
+
+
+def test_bad_row_does_not_fail_the_rest_of_its_batch(tmp_path):
+    client = PoisonClient()
+
+    async def run():
+        queue = make_queue(tmp_path, client, max_attempts=1)
+        for content in ("one", "poison", "two"):
+            queue.enqueue_message(client, "s1", "u1", "user", content)
+        await queue.flush()
+        await queue.close()
+        return queue
+
+    queue = asyncio.run(run())
+    assert [row["content"] for row in client.rows] == ["one", "two"]
+    assert queue.flushed == 2
+    assert queue.dropped == 1
+    assert queue.stats()["pending"] == 0
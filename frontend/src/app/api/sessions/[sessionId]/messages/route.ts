@@ -44,7 +44,7 @@ export async function POST(
     if (!session) return new Response(JSON.stringify({ error: 'Unauthorized' }), { status: 401 });
 
     const { sessionId } = await params;
-    const { messages } = await req.json();
+    const { message, messages } = await req.json();
 
     const backendResponse = await fetch(`${BACKEND_URL}/${sessionId}`, {
       method: 'POST',
@@ -53,7 +53,7 @@ export async function POST(
         'Accept': 'text/event-stream',
         'Authorization': `Bearer ${session.access_token}`
       },
-      body: JSON.stringify({ messages }),
+      body: JSON.stringify(message ? { message } : { messages }),
     });
 
     if (!backendResponse.ok) {
@@ -120,13 +120,9 @@ export default function ChatPage({ params }: { params: Promise<{ sessionId?: str
     });
 
     try {
-      const conversationHistory = [...messages, userMessage].map(msg => ({
-        role: msg.role,
-        text: msg.content
-      }));
-
+      // The backend loads earlier turns from the session itself
       const requestPayload = {
-        messages: conversationHistory,
+        message: userMessage.content,
         session_id: sessionId,
         user_message: input.trim(),
       };